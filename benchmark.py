@@ -0,0 +1,9 @@
+"""Executable script to benchmark the full pipeline on a generated synthetic city.
+
+Kept for compatibility, use `balance-db benchmark` instead.
+"""
+from idu_balance_db.cli.benchmark import benchmark
+
+
+if __name__ == "__main__":
+    benchmark()  # pylint: disable=no-value-for-parameter
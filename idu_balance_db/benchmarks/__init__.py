@@ -0,0 +1 @@
+"""Synthetic city generation and pipeline benchmarking are located here."""
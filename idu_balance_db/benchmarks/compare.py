@@ -0,0 +1,110 @@
+"""Comparison of pipeline benchmark results with a stored baseline is defined here."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+from idu_balance_db.benchmarks.pipeline import BenchmarkResults
+from idu_balance_db.utils.measurement import StageMeasurement
+
+
+COMPARED_PARAMETERS_EXCLUDE = {"year_begin"}
+"""Benchmark parameters which are allowed to differ between compared runs."""
+
+
+@dataclass
+class StageComparison:  # pylint: disable=too-many-instance-attributes
+    """Comparison of a single stage (or a group of stages with the same name) of two benchmark runs.
+
+    Missing values mean that the stage is absent in one of the runs.
+    """
+
+    key: str
+    baseline_wall_time: float | None
+    current_wall_time: float | None
+    baseline_peak_rss: int | None
+    current_peak_rss: int | None
+    time_regressed: bool = False
+    memory_regressed: bool = False
+
+    @property
+    def time_ratio(self) -> float | None:
+        """Current to baseline wall time ratio."""
+        if not self.baseline_wall_time or self.current_wall_time is None:
+            return None
+        return self.current_wall_time / self.baseline_wall_time
+
+    @property
+    def memory_ratio(self) -> float | None:
+        """Current to baseline peak RSS ratio."""
+        if not self.baseline_peak_rss or self.current_peak_rss is None:
+            return None
+        return self.current_peak_rss / self.baseline_peak_rss
+
+    @property
+    def regressed(self) -> bool:
+        """Indicates whether stage has regressed either in time or in memory."""
+        return self.time_regressed or self.memory_regressed
+
+
+def _stage_key(stage: StageMeasurement, year_begin: int | None, by_labels: bool) -> str:
+    """Return stage comparison key. Years are stored relative to the start year, so runs with different
+    `year_begin` can be compared.
+    """
+    if not by_labels or len(stage.labels) == 0:
+        return stage.stage
+    labels = []
+    for name, value in stage.labels.items():
+        if name == "year" and year_begin is not None:
+            value = f"+{value - year_begin}"
+        labels.append(f"{name}={value}")
+    return f"{stage.stage}[{','.join(labels)}]"
+
+
+def _group_stages(results: BenchmarkResults, by_labels: bool) -> dict[str, tuple[float, int]]:
+    """Group stages by key summing their wall time and taking maximum of peak RSS."""
+    grouped: dict[str, tuple[float, int]] = {}
+    for stage in results.stages:
+        key = _stage_key(stage, results.parameters.get("year_begin"), by_labels)
+        wall_time, peak_rss = grouped.get(key, (0.0, 0))
+        grouped[key] = (wall_time + stage.wall_time, max(peak_rss, stage.peak_rss))
+    return grouped
+
+
+def get_parameters_difference(current: BenchmarkResults, baseline: BenchmarkResults) -> dict[str, tuple[Any, Any]]:
+    """Return benchmark parameters which differ between runs as a dictionary name -> (baseline, current)."""
+    return {
+        name: (baseline.parameters.get(name), current.parameters.get(name))
+        for name in set(current.parameters) | set(baseline.parameters)
+        if name not in COMPARED_PARAMETERS_EXCLUDE and current.parameters.get(name) != baseline.parameters.get(name)
+    }
+
+
+def compare_results(  # pylint: disable=too-many-arguments
+    current: BenchmarkResults,
+    baseline: BenchmarkResults,
+    time_tolerance: float = 0.1,
+    memory_tolerance: float = 0.1,
+    min_wall_time: float = 0.1,
+    by_labels: bool = False,
+) -> list[StageComparison]:
+    """Compare current benchmark results with the baseline ones.
+
+    Stage is regressed in time if its wall time grew by more than `time_tolerance` share of the baseline value
+    (stages faster than `min_wall_time` seconds in both runs are considered noise and never regress), and in memory
+    if its peak RSS grew by more than `memory_tolerance` share. By default stages of the same name are summed up,
+    with `by_labels` each (scenario, year) is compared separately.
+    """
+    baseline_stages = _group_stages(baseline, by_labels)
+    current_stages = _group_stages(current, by_labels)
+    comparisons = []
+    for key in list(baseline_stages) + [key for key in current_stages if key not in baseline_stages]:
+        baseline_wall_time, baseline_peak_rss = baseline_stages.get(key, (None, None))
+        current_wall_time, current_peak_rss = current_stages.get(key, (None, None))
+        comparison = StageComparison(key, baseline_wall_time, current_wall_time, baseline_peak_rss, current_peak_rss)
+        if comparison.time_ratio is not None and max(baseline_wall_time, current_wall_time) >= min_wall_time:
+            comparison.time_regressed = comparison.time_ratio > 1 + time_tolerance
+        if comparison.memory_ratio is not None:
+            comparison.memory_regressed = comparison.memory_ratio > 1 + memory_tolerance
+        comparisons.append(comparison)
+    return comparisons
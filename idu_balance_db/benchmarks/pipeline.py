@@ -0,0 +1,211 @@
+"""Full pipeline benchmark with each stage timed separately is defined here."""
+from __future__ import annotations
+
+import datetime
+import json
+import platform
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from population_restorator.divider import save_houses_distribution_to_db
+from population_restorator.forecaster import forecast_ages, forecast_people
+from population_restorator.models import SurvivabilityCoefficients
+from sqlalchemy import Engine, create_engine
+
+from idu_balance_db import __version__
+from idu_balance_db.benchmarks.synthetic import SyntheticCity
+from idu_balance_db.db.entities.enums import ForecastScenario
+from idu_balance_db.logic.balancing import balance_city, save_balanced_city
+from idu_balance_db.logic.city_division import get_city_as_territory
+from idu_balance_db.logic.demands_update import update_demands_table
+from idu_balance_db.logic.division import divide_houses
+from idu_balance_db.logic.forecast import refresh_materialized_views
+from idu_balance_db.logic.saving import save_year_to_database
+from idu_balance_db.logic.social import get_social_groups_distribution_from_db_and_dataframe
+from idu_balance_db.utils.measurement import StageMeasurement, StagesMeasurer
+from idu_balance_db.utils.tmp_db import fully_clear_tmp_db
+
+
+SCENARIO_MULTIPLIERS = {ForecastScenario.neg: 0.9, ForecastScenario.mod: 1.0, ForecastScenario.pos: 1.1}
+
+
+@dataclass
+class BenchmarkResults:
+    """Pipeline benchmark results: parameters of the run, environment description and stages measurements."""
+
+    parameters: dict[str, Any]
+    environment: dict[str, Any] = field(default_factory=dict)
+    stages: list[StageMeasurement] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return results as a JSON-serializable dictionary."""
+        return {
+            "parameters": self.parameters,
+            "environment": self.environment,
+            "stages": [stage.to_dict() for stage in self.stages],
+            "total_wall_time": sum(stage.wall_time for stage in self.stages),
+            "peak_rss": max((stage.peak_rss for stage in self.stages), default=0),
+        }
+
+    def save(self, path: Path) -> None:
+        """Write results to the given JSON file."""
+        with path.open("w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> "BenchmarkResults":
+        """Read results from the JSON file written by `save`."""
+        with path.open("r", encoding="utf-8") as file:
+            data = json.load(file)
+        return cls(
+            data["parameters"], data.get("environment", {}), [StageMeasurement.from_dict(s) for s in data["stages"]]
+        )
+
+
+def get_environment_info(engine: Engine) -> dict[str, Any]:
+    """Return description of the environment benchmark is launched in."""
+    return {
+        "idu_balance_db": __version__,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "database": engine.dialect.name,
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def run_pipeline_benchmark(  # pylint: disable=too-many-arguments,too-many-locals,too-many-statements
+    engine: Engine,
+    city: SyntheticCity,
+    temporary_dsn_template: str,
+    year_begin: int,
+    years: int,
+    scenarios: list[ForecastScenario],
+    threads: int = 1,
+    measurer: StagesMeasurer | None = None,
+) -> BenchmarkResults:
+    """Run the full pipeline on a synthetic `city` measuring each stage separately: hierarchy load, balancing,
+    write-back, social groups load, division, start year saving, and for each scenario - ages forecast, each
+    year forecast and saving; then materialized views refresh and demands update.
+
+    Saving is performed synchronously (not in the saver process as in `balance-db`), so forecasting and saving are
+    measured independently. Materialized views and demands stages require PostgreSQL and are skipped otherwise.
+    """
+    if measurer is None:
+        measurer = StagesMeasurer()
+    results = BenchmarkResults(
+        city.parameters.to_dict()
+        | {"year_begin": year_begin, "years": years, "scenarios": [sc.value for sc in scenarios], "threads": threads},
+        get_environment_info(engine),
+    )
+    year_dsns = {year: temporary_dsn_template.format(year=year) for year in range(year_begin, year_begin + years + 1)}
+    for dsn in year_dsns.values():
+        with create_engine(dsn).connect() as tmp_conn:
+            fully_clear_tmp_db(tmp_conn)
+    start_engine = create_engine(year_dsns[year_begin])
+
+    try:
+        with engine.connect() as conn:
+            with measurer.stage("hierarchy_load") as measurement:
+                city_territory = get_city_as_territory(conn, city.city_id)
+                measurement.rows = city_territory.get_all_houses().shape[0]
+
+            with measurer.stage("balancing") as measurement:
+                houses_df = balance_city(city_territory)
+                measurement.rows = houses_df.shape[0]
+
+            with measurer.stage("write_back") as measurement:
+                save_balanced_city(conn, city_territory, houses_df)
+                conn.commit()
+                measurement.rows = houses_df.shape[0]
+
+            with measurer.stage("social_groups_load") as measurement:
+                sgs_distribution = get_social_groups_distribution_from_db_and_dataframe(conn, city.distribution)
+                measurement.rows = city.distribution.shape[0]
+
+        houses_df = houses_df.set_index("id")
+        houses_ids: list[int] = houses_df.index.unique().tolist()
+
+        with measurer.stage("division") as measurement:
+            distribution_series = pd.Series(
+                divide_houses(houses_df["population"].astype(int).to_list(), sgs_distribution),
+                index=houses_df.index,
+            )
+            measurement.rows = houses_df.shape[0]
+
+        with measurer.stage("division_save") as measurement:
+            save_houses_distribution_to_db(
+                start_engine.connect(), distribution_series, houses_df["living_area"], sgs_distribution, year_begin
+            )
+            measurement.rows = houses_df.shape[0]
+
+        for scenario in scenarios:
+            multiplier = SCENARIO_MULTIPLIERS[scenario]
+            with measurer.stage("save", scenario=scenario.value, year=year_begin) as measurement:
+                measurement.rows = _save_year(engine, year_dsns[year_begin], year_begin, scenario, houses_ids)
+            if years == 0:
+                continue
+
+            with measurer.stage("forecast_ages", scenario=scenario.value) as measurement:
+                forecasted_ages = forecast_ages(
+                    start_engine,
+                    year_begin,
+                    year_begin + years,
+                    1.05,
+                    SurvivabilityCoefficients(
+                        (np.array(city.survivability_coefficients.men) * multiplier).tolist(),
+                        (np.array(city.survivability_coefficients.women) * multiplier).tolist(),
+                    ),
+                    0.07 * multiplier,
+                    20,
+                    39,
+                    houses_ids=houses_ids,
+                )
+                measurement.rows = years
+
+            def save_results(year_dsn: str, year: int, scenario: ForecastScenario = scenario) -> None:
+                """Finish current year forecast measurement, save its results and start the next year one."""
+                measurer.finish()
+                with measurer.stage("save", scenario=scenario.value, year=year) as measurement:
+                    measurement.rows = _save_year(engine, year_dsn, year, scenario, houses_ids)
+                if year < year_begin + years:
+                    measurer.start("forecast", scenario=scenario.value, year=year + 1).rows = len(houses_ids)
+
+            measurer.start("forecast", scenario=scenario.value, year=year_begin + 1).rows = len(houses_ids)
+            forecast_people(
+                start_engine,
+                forecasted_ages,
+                list(year_dsns.values())[1:],
+                year_begin,
+                houses_ids,
+                callback=save_results,
+                threads=threads,
+            )
+
+        if engine.dialect.name == "postgresql":
+            with measurer.stage("matviews") as measurement:
+                refresh_materialized_views(engine)
+                measurement.rows = len(houses_ids) * (years + 1) * len(scenarios)
+            with measurer.stage("demands") as measurement:
+                update_demands_table(engine, city.city_id, year_begin, years)
+                measurement.rows = len(houses_ids) * (years + 1)
+        else:
+            logger.warning("Skipping matviews and demands stages as they require PostgreSQL database")
+    finally:
+        measurer.close()
+
+    results.stages = measurer.measurements
+    return results
+
+
+def _save_year(engine: Engine, year_dsn: str, year: int, scenario: ForecastScenario, houses_ids: list[int]) -> int:
+    """Save a single year from the temporary database to the main one and return the number of rows inserted."""
+    with engine.connect() as conn, create_engine(year_dsn).connect() as year_conn:
+        rows = save_year_to_database(conn, year_conn, year, scenario, houses_ids)
+        conn.commit()
+    return rows
@@ -0,0 +1,424 @@
+"""Synthetic city generator used to benchmark the pipeline without production database is defined here.
+
+Synthetic database contains only the tables (and columns) the pipeline reads and writes, geometry and other
+unused columns are omitted, so it can be created in SQLite or PostgreSQL without PostGIS.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from population_restorator.models import SurvivabilityCoefficients
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Connection,
+    Engine,
+    Enum,
+    Float,
+    ForeignKey,
+    Integer,
+    MetaData,
+    SmallInteger,
+    String,
+    Table,
+    create_engine,
+    event,
+    insert,
+    inspect,
+    text,
+)
+
+from idu_balance_db.db.entities.enums import CityDivisionType
+from idu_balance_db.db.entities.social_stats import t_sex_age_social_houses
+from idu_balance_db.utils.streaming import batched
+
+
+SYNTHETIC_SCHEMAS = ["social_stats", "provision", "maintenance"]
+
+synthetic_metadata = MetaData()
+
+t_synthetic_cities = Table(
+    "cities",
+    synthetic_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(50), nullable=False, unique=True),
+    Column("code", String(50)),
+    Column("population", Integer),
+    Column("city_division_type", Enum(CityDivisionType, name="city_division_type"), nullable=False),
+)
+
+t_synthetic_administrative_units = Table(
+    "administrative_units",
+    synthetic_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("parent_id", Integer),
+    Column("city_id", ForeignKey("cities.id"), nullable=False),
+    Column("name", String(50), nullable=False),
+    Column("population", Integer),
+    Column("municipality_parent_id", Integer),
+)
+
+t_synthetic_municipalities = Table(
+    "municipalities",
+    synthetic_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("parent_id", Integer),
+    Column("city_id", ForeignKey("cities.id"), nullable=False),
+    Column("name", String(50), nullable=False),
+    Column("population", Integer),
+    Column("admin_unit_parent_id", Integer),
+)
+
+t_synthetic_physical_objects = Table(
+    "physical_objects",
+    synthetic_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("city_id", ForeignKey("cities.id"), nullable=False),
+    Column("municipality_id", ForeignKey("municipalities.id")),
+    Column("administrative_unit_id", ForeignKey("administrative_units.id")),
+    Column("block_id", Integer),
+)
+
+t_synthetic_buildings = Table(
+    "buildings",
+    synthetic_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("physical_object_id", ForeignKey("physical_objects.id"), unique=True),
+    Column("living_area", Float),
+    Column("is_living", Boolean),
+    Column("population_balanced", SmallInteger, server_default=text("0")),
+)
+
+t_synthetic_social_groups = Table(
+    "social_groups",
+    synthetic_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False, unique=True),
+    Column("code", String, nullable=False, unique=True),
+    Column("parent_id", Integer),
+)
+
+t_synthetic_sex_age_social_houses = t_sex_age_social_houses.to_metadata(synthetic_metadata)
+
+t_synthetic_city_service_types = Table(
+    "city_service_types",
+    synthetic_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("code", String(50), nullable=False, unique=True),
+)
+
+t_synthetic_normatives = Table(
+    "normatives",
+    synthetic_metadata,
+    Column("city_service_type_id", ForeignKey("city_service_types.id"), primary_key=True),
+    Column("normative", Float, nullable=False),
+    schema="provision",
+)
+
+t_synthetic_social_groups_city_service_types = Table(
+    "social_groups_city_service_types",
+    synthetic_metadata,
+    Column("social_group_id", ForeignKey("social_groups.id"), primary_key=True),
+    Column("city_service_type_id", ForeignKey("city_service_types.id"), primary_key=True),
+    schema="maintenance",
+)
+
+
+@dataclass
+class SyntheticCityParameters:  # pylint: disable=too-many-instance-attributes
+    """Size and structure of a synthetic city.
+
+    For `ADMIN_UNIT_PARENT` division type administrative units are outer territories and municipalities are inner
+    ones, for `MUNICIPALITY_PARENT` it is vice versa, and for `NO_PARENT` both are independent.
+    """
+
+    buildings: int = 10_000
+    administrative_units: int = 10
+    municipalities: int = 100
+    division_type: CityDivisionType = CityDivisionType.ADMIN_UNIT_PARENT
+    primary_social_groups: int = 10
+    additional_social_groups: int = 5
+    service_types: int = 5
+    max_age: int = 100
+    people_per_square_meter: float = 0.04
+    seed: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return parameters as a JSON-serializable dictionary."""
+        return {name: getattr(self, name) for name in self.__dataclass_fields__} | {  # pylint: disable=no-member
+            "division_type": self.division_type.value
+        }
+
+
+@dataclass
+class SyntheticCity:
+    """Synthetic city saved in the database and the data needed to run the pipeline on it."""
+
+    city_id: int
+    name: str
+    parameters: SyntheticCityParameters
+    distribution: pd.DataFrame
+    survivability_coefficients: SurvivabilityCoefficients
+    population: int
+
+
+def create_synthetic_engine(dsn: str) -> Engine:
+    """Create an engine to the synthetic city database.
+
+    SQLite does not support schemas, so for it each schema used by the pipeline is attached as a separate database
+    file located near the main one (or in memory if the main database is in memory).
+    """
+    engine = create_engine(dsn)
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    database = engine.url.database
+    in_memory = database in (None, "", ":memory:") or "mode=memory" in str(engine.url)
+
+    @event.listens_for(engine, "connect")
+    def _attach_schemas(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for schema in SYNTHETIC_SCHEMAS:
+            path = ":memory:" if in_memory else f"{os.path.splitext(database)[0]}.{schema}.sqlite"
+            cursor.execute(f"ATTACH DATABASE '{path}' AS {schema}")
+        cursor.close()
+
+    return engine
+
+
+def _age_pyramid(max_age: int) -> np.ndarray:
+    """Return a smooth decreasing number of people of each age used as a base for social groups distributions."""
+    ages = np.arange(max_age + 1)
+    return np.exp(-(((ages - 35) / 30) ** 2)) + 0.3 * np.exp(-ages / 40)
+
+
+def generate_distribution(
+    social_groups: list[tuple[str, bool]], max_age: int, rng: np.random.Generator
+) -> pd.DataFrame:
+    """Generate sex-age-social_groups distribution in format of 'distribution' sheet of a file exported by
+    export_social_distribution.py for the given (name, is_primary) social groups.
+
+    Primary social groups cover all of the ages, additional ones are limited to a random ages window.
+    """
+    pyramid = _age_pyramid(max_age)
+    frames = []
+    for name, is_primary in social_groups:
+        weight = rng.uniform(0.5, 2.0) * (1 if is_primary else 0.2)
+        men = pyramid * weight * rng.uniform(0.8, 1.2, max_age + 1)
+        women = pyramid * weight * rng.uniform(0.8, 1.2, max_age + 1)
+        if not is_primary:
+            age_from = int(rng.integers(0, max_age - 10))
+            mask = (np.arange(max_age + 1) < age_from) | (np.arange(max_age + 1) > age_from + 10 + rng.integers(0, 30))
+            men[mask] = 0
+            women[mask] = 0
+        frames.append(
+            pd.DataFrame(
+                {
+                    "social_group": name,
+                    "age": np.arange(max_age + 1),
+                    "men": np.round(men * 1000).astype(int),
+                    "women": np.round(women * 1000).astype(int),
+                }
+            )
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+def generate_survivability_coefficients(max_age: int) -> SurvivabilityCoefficients:
+    """Generate survivability coefficients slowly decreasing with age."""
+    ages = np.arange(max_age)
+    men = 1 - 0.002 - 0.2 * (ages / max_age) ** 4
+    women = 1 - 0.001 - 0.15 * (ages / max_age) ** 4
+    return SurvivabilityCoefficients(men.tolist(), women.tolist())
+
+
+def _insert(conn: Connection, table: Table, rows: list[dict[str, Any]]) -> None:
+    """Insert the given rows in batches."""
+    for batch in batched(rows):
+        conn.execute(insert(table), batch)
+
+
+def _territories_population(
+    buildings_territories: np.ndarray, buildings_population: np.ndarray, count: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Sum buildings population by territories with +-10% noise, so balancing has some work to do."""
+    population = np.bincount(buildings_territories, buildings_population, minlength=count)
+    return np.round(population * rng.uniform(0.9, 1.1, count)).astype(int)
+
+
+def drop_synthetic_city(engine: Engine) -> None:
+    """Drop synthetic city tables (and PostgreSQL-only objects) from the database."""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS social_stats.calculated_people_houses"))
+            conn.execute(text("DROP TABLE IF EXISTS provision.buildings_load_future"))
+        synthetic_metadata.drop_all(conn)
+        conn.commit()
+
+
+def generate_synthetic_city(  # pylint: disable=too-many-locals,too-many-statements
+    engine: Engine, parameters: SyntheticCityParameters, overwrite: bool = False
+) -> SyntheticCity:
+    """Create synthetic city tables in the given database and fill them with a generated city.
+
+    Refuses to work with a database which already contains `cities` table unless `overwrite` is set, in which case
+    synthetic tables are dropped and created again. Never use it with a production database.
+    """
+    if inspect(engine).has_table("cities"):
+        if not overwrite:
+            raise RuntimeError("Database already contains 'cities' table, refusing to overwrite it")
+        drop_synthetic_city(engine)
+    rng = np.random.default_rng(parameters.seed)
+    name = f"synthetic_{parameters.buildings}"
+
+    living_area = np.round(rng.lognormal(np.log(1500), 0.8, parameters.buildings), 1)
+    buildings_population = living_area * parameters.people_per_square_meter
+    administrative_units = np.arange(parameters.administrative_units)
+    municipalities = np.arange(parameters.municipalities)
+    if parameters.division_type == CityDivisionType.ADMIN_UNIT_PARENT:
+        mos_parents = municipalities % parameters.administrative_units
+        buildings_mos = rng.integers(0, parameters.municipalities, parameters.buildings)
+        buildings_aus = mos_parents[buildings_mos]
+    elif parameters.division_type == CityDivisionType.MUNICIPALITY_PARENT:
+        aus_parents = administrative_units % parameters.municipalities
+        buildings_aus = rng.integers(0, parameters.administrative_units, parameters.buildings)
+        buildings_mos = aus_parents[buildings_aus]
+    else:
+        buildings_aus = rng.integers(0, parameters.administrative_units, parameters.buildings)
+        buildings_mos = rng.integers(0, parameters.municipalities, parameters.buildings)
+    aus_population = _territories_population(buildings_aus, buildings_population, len(administrative_units), rng)
+    mos_population = _territories_population(buildings_mos, buildings_population, len(municipalities), rng)
+    city_population = int(round(buildings_population.sum() * rng.uniform(0.95, 1.05)))
+
+    social_groups = [(f"Synthetic primary {i} (synthetic)", True) for i in range(parameters.primary_social_groups)] + [
+        (f"Synthetic additional {i}", False) for i in range(parameters.additional_social_groups)
+    ]
+
+    logger.info("Generating synthetic city '{}' ({})", name, parameters)
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            for schema in SYNTHETIC_SCHEMAS:
+                conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+            conn.commit()
+    synthetic_metadata.create_all(engine)
+    with engine.connect() as conn:
+        city_id = 1
+        conn.execute(
+            insert(t_synthetic_cities).values(
+                id=city_id,
+                name=name,
+                code=name,
+                population=city_population,
+                city_division_type=parameters.division_type,
+            )
+        )
+        _insert(
+            conn,
+            t_synthetic_administrative_units,
+            [
+                {
+                    "id": int(au_id) + 1,
+                    "city_id": city_id,
+                    "name": f"AU {au_id}",
+                    "population": int(aus_population[au_id]),
+                    "municipality_parent_id": (
+                        int(aus_parents[au_id]) + 1
+                        if parameters.division_type == CityDivisionType.MUNICIPALITY_PARENT
+                        else None
+                    ),
+                }
+                for au_id in administrative_units
+            ],
+        )
+        _insert(
+            conn,
+            t_synthetic_municipalities,
+            [
+                {
+                    "id": int(mo_id) + 1,
+                    "city_id": city_id,
+                    "name": f"MO {mo_id}",
+                    "population": int(mos_population[mo_id]),
+                    "admin_unit_parent_id": (
+                        int(mos_parents[mo_id]) + 1
+                        if parameters.division_type == CityDivisionType.ADMIN_UNIT_PARENT
+                        else None
+                    ),
+                }
+                for mo_id in municipalities
+            ],
+        )
+        _insert(
+            conn,
+            t_synthetic_physical_objects,
+            [
+                {
+                    "id": i + 1,
+                    "city_id": city_id,
+                    "municipality_id": int(buildings_mos[i]) + 1,
+                    "administrative_unit_id": int(buildings_aus[i]) + 1,
+                }
+                for i in range(parameters.buildings)
+            ],
+        )
+        _insert(
+            conn,
+            t_synthetic_buildings,
+            [
+                {"id": i + 1, "physical_object_id": i + 1, "living_area": float(living_area[i]), "is_living": True}
+                for i in range(parameters.buildings)
+            ],
+        )
+        _insert(
+            conn,
+            t_synthetic_social_groups,
+            [{"id": i, "name": sg_name, "code": f"synthetic_{i}"} for i, (sg_name, _) in enumerate(social_groups, 1)],
+        )
+        _insert(
+            conn,
+            t_synthetic_city_service_types,
+            [{"id": i, "code": f"service_{i}"} for i in range(1, parameters.service_types + 1)],
+        )
+        _insert(
+            conn,
+            t_synthetic_normatives,
+            [
+                {"city_service_type_id": i, "normative": float(rng.uniform(1, 100))}
+                for i in range(1, parameters.service_types + 1)
+            ],
+        )
+        _insert(
+            conn,
+            t_synthetic_social_groups_city_service_types,
+            [
+                {"social_group_id": int(sg_id), "city_service_type_id": i}
+                for i in range(1, parameters.service_types + 1)
+                for sg_id in rng.choice(np.arange(1, len(social_groups) + 1), min(3, len(social_groups)), replace=False)
+            ],
+        )
+        if engine.dialect.name == "postgresql":
+            people = " + ".join(
+                f"men_{i} + women_{i}" for i in range(parameters.max_age + 1) if f"men_{i}" in t_sex_age_social_houses.c
+            )
+            conn.execute(
+                text(
+                    "CREATE MATERIALIZED VIEW social_stats.calculated_people_houses AS"
+                    f" SELECT year, scenario, building_id AS house_id, sum({people})::integer AS people"
+                    " FROM social_stats.sex_age_social_houses GROUP BY year, scenario, building_id"
+                )
+            )
+        conn.commit()
+
+    return SyntheticCity(
+        city_id,
+        name,
+        parameters,
+        generate_distribution(social_groups, parameters.max_age, rng),
+        generate_survivability_coefficients(parameters.max_age),
+        city_population,
+    )
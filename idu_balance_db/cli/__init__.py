@@ -0,0 +1,67 @@
+"""Command-line interface of idu-balance-db is defined here.
+
+Subcommands modules are imported only when the subcommand is invoked, and each of them imports pandas, SQLAlchemy,
+population_restorator and other heavy dependencies inside of the command function, so `--help` and quick
+operational commands do not pay for them.
+"""
+from __future__ import annotations
+
+import importlib
+
+import click
+
+from idu_balance_db import __version__
+from idu_balance_db.utils.dotenv import try_read_envfile
+
+
+SUBCOMMANDS: dict[str, tuple[str, str]] = {
+    "run": ("idu_balance_db.cli.run:run", "Balance, divide and forecast population of the city."),
+    "plan": ("idu_balance_db.cli.plan:plan", "Estimate the run cost without any changes."),
+    "prepare-db": ("idu_balance_db.cli.prepare_db:prepare_db", "Create indexes and check query plans."),
+    "snapshot": ("idu_balance_db.cli.snapshot:snapshot", "Save city data to a snapshot file for offline runs."),
+    "save-year": ("idu_balance_db.cli.save_year:save_year", "Save a year from the temporary database."),
+    "export-distribution": (
+        "idu_balance_db.cli.export_distribution:export_distribution",
+        "Export sex-age-social groups distribution to excel.",
+    ),
+    "benchmark": ("idu_balance_db.cli.benchmark:benchmark", "Benchmark the pipeline on a synthetic city."),
+}
+"""Subcommands names mapped to their "module:attribute" import paths and short help."""
+
+
+class LazyGroup(click.Group):
+    """Click group importing subcommands from `lazy_subcommands` mapping only on their invocation. Short help of the
+    lazy subcommands is taken from the mapping, so the group help does not import them either.
+    """
+
+    def __init__(self, *args, lazy_subcommands: dict[str, tuple[str, str]] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name in self.lazy_subcommands:
+            module_name, attribute = self.lazy_subcommands[cmd_name][0].split(":")
+            return getattr(importlib.import_module(module_name), attribute)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        rows = [(name, short_help) for name, (_, short_help) in sorted(self.lazy_subcommands.items())]
+        rows.extend(
+            (name, command.get_short_help_str(formatter.width)) for name, command in sorted(self.commands.items())
+        )
+        if len(rows) > 0:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group("balance-db", cls=LazyGroup, lazy_subcommands=SUBCOMMANDS)
+@click.version_option(__version__, prog_name="balance-db")
+def main():
+    """IDU Lab utility to balance cities population, divide it by sex, age and social groups and forecast it.
+
+    Environment variables are also read from the envfile (`.env` or the one set by ENVFILE variable).
+    """
+    try_read_envfile()
@@ -0,0 +1,261 @@
+"""Pipeline benchmarking commands are defined here."""
+from __future__ import annotations
+
+import datetime
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import click
+from loguru import logger
+
+
+if TYPE_CHECKING:
+    from idu_balance_db.benchmarks.compare import StageComparison
+    from idu_balance_db.benchmarks.pipeline import BenchmarkResults
+
+
+@click.group("benchmark")
+def benchmark():
+    """Pipeline benchmarking utilities."""
+
+
+@benchmark.command("run")
+@click.option(
+    "--dsn",
+    "-m",
+    envvar="BENCHMARK_DB_DSN",
+    default=None,
+    help="Database to generate synthetic city in (SQLite or PostgreSQL stand-in, NEVER the production one)",
+    show_default="SQLite database in a temporary directory",
+    show_envvar=True,
+)
+@click.option(
+    "--temporary-dsn-template",
+    "-t",
+    envvar="BENCHMARK_TEMPORARY_DSN_TEMPLATE",
+    default=None,
+    help="Temporary database DSN template ('year' will be replaced with year value)",
+    show_default="SQLite databases in a temporary directory",
+    show_envvar=True,
+)
+@click.option("--overwrite", is_flag=True, help="Drop and recreate synthetic tables if the database already has them")
+@click.option("--buildings", "-B", type=int, default=10_000, show_default=True, help="Number of living buildings")
+@click.option("--administrative-units", type=int, default=10, show_default=True, help="Number of administrative units")
+@click.option("--municipalities", type=int, default=100, show_default=True, help="Number of municipalities")
+@click.option(
+    "--division-type",
+    type=click.Choice(["ADMIN_UNIT_PARENT", "MUNICIPALITY_PARENT", "NO_PARENT"]),
+    default="ADMIN_UNIT_PARENT",
+    show_default=True,
+    help="City division type",
+)
+@click.option("--primary-social-groups", type=int, default=10, show_default=True, help="Number of primary groups")
+@click.option("--additional-social-groups", type=int, default=5, show_default=True, help="Number of additional groups")
+@click.option("--service-types", type=int, default=5, show_default=True, help="Number of city service types")
+@click.option("--seed", type=int, default=0, show_default=True, help="Random seed of the city generator")
+@click.option("--year-begin", "-b", type=int, default=None, show_default="<current year>", help="Start year")
+@click.option("--years", "-y", type=int, default=3, show_default=True, help="Number of years to forecast")
+@click.option(
+    "--scenario",
+    "scenarios",
+    type=click.Choice(["neg", "mod", "pos"]),
+    multiple=True,
+    default=["mod"],
+    show_default=True,
+    help="Scenario to forecast people for",
+)
+@click.option("--threads", type=int, default=1, show_default=True, help="Number of forecasting processes")
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default="benchmark_results.json",
+    show_default=True,
+    help="Path to write JSON results to",
+)
+@click.option("--verbose", "-v", is_flag=True, help="Show debug logs")
+def run(  # pylint: disable=too-many-arguments,too-many-locals,import-outside-toplevel
+    dsn: str | None,
+    temporary_dsn_template: str | None,
+    overwrite: bool,
+    buildings: int,
+    administrative_units: int,
+    municipalities: int,
+    division_type: str,
+    primary_social_groups: int,
+    additional_social_groups: int,
+    service_types: int,
+    seed: int,
+    year_begin: int | None,
+    years: int,
+    scenarios: list[str],
+    threads: int,
+    output: Path,
+    verbose: bool,
+):
+    """Generate a synthetic city of the given size and run the full pipeline on it, measuring time, throughput and
+    peak memory of each stage.
+    """
+    from idu_balance_db.benchmarks.pipeline import run_pipeline_benchmark
+    from idu_balance_db.benchmarks.synthetic import (
+        SyntheticCityParameters,
+        create_synthetic_engine,
+        generate_synthetic_city,
+    )
+    from idu_balance_db.db.entities.enums import CityDivisionType, ForecastScenario
+
+    logger.remove()
+    logger.add(sys.stderr, level="DEBUG" if verbose else "INFO")
+
+    with tempfile.TemporaryDirectory(prefix="idu_balance_db_benchmark_") as tmp_dir:
+        if dsn is None:
+            dsn = f"sqlite:///{tmp_dir}/synthetic_city.sqlite"
+        if temporary_dsn_template is None:
+            temporary_dsn_template = f"sqlite:///{tmp_dir}/year_{{year}}.sqlite"
+        engine = create_synthetic_engine(dsn)
+        city = generate_synthetic_city(
+            engine,
+            SyntheticCityParameters(
+                buildings=buildings,
+                administrative_units=administrative_units,
+                municipalities=municipalities,
+                division_type=CityDivisionType(division_type),
+                primary_social_groups=primary_social_groups,
+                additional_social_groups=additional_social_groups,
+                service_types=service_types,
+                seed=seed,
+            ),
+            overwrite=overwrite,
+        )
+        results = run_pipeline_benchmark(
+            engine,
+            city,
+            temporary_dsn_template,
+            year_begin or datetime.datetime.now().year,
+            years,
+            [ForecastScenario(sc) for sc in dict.fromkeys(scenarios)],
+            threads,
+        )
+        engine.dispose()
+
+    results.save(output)
+    for stage in results.stages:
+        labels = ", ".join(f"{key}={value}" for key, value in stage.labels.items())
+        logger.info(
+            "{:<20} {:<25} {:9.3f}s  {:>12} rows/s  peak RSS {:8.1f} MB",
+            stage.stage,
+            labels,
+            stage.wall_time,
+            f"{stage.rows_per_second:.1f}" if stage.rows_per_second is not None else "-",
+            stage.peak_rss / 2**20,
+        )
+    logger.info("Results are written to {}", output)
+
+
+@benchmark.command("compare")
+@click.argument("results", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.argument("baseline", type=click.Path(dir_okay=False, path_type=Path))
+@click.option(
+    "--time-tolerance",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="Allowed relative growth of stage wall time (0.1 means +10%)",
+)
+@click.option(
+    "--memory-tolerance",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="Allowed relative growth of stage peak RSS (0.1 means +10%)",
+)
+@click.option(
+    "--min-wall-time",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="Stages faster than this number of seconds in both runs are never considered regressed in time",
+)
+@click.option("--by-labels", is_flag=True, help="Compare each (scenario, year) stage separately instead of summing")
+@click.option("--ignore-parameters", is_flag=True, help="Compare runs even if synthetic city parameters differ")
+@click.option(
+    "--update-baseline", is_flag=True, help="Store given results as the new baseline if no regression is found"
+)
+def compare(  # pylint: disable=too-many-arguments,import-outside-toplevel
+    results: Path,
+    baseline: Path,
+    time_tolerance: float,
+    memory_tolerance: float,
+    min_wall_time: float,
+    by_labels: bool,
+    ignore_parameters: bool,
+    update_baseline: bool,
+):
+    """Compare benchmark RESULTS with the stored BASELINE and exit with non-zero code if any of stages regressed
+    beyond the tolerance in time or memory.
+    """
+    from idu_balance_db.benchmarks.compare import compare_results
+    from idu_balance_db.benchmarks.pipeline import BenchmarkResults
+
+    if not baseline.exists():
+        if update_baseline:
+            shutil.copyfile(results, baseline)
+            logger.info("Baseline {} is missing, storing {} as a baseline", baseline, results)
+            return
+        raise click.UsageError(f"Baseline file '{baseline}' does not exist")
+    current_results = BenchmarkResults.load(results)
+    baseline_results = BenchmarkResults.load(baseline)
+
+    _check_parameters(current_results, baseline_results, ignore_parameters)
+
+    comparisons = compare_results(
+        current_results, baseline_results, time_tolerance, memory_tolerance, min_wall_time, by_labels
+    )
+    _print_comparisons(comparisons)
+
+    regressed = [comparison.key for comparison in comparisons if comparison.regressed]
+    if len(regressed) > 0:
+        logger.error("Regressed stages: {}", ", ".join(regressed))
+        sys.exit(1)
+    logger.success("No regressions found")
+    if update_baseline:
+        shutil.copyfile(results, baseline)
+        logger.info("Baseline {} is updated", baseline)
+
+
+def _check_parameters(  # pylint: disable=import-outside-toplevel
+    current_results: BenchmarkResults, baseline_results: BenchmarkResults, ignore_parameters: bool
+) -> None:
+    """Log a warning for each of the synthetic city parameters differing between the baseline and current results,
+    and exit with code 2 if there are any unless `ignore_parameters` is set."""
+    from idu_balance_db.benchmarks.compare import get_parameters_difference
+
+    difference = get_parameters_difference(current_results, baseline_results)
+    for name, (baseline_value, current_value) in difference.items():
+        logger.warning("Parameter '{}' differs: baseline {}, current {}", name, baseline_value, current_value)
+    if len(difference) > 0 and not ignore_parameters:
+        logger.error("Benchmarks were launched with different parameters, results are not comparable")
+        sys.exit(2)
+
+
+def _print_comparisons(comparisons: list[StageComparison]) -> None:
+    """Print table of the stages comparisons with regressions marked."""
+    click.echo(f"{'stage':<40} {'baseline, s':>12} {'current, s':>12} {'time':>8} {'memory':>8}")
+    for comparison in comparisons:
+        click.echo(
+            f"{comparison.key:<40}"
+            f" {_format_optional(comparison.baseline_wall_time, '.3f'):>12}"
+            f" {_format_optional(comparison.current_wall_time, '.3f'):>12}"
+            f" {_format_optional(comparison.time_ratio, '.2%'):>8}"
+            f" {_format_optional(comparison.memory_ratio, '.2%'):>8}"
+            f"{'  TIME REGRESSION' if comparison.time_regressed else ''}"
+            f"{'  MEMORY REGRESSION' if comparison.memory_regressed else ''}"
+        )
+
+
+def _format_optional(value: float | None, format_spec: str) -> str:
+    """Format the given value or return '-' if it is missing."""
+    return "-" if value is None else format(value, format_spec)
@@ -10,9 +10,28 @@ class CityDivisionType(Enum):
     NO_PARENT = "NO_PARENT"
 
 
+class ForecastModel(str, Enum):
+    """Population forecast model: population_restorator per-age balancing in temporary databases (`RESTORATOR`) or
+    its numpy port forecasting scenarios in parallel processes in memory (`ARRAY`, see `logic/array_forecast.py`)."""
+
+    RESTORATOR = "restorator"
+    ARRAY = "array"
+
+
 class ForecastScenario(Enum):
     """Forecast scenario."""
 
     neg = "neg"  # pylint: disable=invalid-name
     mod = "mod"  # pylint: disable=invalid-name
     pos = "pos"  # pylint: disable=invalid-name
+
+
+class StorageLayout(Enum):
+    """Layout of the sex-age-social_groups-houses people distribution storage."""
+
+    COLUMNS = "columns"
+    """`sex_age_social_houses` table with a column for each sex and age."""
+    ARRAYS = "arrays"
+    """`sex_age_social_houses_compact` table with men and women ages packed to smallint arrays."""
+    DELTAS = "deltas"
+    """`sex_age_social_houses_deltas` table with the start year and sparse differences of each next year."""
@@ -2,7 +2,7 @@
 from typing import Callable
 
 from geoalchemy2 import Geometry
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, Sequence, String, Table, func
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, Sequence, String, Table, func
 
 from idu_balance_db.db import metadata
 
@@ -32,4 +32,7 @@ t_physical_objects = Table(
     Column("block_id", ForeignKey("blocks.id")),
     Column("created_at", DateTime(True), nullable=False, server_default=func.now()),
     Column("updated_at", DateTime(True), nullable=False, server_default=func.now()),
+    Index("physical_objects_city_id", "city_id"),
+    Index("physical_objects_municipality_id", "municipality_id"),
+    Index("physical_objects_administrative_unit_id", "administrative_unit_id"),
 )
@@ -1,5 +1,12 @@
 """social_stats schema entities are located here."""
 from .age_distribution import t_age_distribution
+from .forecast_results_models import t_forecast_results_models
+from .forecast_saving_progress import t_forecast_saving_progress
+from .houses_population_ensemble import t_houses_population_ensemble
 from .sex_age_social_houses import t_sex_age_social_houses
+from .sex_age_social_houses_base import t_sex_age_social_houses_base, t_sex_age_social_houses_compact_base
+from .sex_age_social_houses_compact import t_sex_age_social_houses_compact
+from .sex_age_social_houses_deltas import t_sex_age_social_houses_deltas, t_sex_age_social_houses_deltas_keyframes
+from .sex_age_social_houses_sweeps import t_sex_age_social_houses_sweeps
 from .sex_distribution import t_sex_distribution
 from .social_group_distribution import t_social_group_distribution
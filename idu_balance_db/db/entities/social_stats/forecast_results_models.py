@@ -0,0 +1,32 @@
+"""Models which have produced the saved forecast results are defined here."""
+from sqlalchemy import Column, DateTime, Integer, SmallInteger, String, Table
+from sqlalchemy.sql.functions import now
+
+from idu_balance_db.db import metadata
+
+
+t_forecast_results_models = Table(
+    "forecast_results_models",
+    metadata,
+    Column("city_id", Integer, primary_key=True, nullable=False),
+    Column("scenario", String(32), primary_key=True, nullable=False),
+    Column("model", String(32), nullable=False),
+    Column("year_begin", SmallInteger, nullable=False),
+    Column("years", SmallInteger, nullable=False),
+    Column("replicas", SmallInteger, nullable=False, server_default="1"),
+    Column("updated_at", DateTime(True), nullable=False, server_default=now()),
+    schema="social_stats",
+)
+"""Forecast model of the results saved for a city scenario. The restorator model (population_restorator per-age
+balancing) and the array model (its numpy port, see `logic/array_forecast.py`) write to the same tables, but their
+results differ, so a row is replaced each time the scenario results of a city are saved.
+
+Columns:
+- `city_id` - city identifier, integer
+- `scenario` - scenario name (sweep scenario name for `sex_age_social_houses_sweeps` results), varchar(32)
+- `model` - `ForecastModel` value ("restorator" or "array"), varchar(32)
+- `year_begin` - start year of the results, smallint
+- `years` - number of the forecasted years, smallint
+- `replicas` - number of ensemble replicas (the first one is saved to the people distribution table), smallint
+- `updated_at` - time of the results saving, DateTimeTz
+"""
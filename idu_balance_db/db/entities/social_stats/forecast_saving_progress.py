@@ -0,0 +1,30 @@
+"""Progress of saving forecast years to the main database table is defined here."""
+from sqlalchemy import Column, DateTime, Integer, SmallInteger, String, Table
+from sqlalchemy.sql.functions import now
+
+from idu_balance_db.db import metadata
+
+
+t_forecast_saving_progress = Table(
+    "forecast_saving_progress",
+    metadata,
+    Column("year", SmallInteger, primary_key=True, nullable=False),
+    Column("scenario", String(32), primary_key=True, nullable=False),
+    Column("houses_number", Integer, nullable=False),
+    Column("first_building_id", Integer, nullable=False),
+    Column("next_building_id", Integer, nullable=False),
+    Column("updated_at", DateTime(True), nullable=False, server_default=now()),
+    schema="social_stats",
+)
+"""Progress of a year being saved by chunks of houses (see `save_in_chunks`). A row is updated in the transaction of
+each committed chunk and deleted with the last one, so a row is left only for a year which saving has failed, and
+`balance-db save-year` resumes saving from it.
+
+Columns:
+- `year` - year being saved, integer
+- `scenario` - scenario name ("base" for the base year saved once, sweep scenario name for sweeps), varchar(32)
+- `houses_number` - number of houses of the year being saved, integer
+- `first_building_id` - identifier of the first saved building, integer
+- `next_building_id` - identifier of the first building which is not saved yet, integer
+- `updated_at` - time of the last committed chunk, DateTimeTz
+"""
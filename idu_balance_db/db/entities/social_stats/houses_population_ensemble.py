@@ -0,0 +1,32 @@
+"""Ensemble (Monte Carlo) houses population statistics table is defined here."""
+from sqlalchemy import Column, Enum, Float, ForeignKey, Index, SmallInteger, String, Table
+
+from idu_balance_db.db import metadata
+from idu_balance_db.db.entities.enums import ForecastScenario
+
+
+t_houses_population_ensemble = Table(
+    "houses_population_ensemble",
+    metadata,
+    Column("year", SmallInteger, primary_key=True, nullable=False),
+    Column("scenario", Enum(ForecastScenario, name="social_stats_scenario"), primary_key=True, nullable=False),
+    Column("building_id", ForeignKey("buildings.id"), primary_key=True, nullable=False),
+    Column("social_group_id", ForeignKey("social_groups.id"), primary_key=True, nullable=False),
+    Column("statistic", String(8), primary_key=True, nullable=False),
+    Column("people", Float, nullable=False),
+    Column("replicas", SmallInteger, nullable=False),
+    Index("houses_population_ensemble_building_id", "building_id"),
+    schema="social_stats",
+)
+"""Statistics of the number of people of social groups in buildings over the ensemble of forecast replicas
+(`--ensemble` mode).
+
+Columns:
+- `year` - year of forecast, integer
+- `scenario` - forecasting scenario, ForecastScenario enum
+- `building_id` - identifier of a building, integer
+- `social_group_id` - identifier of a social_group, integer
+- `statistic` - "mean" or quantile name in percents ("q5", "q50", "q99.5" for 0.05, 0.5 and 0.995 quantiles), varchar(8)
+- `people` - value of the statistic of the number of people over replicas, float
+- `replicas` - number of replicas the statistic is calculated over, smallint
+"""
@@ -28,6 +28,8 @@ t_sex_age_social_houses = Table(
         "social_group_id",
         unique=True,
     ),
+    Index("sex_age_social_houses_building_id", "building_id"),
+    Index("sex_age_social_houses_social_group_id", "social_group_id"),
     schema="social_stats",
 )
 """sex-age-social_groups people distribution.
@@ -0,0 +1,55 @@
+"""Scenario-independent base (start) year sex-age-social_groups-houses people distribution tables are defined here."""
+from sqlalchemy import Column, ForeignKey, Index, SmallInteger, Table
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from idu_balance_db.db import metadata
+
+
+t_sex_age_social_houses_base = Table(
+    "sex_age_social_houses_base",
+    metadata,
+    Column("year", SmallInteger, primary_key=True, nullable=False),
+    Column("building_id", ForeignKey("buildings.id"), primary_key=True, nullable=False),
+    Column("social_group_id", ForeignKey("social_groups.id"), primary_key=True, nullable=False),
+    *(Column(f"men_{i}", SmallInteger, nullable=False) for i in range(101)),
+    *(Column(f"women_{i}", SmallInteger, nullable=False) for i in range(101)),
+    Index("sex_age_social_houses_base_building_id", "building_id"),
+    schema="social_stats",
+)
+"""Base year sex-age-social_groups people distribution shared by all of the scenarios (`--base-year-once`).
+
+`sex_age_social_houses_resolved` view exposes `sex_age_social_houses` rows together with base year rows repeated for
+each scenario.
+
+Columns:
+- `year` - base year, integer
+- `building_id` - identifier of a building, integer
+- `social_group_id` - identifier of a social_group, integer
+- `men_{0, 1, ..., 100} - number of men of a given age and social_group for the year.
+- `women_{0, 1, ..., 100} - number of women of a given age and social_group for the year.
+"""
+
+t_sex_age_social_houses_compact_base = Table(
+    "sex_age_social_houses_compact_base",
+    metadata,
+    Column("year", SmallInteger, primary_key=True, nullable=False),
+    Column("building_id", ForeignKey("buildings.id"), primary_key=True, nullable=False),
+    Column("social_group_id", ForeignKey("social_groups.id"), primary_key=True, nullable=False),
+    Column("men", ARRAY(SmallInteger, dimensions=1), nullable=False),
+    Column("women", ARRAY(SmallInteger, dimensions=1), nullable=False),
+    Index("sex_age_social_houses_compact_base_building_id", "building_id"),
+    schema="social_stats",
+)
+"""Base year sex-age-social_groups people distribution with ages packed to arrays shared by all of the scenarios
+(`--base-year-once` with `StorageLayout.ARRAYS`).
+
+`sex_age_social_houses_compact_resolved` view exposes `sex_age_social_houses_compact` rows together with base year
+rows repeated for each scenario.
+
+Columns:
+- `year` - base year, integer
+- `building_id` - identifier of a building, integer
+- `social_group_id` - identifier of a social_group, integer
+- `men` - number of men of a given social_group by age (element 1 is age 0) for the year, smallint[]
+- `women` - number of women of a given social_group by age (element 1 is age 0) for the year, smallint[]
+"""
@@ -0,0 +1,34 @@
+"""Sex-age-social_groups-houses people distribution table in a compact (array columns) layout is defined here."""
+from sqlalchemy import Column, Enum, ForeignKey, Index, SmallInteger, Table
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from idu_balance_db.db import metadata
+from idu_balance_db.db.entities.enums import ForecastScenario
+
+
+t_sex_age_social_houses_compact = Table(
+    "sex_age_social_houses_compact",
+    metadata,
+    Column("year", SmallInteger, primary_key=True, nullable=False),
+    Column("scenario", Enum(ForecastScenario, name="social_stats_scenario"), primary_key=True, nullable=False),
+    Column("building_id", ForeignKey("buildings.id"), primary_key=True, nullable=False),
+    Column("social_group_id", ForeignKey("social_groups.id"), primary_key=True, nullable=False),
+    Column("men", ARRAY(SmallInteger, dimensions=1), nullable=False),
+    Column("women", ARRAY(SmallInteger, dimensions=1), nullable=False),
+    Index("sex_age_social_houses_compact_building_id", "building_id"),
+    Index("sex_age_social_houses_compact_social_group_id", "social_group_id"),
+    schema="social_stats",
+)
+"""sex-age-social_groups people distribution with ages packed to arrays (`StorageLayout.ARRAYS`).
+
+The same data as `sex_age_social_houses` has, `sex_age_social_houses_compact_wide` view exposes it in the
+`men_{0..100}`/`women_{0..100}` columns format for the compatibility.
+
+Columns:
+- `year` - year of distribution, integer
+- `scenario` - forecasting scenario, ForecastScenario enum
+- `building_id` - identifier of a building, integer
+- `social_group_id` - identifier of a social_group, integer
+- `men` - number of men of a given social_group by age (element 1 is age 0) for the year, smallint[]
+- `women` - number of women of a given social_group by age (element 1 is age 0) for the year, smallint[]
+"""
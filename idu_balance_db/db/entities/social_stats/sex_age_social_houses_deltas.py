@@ -0,0 +1,55 @@
+"""Sex-age-social_groups-houses people distribution table in a year-over-year delta layout is defined here."""
+from sqlalchemy import Column, Enum, ForeignKey, Index, SmallInteger, Table
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from idu_balance_db.db import metadata
+from idu_balance_db.db.entities.enums import ForecastScenario
+
+
+t_sex_age_social_houses_deltas = Table(
+    "sex_age_social_houses_deltas",
+    metadata,
+    Column("year", SmallInteger, primary_key=True, nullable=False),
+    Column("scenario", Enum(ForecastScenario, name="social_stats_scenario"), primary_key=True, nullable=False),
+    Column("building_id", ForeignKey("buildings.id"), primary_key=True, nullable=False),
+    Column("social_group_id", ForeignKey("social_groups.id"), primary_key=True, nullable=False),
+    Column("ages", ARRAY(SmallInteger, dimensions=1), nullable=False),
+    Column("men", ARRAY(SmallInteger, dimensions=1), nullable=False),
+    Column("women", ARRAY(SmallInteger, dimensions=1), nullable=False),
+    Index("sex_age_social_houses_deltas_building_id", "building_id"),
+    Index("sex_age_social_houses_deltas_social_group_id", "social_group_id"),
+    schema="social_stats",
+)
+"""sex-age-social_groups people distribution stored as sparse differences between consecutive years
+(`StorageLayout.DELTAS`).
+
+The start year and keyframe years (see `t_sex_age_social_houses_deltas_keyframes`) are stored in full (as a difference
+with an empty distribution), each other year as a difference with the previous year people one year older. Only
+changed ages of the buildings social groups with changes are stored. `sex_age_social_houses_deltas_year(year,
+scenario)` function reconstructs a year and `sex_age_social_houses_deltas_compact` view exposes all of the years
+in the `sex_age_social_houses_compact` format.
+
+Columns:
+- `year` - year of distribution, integer
+- `scenario` - forecasting scenario, ForecastScenario enum
+- `building_id` - identifier of a building, integer
+- `social_group_id` - identifier of a social_group, integer
+- `ages` - changed ages, smallint[]
+- `men` - difference of the number of men of a given social_group of each of the `ages`, smallint[]
+- `women` - difference of the number of women of a given social_group of each of the `ages`, smallint[]
+"""
+
+t_sex_age_social_houses_deltas_keyframes = Table(
+    "sex_age_social_houses_deltas_keyframes",
+    metadata,
+    Column("year", SmallInteger, primary_key=True, nullable=False),
+    Column("scenario", Enum(ForecastScenario, name="social_stats_scenario"), primary_key=True, nullable=False),
+    schema="social_stats",
+)
+"""Years of `sex_age_social_houses_deltas` stored in full for all of the buildings (keyframes), so a year is
+reconstructed from the differences of the years since the latest keyframe before it instead of all of the years.
+
+Columns:
+- `year` - keyframe year, integer
+- `scenario` - forecasting scenario, ForecastScenario enum
+"""
@@ -0,0 +1,31 @@
+"""Sex-age-social_groups-houses people distribution of named scenarios sweeps table is defined here."""
+from sqlalchemy import Column, ForeignKey, Index, SmallInteger, String, Table
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from idu_balance_db.db import metadata
+
+
+t_sex_age_social_houses_sweeps = Table(
+    "sex_age_social_houses_sweeps",
+    metadata,
+    Column("year", SmallInteger, primary_key=True, nullable=False),
+    Column("scenario", String(32), primary_key=True, nullable=False),
+    Column("building_id", ForeignKey("buildings.id"), primary_key=True, nullable=False),
+    Column("social_group_id", ForeignKey("social_groups.id"), primary_key=True, nullable=False),
+    Column("men", ARRAY(SmallInteger, dimensions=1), nullable=False),
+    Column("women", ARRAY(SmallInteger, dimensions=1), nullable=False),
+    Index("sex_age_social_houses_sweeps_building_id", "building_id"),
+    schema="social_stats",
+)
+"""sex-age-social_groups people distribution of scenarios sweeps (`--sweep-survivability`/`--sweep-fertility`)
+in the compact (array columns) layout.
+
+Columns:
+- `year` - year of forecast, integer
+- `scenario` - name of the sweep scenario (like `s0.90_f1.10` for survivability multiplier of 0.9 and fertility
+  multiplier of 1.1), varchar(32)
+- `building_id` - identifier of a building, integer
+- `social_group_id` - identifier of a social_group, integer
+- `men` - number of men of a given social_group by age (element 1 is age 0) for the year, smallint[]
+- `women` - number of women of a given social_group by age (element 1 is age 0) for the year, smallint[]
+"""
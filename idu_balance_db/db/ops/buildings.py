@@ -43,6 +43,40 @@ def get_buildings_municipality(conn: Connection, municipality_id) -> pd.DataFram
     )
 
 
+def get_city_buildings_territories(conn: Connection, city_id: int) -> pd.DataFrame:
+    """Return pandas DataFrame with living buildings of a given city and territories they belong to, containing
+    columns `building_id`, `administrative_unit_id`, `municipality_id`, `block_id`, `living_area` and
+    `population_balanced`.
+    """
+    return pd.DataFrame(
+        conn.execute(
+            select(
+                t_buildings.c.id,
+                t_physical_objects.c.administrative_unit_id,
+                t_physical_objects.c.municipality_id,
+                t_physical_objects.c.block_id,
+                t_buildings.c.living_area,
+                t_buildings.c.population_balanced,
+            )
+            .select_from(t_buildings)
+            .join(t_physical_objects, t_buildings.c.physical_object_id == t_physical_objects.c.id)
+            .where(
+                (t_physical_objects.c.city_id == city_id)
+                & (t_buildings.c.is_living == True)  # pylint: disable=singleton-comparison
+            )
+            .order_by(t_buildings.c.id)
+        ),
+        columns=[
+            "building_id",
+            "administrative_unit_id",
+            "municipality_id",
+            "block_id",
+            "living_area",
+            "population_balanced",
+        ],
+    )
+
+
 def update_house_population(conn: Connection, house_id: int, population: int) -> None:
     """Update house population"""
     conn.execute(update(t_buildings).values(population_balanced=population).where(t_buildings.c.id == house_id))
@@ -0,0 +1,43 @@
+"""Database indexes and query plans operations are defined here."""
+from sqlalchemy import Connection, Executable, Index, text
+
+
+def get_create_index_sql(index: Index, concurrently: bool = False) -> str:
+    """Return idempotent PostgreSQL CREATE INDEX statement for the given index definition."""
+    table = index.table
+    table_name = f"{table.schema}.{table.name}" if table.schema is not None else table.name
+    columns = ", ".join(column.name for column in index.columns)
+    return (
+        f"CREATE {'UNIQUE ' if index.unique else ''}INDEX {'CONCURRENTLY ' if concurrently else ''}"
+        f"IF NOT EXISTS {index.name} ON {table_name} ({columns})"
+    )
+
+
+def index_exists(conn: Connection, index: Index) -> bool:
+    """Check if the index with the given definition name exists in its table schema."""
+    return conn.execute(
+        text("SELECT EXISTS(SELECT 1 FROM pg_indexes WHERE schemaname = :schema AND indexname = :name)"),
+        {"schema": index.table.schema or "public", "name": index.name},
+    ).scalar_one()
+
+
+def is_index_valid(conn: Connection, index: Index) -> bool:
+    """Check if the index is valid, as failed CREATE INDEX CONCURRENTLY leaves an invalid index which is not used."""
+    return conn.execute(
+        text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON i.indexrelid = c.oid"
+            " JOIN pg_namespace n ON c.relnamespace = n.oid WHERE n.nspname = :schema AND c.relname = :name"
+        ),
+        {"schema": index.table.schema or "public", "name": index.name},
+    ).scalar_one_or_none() in (True, None)
+
+
+def create_index(conn: Connection, index: Index, concurrently: bool = False) -> None:
+    """Create index if it does not exist. Connection must be in autocommit mode for the `concurrently` creation."""
+    conn.execute(text(get_create_index_sql(index, concurrently)))
+
+
+def explain(conn: Connection, statement: Executable) -> list[str]:
+    """Return PostgreSQL query plan lines of the given statement (without executing it)."""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    return [line for (line,) in conn.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params)]
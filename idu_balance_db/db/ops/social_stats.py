@@ -0,0 +1,348 @@
+"""Operations with sex-age-social_groups-houses people distribution storage layouts are defined here."""
+from __future__ import annotations
+
+from typing import Iterable
+
+from sqlalchemy import ColumnElement, Connection, Table, TableClause, column, delete, select, table, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql.functions import count, now
+
+from idu_balance_db.db.entities import t_buildings, t_physical_objects
+from idu_balance_db.db.entities.enums import ForecastScenario, StorageLayout
+from idu_balance_db.db.entities.social_stats import (
+    t_forecast_results_models,
+    t_sex_age_social_houses,
+    t_sex_age_social_houses_base,
+    t_sex_age_social_houses_compact,
+    t_sex_age_social_houses_compact_base,
+    t_sex_age_social_houses_deltas,
+    t_sex_age_social_houses_deltas_keyframes,
+)
+
+
+COMPACT_WIDE_VIEW_NAME = "sex_age_social_houses_compact_wide"
+"""Name of the social_stats view exposing compact layout table in the `sex_age_social_houses` columns format."""
+
+DELTAS_YEAR_FUNCTION_NAME = "sex_age_social_houses_deltas_year"
+"""Name of the social_stats function reconstructing a year of the deltas layout in the compact layout format."""
+
+DELTAS_COMPACT_VIEW_NAME = "sex_age_social_houses_deltas_compact"
+"""Name of the social_stats view exposing all of the years of the deltas layout in the compact layout format."""
+
+COMPACT_RESOLVED_WIDE_VIEW_NAME = "sex_age_social_houses_compact_resolved_wide"
+"""Name of the social_stats view exposing compact layout resolved view in the `sex_age_social_houses` columns format."""
+
+DELTAS_WIDE_VIEW_NAME = "sex_age_social_houses_deltas_wide"
+"""Name of the social_stats view exposing all of the years of the deltas layout in the `sex_age_social_houses` columns
+format."""
+
+
+def get_sex_age_social_houses_table(layout: StorageLayout) -> Table:
+    """Return people distribution table of the given storage layout."""
+    if layout == StorageLayout.DELTAS:
+        return t_sex_age_social_houses_deltas
+    return t_sex_age_social_houses_compact if layout == StorageLayout.ARRAYS else t_sex_age_social_houses
+
+
+def get_people_source(layout: StorageLayout, base_year_once: bool = False) -> Table | TableClause:
+    """Return table or view to read people distribution of the given storage layout from: the table itself,
+    its `*_resolved` view if the base year is saved once or the reconstructed years view of the deltas layout (which
+    has the compact layout columns)."""
+    if layout == StorageLayout.DELTAS:
+        return table(
+            DELTAS_COMPACT_VIEW_NAME,
+            *(column(col.name, col.type) for col in t_sex_age_social_houses_compact.columns),
+            schema=t_sex_age_social_houses_deltas.schema,
+        )
+    if base_year_once:
+        return get_resolved_view(layout)
+    return get_sex_age_social_houses_table(layout)
+
+
+def get_base_year_table(layout: StorageLayout) -> Table:
+    """Return scenario-independent base year people distribution table of the given storage layout."""
+    return t_sex_age_social_houses_compact_base if layout == StorageLayout.ARRAYS else t_sex_age_social_houses_base
+
+
+def get_resolved_view(layout: StorageLayout) -> TableClause:
+    """Return view of the given storage layout people distribution with the base year rows repeated for each
+    scenario, which has the same columns as the people distribution table."""
+    people_table = get_sex_age_social_houses_table(layout)
+    return table(
+        f"{people_table.name}_resolved",
+        *(column(col.name, col.type) for col in people_table.columns),
+        schema=people_table.schema,
+    )
+
+
+def create_base_year_storage(conn: Connection, layout: StorageLayout = StorageLayout.COLUMNS) -> None:
+    """Create base year table of the given storage layout (if it is missing) and the view resolving its rows for each
+    scenario together with the people distribution table rows (and its `men_{i}`/`women_{i}` columns view for the
+    arrays layout)."""
+    people_table = get_sex_age_social_houses_table(layout)
+    base_table = get_base_year_table(layout)
+    base_table.create(conn, checkfirst=True)
+    columns = ", ".join(col.name for col in base_table.columns if col.name not in ("year", "building_id"))
+    conn.execute(
+        text(
+            f"CREATE OR REPLACE VIEW {people_table.schema}.{get_resolved_view(layout).name} AS"
+            f" SELECT year, scenario, building_id, {columns}"
+            f" FROM {people_table.schema}.{people_table.name}"
+            " UNION ALL"
+            f" SELECT b.year, s.scenario, b.building_id, {columns}"
+            f" FROM {base_table.schema}.{base_table.name} b"
+            " CROSS JOIN unnest(enum_range(NULL::social_stats_scenario)) AS s(scenario)"
+        )
+    )
+    if layout == StorageLayout.ARRAYS:
+        _create_wide_view(conn, COMPACT_RESOLVED_WIDE_VIEW_NAME, get_resolved_view(layout).name)
+
+
+def get_people_sum_sql(layout: StorageLayout, max_age: int = 100) -> str:
+    """Return SQL expression of the total number of people of a row of people distribution table."""
+    if layout in (StorageLayout.ARRAYS, StorageLayout.DELTAS):
+        return "(SELECT coalesce(sum(people), 0) FROM unnest(men || women) people)"
+    return "(" + " + ".join(f"men_{i} + women_{i}" for i in range(max_age + 1)) + ")"
+
+
+def create_compact_storage(conn: Connection, max_age: int = 100) -> None:
+    """Create compact layout table (if it is missing) and its compatibility view with `men_{i}`/`women_{i}` columns."""
+    t_sex_age_social_houses_compact.create(conn, checkfirst=True)
+    _create_wide_view(conn, COMPACT_WIDE_VIEW_NAME, t_sex_age_social_houses_compact.name, max_age)
+
+
+def _create_wide_view(conn: Connection, view_name: str, source_name: str, max_age: int = 100) -> None:
+    """Create or replace social_stats view exposing the social_stats relation in the compact layout format in the
+    `sex_age_social_houses` columns format."""
+    ages_columns = ", ".join(
+        [f"men[{i + 1}] AS men_{i}" for i in range(max_age + 1)]
+        + [f"women[{i + 1}] AS women_{i}" for i in range(max_age + 1)]
+    )
+    conn.execute(
+        text(
+            f"CREATE OR REPLACE VIEW social_stats.{view_name} AS"
+            f" SELECT year, scenario, building_id, social_group_id, {ages_columns}"
+            f" FROM social_stats.{source_name}"
+        )
+    )
+
+
+def create_deltas_storage(conn: Connection, max_age: int = 100) -> None:
+    """Create deltas layout table and its keyframes table (if they are missing), the function reconstructing a year of
+    it and the views exposing all of the stored years in the compact layout and `sex_age_social_houses` columns formats.
+
+    People of a birth year cohort (age minus year) keep their cohort from year to year, so a year people of an age are
+    the sum of the cohort differences of the years up to it since the latest keyframe year (which is stored in full,
+    see `is_keyframe_year`), cohorts older than `max_age` are left out. Without a keyframe before the year the sum
+    starts with the start year, so reading Y years of a scenario from the view aggregates O(Y * K) differences rows
+    for keyframes interval K instead of O(Y^2).
+    """
+    t_sex_age_social_houses_deltas.create(conn, checkfirst=True)
+    t_sex_age_social_houses_deltas_keyframes.create(conn, checkfirst=True)
+    deltas_table = f"{t_sex_age_social_houses_deltas.schema}.{t_sex_age_social_houses_deltas.name}"
+    keyframes_table = (
+        f"{t_sex_age_social_houses_deltas_keyframes.schema}.{t_sex_age_social_houses_deltas_keyframes.name}"
+    )
+    conn.execute(
+        text(
+            f"CREATE OR REPLACE FUNCTION social_stats.{DELTAS_YEAR_FUNCTION_NAME}("
+            "   target_year integer, target_scenario social_stats_scenario"
+            ") RETURNS TABLE (building_id integer, social_group_id integer, men smallint[], women smallint[])"
+            " LANGUAGE sql STABLE AS $$"
+            " WITH keyframe AS ("
+            "   SELECT coalesce(max(kf.year), -32768) AS year"
+            f"   FROM {keyframes_table} kf"
+            "   WHERE kf.scenario = target_scenario AND kf.year <= target_year"
+            " ), cohorts AS ("
+            "   SELECT d.building_id, d.social_group_id, u.age + target_year - d.year AS age,"
+            "       sum(u.men) AS men, sum(u.women) AS women"
+            f"   FROM {deltas_table} d"
+            "       CROSS JOIN unnest(d.ages, d.men, d.women) AS u(age, men, women)"
+            "   WHERE d.scenario = target_scenario AND d.year <= target_year"
+            "       AND d.year >= (SELECT keyframe.year FROM keyframe)"
+            f"       AND u.age + target_year - d.year <= {max_age}"
+            "   GROUP BY d.building_id, d.social_group_id, u.age + target_year - d.year"
+            "   HAVING sum(u.men) <> 0 OR sum(u.women) <> 0"
+            " )"
+            " SELECT k.building_id, k.social_group_id,"
+            "   array_agg(coalesce(c.men, 0)::smallint ORDER BY a.age),"
+            "   array_agg(coalesce(c.women, 0)::smallint ORDER BY a.age)"
+            " FROM (SELECT DISTINCT cohorts.building_id, cohorts.social_group_id FROM cohorts) k"
+            f"   CROSS JOIN generate_series(0, {max_age}) AS a(age)"
+            "   LEFT JOIN cohorts c"
+            "       ON c.building_id = k.building_id AND c.social_group_id = k.social_group_id AND c.age = a.age"
+            " GROUP BY k.building_id, k.social_group_id"
+            " $$"
+        )
+    )
+    conn.execute(
+        text(
+            f"CREATE OR REPLACE VIEW social_stats.{DELTAS_COMPACT_VIEW_NAME} AS"
+            " SELECT y.year, y.scenario, r.building_id, r.social_group_id, r.men, r.women"
+            f" FROM (SELECT DISTINCT year, scenario FROM {deltas_table}) y"
+            f"   CROSS JOIN LATERAL social_stats.{DELTAS_YEAR_FUNCTION_NAME}(y.year, y.scenario) r"
+        )
+    )
+    _create_wide_view(conn, DELTAS_WIDE_VIEW_NAME, DELTAS_COMPACT_VIEW_NAME, max_age)
+
+
+def get_matviews_sources(layout: StorageLayout, base_year_once: bool = False) -> list[str]:
+    """Return names of social_stats relations in the `sex_age_social_houses` columns format which expose all of the
+    results of a run with the given storage `layout`, so materialized views over the people distribution should read
+    one of them to see the run results."""
+    if layout == StorageLayout.DELTAS:
+        return [DELTAS_WIDE_VIEW_NAME]
+    if layout == StorageLayout.ARRAYS:
+        return (
+            [COMPACT_RESOLVED_WIDE_VIEW_NAME]
+            if base_year_once
+            else [COMPACT_WIDE_VIEW_NAME, COMPACT_RESOLVED_WIDE_VIEW_NAME]
+        )
+    resolved_name = get_resolved_view(layout).name
+    return [resolved_name] if base_year_once else [t_sex_age_social_houses.name, resolved_name]
+
+
+def get_mismatched_matviews(
+    conn: Connection, matviews: list[str], layout: StorageLayout, base_year_once: bool = False
+) -> dict[str, str]:
+    """Return the given social_stats materialized views which read a people distribution table or view other than
+    the ones exposing results of a run with the given storage `layout` (see `get_matviews_sources`), mapped to the
+    relation they read. Refreshing such a materialized view would not show the run results. Materialized views reading
+    other materialized views are not checked, as they are refreshed after the views they read.
+    """
+    people_relations = {
+        t_sex_age_social_houses.name,
+        get_resolved_view(StorageLayout.COLUMNS).name,
+        t_sex_age_social_houses_compact.name,
+        get_resolved_view(StorageLayout.ARRAYS).name,
+        COMPACT_WIDE_VIEW_NAME,
+        COMPACT_RESOLVED_WIDE_VIEW_NAME,
+        t_sex_age_social_houses_deltas.name,
+        DELTAS_COMPACT_VIEW_NAME,
+        DELTAS_WIDE_VIEW_NAME,
+    }
+    sources = get_matviews_sources(layout, base_year_once)
+    dependencies = conn.execute(
+        text(
+            "SELECT DISTINCT matview.relname, source.relname"
+            " FROM pg_depend d"
+            "   JOIN pg_rewrite r ON r.oid = d.objid"
+            "   JOIN pg_class matview ON matview.oid = r.ev_class"
+            "   JOIN pg_namespace n ON n.oid = matview.relnamespace"
+            "   JOIN pg_class source ON source.oid = d.refobjid"
+            " WHERE d.classid = 'pg_rewrite'::regclass AND d.refclassid = 'pg_class'::regclass"
+            "   AND n.nspname = 'social_stats' AND matview.relkind = 'm' AND matview.relname = ANY(:matviews)"
+            "   AND source.relnamespace = n.oid AND source.relname = ANY(:relations)"
+        ),
+        {"matviews": list(matviews), "relations": sorted(people_relations)},
+    )
+    return {matview: source for matview, source in dependencies if source not in sources}
+
+
+def _get_stale_rows_condition(
+    people_table: Table, city_id: int, year_begin: int, year_end: int, scenarios: list[ForecastScenario]
+) -> ColumnElement[bool]:
+    """Return condition of the given city buildings rows of the given scenarios with years outside the
+    [`year_begin`, `year_end`] range. It matches the (year, scenario, building_id) primary key prefix.
+    """
+    city_buildings = (
+        select(t_buildings.c.id)
+        .join(t_physical_objects, t_buildings.c.physical_object_id == t_physical_objects.c.id)
+        .where(t_physical_objects.c.city_id == city_id)
+    )
+    return (
+        ((people_table.c.year < year_begin) | (people_table.c.year > year_end))
+        & people_table.c.scenario.in_(scenarios)
+        & people_table.c.building_id.in_(city_buildings)
+    )
+
+
+def get_stale_forecast_years(  # pylint: disable=too-many-arguments
+    conn: Connection,
+    city_id: int,
+    year_begin: int,
+    year_end: int,
+    scenarios: list[ForecastScenario],
+    layout: StorageLayout = StorageLayout.COLUMNS,
+) -> list[tuple[int, ForecastScenario, int]]:
+    """Return (year, scenario, rows number) of the given city results left from previous runs with a different years
+    range for the given scenarios.
+    """
+    people_table = get_sex_age_social_houses_table(layout)
+    return [
+        tuple(row)
+        for row in conn.execute(
+            select(people_table.c.year, people_table.c.scenario, count())
+            .where(_get_stale_rows_condition(people_table, city_id, year_begin, year_end, scenarios))
+            .group_by(people_table.c.year, people_table.c.scenario)
+            .order_by(people_table.c.scenario, people_table.c.year)
+        )
+    ]
+
+
+def delete_stale_forecast_years(  # pylint: disable=too-many-arguments
+    conn: Connection,
+    city_id: int,
+    year_begin: int,
+    year_end: int,
+    scenarios: list[ForecastScenario],
+    layout: StorageLayout = StorageLayout.COLUMNS,
+) -> int:
+    """Delete the given city results of the given scenarios with years outside the [`year_begin`, `year_end`] range
+    with a single statement, returning number of rows deleted.
+    """
+    people_table = get_sex_age_social_houses_table(layout)
+    return conn.execute(
+        delete(people_table).where(_get_stale_rows_condition(people_table, city_id, year_begin, year_end, scenarios))
+    ).rowcount
+
+
+def delete_stale_base_years(
+    conn: Connection, city_id: int, year_begin: int, layout: StorageLayout = StorageLayout.COLUMNS
+) -> int:
+    """Delete the given city base year rows of years other than `year_begin`, returning number of rows deleted."""
+    base_table = get_base_year_table(layout)
+    city_buildings = (
+        select(t_buildings.c.id)
+        .join(t_physical_objects, t_buildings.c.physical_object_id == t_physical_objects.c.id)
+        .where(t_physical_objects.c.city_id == city_id)
+    )
+    return conn.execute(
+        delete(base_table).where((base_table.c.year != year_begin) & base_table.c.building_id.in_(city_buildings))
+    ).rowcount
+
+
+def set_forecast_results_model(  # pylint: disable=too-many-arguments
+    conn: Connection,
+    city_id: int,
+    scenarios: Iterable[ForecastScenario | str],
+    model: str,
+    year_begin: int,
+    years: int,
+    replicas: int = 1,
+) -> None:
+    """Record the forecast `model` value which has produced the given city scenarios results without committing,
+    replacing the previously recorded one."""
+    t_forecast_results_models.create(conn, checkfirst=True)
+    models_table = t_forecast_results_models
+    for scenario in scenarios:
+        statement = insert(models_table).values(
+            city_id=city_id,
+            scenario=scenario.value if isinstance(scenario, ForecastScenario) else scenario,
+            model=model,
+            year_begin=year_begin,
+            years=years,
+            replicas=replicas,
+        )
+        conn.execute(
+            statement.on_conflict_do_update(
+                index_elements=[models_table.c.city_id, models_table.c.scenario],
+                set_={
+                    "model": statement.excluded.model,
+                    "year_begin": statement.excluded.year_begin,
+                    "years": statement.excluded.years,
+                    "replicas": statement.excluded.replicas,
+                    "updated_at": now(),
+                },
+            )
+        )
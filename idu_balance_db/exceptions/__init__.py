@@ -1,2 +1,3 @@
 """Exceptions used in idu_balance_db are located here."""
 from .base import IduBalanceDbError
+from .dependencies import OptionalDependencyMissingError
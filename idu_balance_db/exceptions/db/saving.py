@@ -0,0 +1,41 @@
+"""Results saving exceptions are defined here."""
+from __future__ import annotations
+
+from .base import DatabaseLayerError
+
+
+class ResultsSavingError(DatabaseLayerError):
+    """Raised when a year of forecast results could not be saved to the database in the given number of attempts.
+
+    Houses are saved in the ascending identifiers order, so `next_house_id` is the first house which is not saved,
+    and the year can be saved starting from it (`balance-db save-year` resumes from it automatically).
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self, year: int, scenario: str, saved_houses: int, houses: int, attempts: int, next_house_id: int | None = None
+    ):
+        super().__init__(year, scenario, saved_houses, houses, attempts, next_house_id)
+        self.year = year
+        self.scenario = scenario
+        self.saved_houses = saved_houses
+        self.houses = houses
+        self.attempts = attempts
+        self.next_house_id = next_house_id
+
+    def __str__(self) -> str:
+        return (
+            f"Could not save year {self.year} of scenario '{self.scenario}' in {self.attempts} attempts,"
+            f" {self.saved_houses} of {self.houses} houses are saved"
+            + (f", next house id is {self.next_house_id}" if self.next_house_id is not None else "")
+        )
+
+
+class SaverProcessError(DatabaseLayerError):
+    """Raised when the results saving process has exited before all of the years were handed over to it."""
+
+    def __init__(self, exitcode: int | None):
+        super().__init__(exitcode)
+        self.exitcode = exitcode
+
+    def __str__(self) -> str:
+        return f"Saving process has exited unexpectedly with code {self.exitcode}"
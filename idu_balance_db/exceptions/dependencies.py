@@ -0,0 +1,17 @@
+"""Optional dependencies exceptions are defined here."""
+from .base import IduBalanceDbError
+
+
+class OptionalDependencyMissingError(IduBalanceDbError):
+    """Raised when a feature requiring an optional dependency is used, but the dependency is not installed."""
+
+    def __init__(self, package: str, extra: str):
+        super().__init__()
+        self.package = package
+        self.extra = extra
+
+    def __str__(self) -> str:
+        return (
+            f"Optional dependency '{self.package}' is not installed,"
+            f" install it with `pip install idu-balance-db[{self.extra}]`"
+        )
@@ -0,0 +1,386 @@
+"""In-memory numpy port of the population_restorator per-age forecasting is defined here.
+
+People of all houses for a year are kept in a single array with shape [<houses>, <social_groups>, 2, <ages>] (social
+groups in `SocialGroupsDistribution.get_combined_names()` order, as returned by `divide_houses`), and a batch of
+scenarios sharing the start year is forecasted together with an additional leading dimension. Each year people are
+aged by a year, and then for each age the total number of men and women in primary social groups is balanced to the
+forecasted ages totals, primary social groups of the houses deviating too far from the statistical distribution are
+corrected and additional social groups members are balanced to the expected number - all with vectorized operations
+over houses instead of queries and updates per house.
+
+Forecasted ages totals are the same as `population_restorator.forecaster.forecast_ages` ones, and balancing of the
+ages totals follows the same sampling weights, but the model intentionally differs from
+`population_restorator.forecaster.forecast_people` in the following:
+
+- primary social groups of a house are compared with the house people of the sex and age multiplied by the social
+  group probability, and only surpluses are moved to the other groups, preserving the house people number. The
+  original compares each row with itself multiplied by the social group share and sets it to 1.5 (or 1 / 1.5) of that
+  without moving the difference, so a year ends up below the forecasted ages totals as soon as any social group
+  share is less than a half;
+- additional social groups members are balanced to the number expected by division for each sex and age, while the
+  original additional social groups step selects primary social groups again and additional members are only aged;
+- the oldest age people are left out by the array shape (ages of the survivability coefficients), not by the oldest
+  age present in the start year database;
+- people are settled by houses capacities when no house has people of the sex, and removed proportionally to people
+  number when removal weights are all zeros (e.g. a single primary social group), where the original fails;
+- random numbers are drawn in a different order, so results of the same seed are equal in distribution only.
+
+`tests/test_array_forecast.py` checks the equivalence on a small synthetic city where the original correction steps
+are no-op.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Iterator
+
+import numpy as np
+from loguru import logger
+from population_restorator.models import SocialGroupsDistribution, SurvivabilityCoefficients
+
+
+BOYS_TO_GIRLS = 1.05
+FERTILITY_BEGIN = 20
+FERTILITY_END = 39
+MAX_TRIES_PER_AGE = 20
+
+
+@dataclass
+class SocialGroupsArrays:
+    """Social groups distribution probabilities used by the forecast balancing steps."""
+
+    social_groups: SocialGroupsDistribution
+
+    @cached_property
+    def primary_number(self) -> int:
+        """Number of primary social groups, which go first in the people arrays."""
+        return len(self.social_groups.primary)
+
+    @cached_property
+    def probabilities(self) -> np.ndarray:
+        """Probability for a person to be in a social group for each primary social group."""
+        return np.array([sg.probability for sg in self.social_groups.primary], dtype=float)
+
+    @cached_property
+    def sex_age_probabilities(self) -> np.ndarray:
+        """Probability for a person of a social group to be of the given sex and age with shape
+        [<social_groups>, 2, <ages>] for primary and then additional social groups."""
+        return np.array(
+            [
+                sg.distribution.as_probability_array()
+                for sg in self.social_groups.primary + self.social_groups.additional
+            ]
+        )
+
+    @cached_property
+    def primary_given_sex_age(self) -> np.ndarray:
+        """Probability for a person of the given sex and age to be in a primary social group with shape
+        [<primary_social_groups>, 2, <ages>]."""
+        return _normalize(self.sex_age_probabilities[: self.primary_number], axis=0)
+
+    @cached_property
+    def additional_given_sex_age(self) -> np.ndarray:
+        """Probability for a member of an additional social group of the given sex and age to be in the given
+        additional social group with shape [<additional_social_groups>, 2, <ages>]."""
+        return _normalize(self.sex_age_probabilities[self.primary_number :], axis=0)
+
+
+def _normalize(array: np.ndarray, axis: int) -> np.ndarray:
+    """Divide array by its sum over the given axis, leaving zero sums as zeros."""
+    total = array.sum(axis=axis, keepdims=True)
+    return np.divide(array, total, out=np.zeros_like(array, dtype=float), where=total > 0)
+
+
+def forecast_ages_totals(  # pylint: disable=too-many-arguments
+    people: np.ndarray,
+    primary_number: int,
+    years: int,
+    survivability_coefficients: SurvivabilityCoefficients,
+    fertility_coefficient: float,
+    boys_to_girls: float = BOYS_TO_GIRLS,
+    fertility_begin: int = FERTILITY_BEGIN,
+    fertility_end: int = FERTILITY_END,
+) -> np.ndarray:
+    """Forecast total number of men and women of each age in primary social groups for `years` years after the
+    start year `people` array, the same way as `population_restorator.forecaster.forecast_ages` does.
+
+    Returns array with shape [<years> + 1, 2, <ages>], first item is the start year.
+    """
+    ages = people.shape[-1]
+    coefficients = np.zeros((2, ages - 1))
+    for sex, sex_coefficients in enumerate((survivability_coefficients.men, survivability_coefficients.women)):
+        if len(sex_coefficients) != ages - 1:
+            logger.warning(
+                "Survivability coefficients are given for max age {}, but max age of people is {}. Using {}",
+                len(sex_coefficients),
+                ages - 1,
+                "zeros for the rest of ages" if len(sex_coefficients) < ages - 1 else "only the first coefficients",
+            )
+        sex_coefficients = np.asarray(sex_coefficients, dtype=float)[: ages - 1]
+        coefficients[sex, : sex_coefficients.shape[0]] = sex_coefficients
+
+    totals = np.zeros((years + 1, 2, ages), dtype=np.int64)
+    totals[0] = people[:, :primary_number].sum(axis=(0, 1))
+    for year in range(1, years + 1):
+        fertile_women = totals[year - 1, 1, fertility_begin : fertility_end + 1].sum()
+        totals[year, :, 1:] = (totals[year - 1, :, :-1] * coefficients).round()
+        totals[year, 0, 0] = int(fertile_women * fertility_coefficient / 2 * boys_to_girls)
+        totals[year, 1, 0] = int(fertile_women * fertility_coefficient / 2 * (1 / boys_to_girls))
+    return totals
+
+
+def _random_round(values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Round values up or down with equal chances."""
+    return np.where(rng.integers(0, 1, values.shape, endpoint=True) == 1, np.ceil(values), np.floor(values)).astype(
+        np.int64
+    )
+
+
+def _sample_rows(totals: np.ndarray, weights: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Distribute `totals` items of each row by the given non-negative weights with shape [<rows>, ...], returning
+    counts of the weights shape. Nothing is distributed in rows with all of the weights being zero.
+
+    Items are placed by searching uniform random numbers in the weights cumulative sums, which is the same as
+    a multinomial distribution, but much faster when the number of items is small compared to the number of weights.
+    """
+    flat = weights.reshape(weights.shape[0], -1)
+    cumulative = np.cumsum(flat, axis=1, dtype=float)
+    counts = np.zeros(flat.shape, dtype=np.int64)
+    for row in np.nonzero((totals > 0) & (cumulative[:, -1] > 0))[0]:
+        positions = np.searchsorted(cumulative[row], rng.random(totals[row]) * cumulative[row, -1], side="right")
+        counts[row] = np.bincount(np.minimum(positions, flat.shape[1] - 1), minlength=flat.shape[1])
+    return counts.reshape(weights.shape)
+
+
+def _balance_age_total(  # pylint: disable=too-many-arguments,too-many-locals
+    primary: np.ndarray,
+    needed: np.ndarray,
+    houses_people: np.ndarray,
+    capacity: np.ndarray,
+    increase_weights: np.ndarray,
+    decrease_weights: np.ndarray,
+    rng: np.random.Generator,
+    max_tries: int = MAX_TRIES_PER_AGE,
+) -> None:
+    """Increase or decrease people of a single sex and age of primary social groups `primary` with shape
+    [<scenarios>, <houses>, <primary_social_groups>] in place to get `needed` total number of each scenario.
+
+    New people are settled to houses with probability proportional to houses load (`houses_people` of the sex divided
+    by `capacity`) and social groups `increase_weights`, and removed with probability proportional to the people
+    number multiplied by social groups `decrease_weights`. Removals exceeding the number of people are discarded and
+    repeated up to `max_tries` times, and then people are removed evenly from houses in random order.
+    """
+    for _ in range(max_tries):
+        difference = needed - primary.sum(axis=(1, 2))
+        if not difference.any():
+            return
+        changed = False
+        # only scenarios which still need people added (or removed) are sampled
+        growing = np.nonzero(difference > 0)[0]
+        if growing.size > 0:
+            load = houses_people[growing] / capacity
+            load = np.where((load > 0).any(axis=1, keepdims=True), load, capacity)
+            increase = _sample_rows(difference[growing], load[:, :, None] * increase_weights, rng)
+            primary[growing] += increase
+            houses_people[growing] += increase.sum(axis=2)
+            changed = bool(increase.any())
+        shrinking = np.nonzero(difference < 0)[0]
+        if shrinking.size > 0:
+            shrinking_primary = primary[shrinking]
+            weights = shrinking_primary * decrease_weights
+            weights = np.where((weights > 0).any(axis=(1, 2), keepdims=True), weights, shrinking_primary)
+            decrease = np.minimum(_sample_rows(-difference[shrinking], weights, rng), shrinking_primary)
+            primary[shrinking] -= decrease
+            houses_people[shrinking] -= decrease.sum(axis=2)
+            changed = changed or bool(decrease.any())
+        if not changed:
+            break
+
+    for scenario in np.nonzero(primary.sum(axis=(1, 2)) > needed)[0]:
+        excess = int(primary[scenario].sum() - needed[scenario])
+        houses, sgs = np.nonzero(primary[scenario])
+        logger.trace("Removing {} people roughly after {} tries", excess, max_tries)
+        order = rng.permutation(houses.shape[0])
+        houses, sgs = houses[order], sgs[order]
+        each_change = max(1, excess // houses.shape[0])
+        removal = np.minimum(primary[scenario, houses, sgs], each_change)
+        removal = np.minimum(removal, np.maximum(excess - (np.cumsum(removal) - removal), 0))
+        primary[scenario, houses, sgs] -= removal
+        np.subtract.at(houses_people[scenario], houses, removal)
+
+
+def _balance_primary_social_groups(primary: np.ndarray, probabilities: np.ndarray, rng: np.random.Generator) -> None:
+    """Move people of a single sex and age between primary social groups of each house in place, preserving the house
+    total number, if the house has more than twice the number expected by `probabilities` (of the sex and age to be
+    in the social group) in a social group. Such a group is left with 1.5 of the expected number and the rest are
+    spread over the other social groups with the statistical probabilities.
+
+    `primary` can have any number of leading dimensions before the last social groups one.
+    """
+    flat = primary.reshape(-1, primary.shape[-1])
+    expected = flat.sum(axis=1, keepdims=True) * probabilities
+    surplus = (flat > expected * 2) & (flat > 0)
+    if not surplus.any():
+        return
+    houses = np.nonzero(surplus.any(axis=1))[0]
+    surplus = surplus[houses]
+    receiving_weights = np.where(surplus, 0.0, probabilities[None, :])
+    can_receive = receiving_weights.sum(axis=1) > 0
+    houses, surplus, receiving_weights = houses[can_receive], surplus[can_receive], receiving_weights[can_receive]
+    houses_primary = flat[houses]
+    moved = np.zeros_like(houses_primary)
+    moved[surplus] = houses_primary[surplus] - _random_round(expected[houses][surplus] * 1.5, rng)
+    flat[houses] = houses_primary - moved + rng.multinomial(moved.sum(axis=1), _normalize(receiving_weights, axis=1))
+    primary[...] = flat.reshape(primary.shape)
+
+
+def get_additional_expected(needed: np.ndarray, social_groups: SocialGroupsArrays) -> np.ndarray:
+    """Return the expected number of additional social groups members of each scenario, sex and age with shape
+    [<scenarios>, 2, <ages>, <additional_social_groups>] for the `needed` primary social groups people of each
+    scenario, sex and age.
+
+    As in division, `additional_probability` of all people are members of additional social groups, spread over
+    people of sexes and ages allowing any of them and then over the groups by their sex-age probabilities.
+    """
+    additional_given_sex_age = np.moveaxis(social_groups.additional_given_sex_age, 0, -1)
+    eligible_people = needed * (additional_given_sex_age.sum(axis=-1) > 0)
+    eligible_total = eligible_people.sum(axis=(1, 2), keepdims=True)
+    members = needed.sum(axis=(1, 2), keepdims=True) * social_groups.social_groups.get_additional_probability()
+    eligible_share = np.divide(
+        eligible_people, eligible_total, out=np.zeros_like(eligible_people, dtype=float), where=eligible_total > 0
+    )
+    return (members * eligible_share)[..., None] * additional_given_sex_age
+
+
+def _balance_additional_social_groups(
+    additional: np.ndarray, houses_people: np.ndarray, expected: np.ndarray, rng: np.random.Generator
+) -> None:
+    """Increase or decrease members of additional social groups of a single sex and age `additional` with shape
+    [<scenarios>, <houses>, <additional_social_groups>] in place to get the rounded `expected` number of each
+    scenario and group. New members are chosen in houses proportionally to `houses_people` of the sex and age, and
+    members are removed proportionally to their number in a house.
+    """
+    needed = np.round(expected).astype(np.int64)
+    for sg_idx in range(additional.shape[2]):
+        members = additional[:, :, sg_idx]
+        difference = needed[:, sg_idx] - members.sum(axis=1)
+        if not difference.any():
+            continue
+        increase = _sample_rows(np.maximum(difference, 0), houses_people, rng)
+        decrease = np.minimum(_sample_rows(np.maximum(-difference, 0), members, rng), members)
+        members += increase - decrease
+
+
+def forecast_year(  # pylint: disable=too-many-arguments,too-many-locals
+    previous: np.ndarray,
+    needed: np.ndarray,
+    capacity: np.ndarray,
+    social_groups: SocialGroupsArrays,
+    rng: np.random.Generator,
+    max_tries: int = MAX_TRIES_PER_AGE,
+) -> np.ndarray:
+    """Forecast the next year people array of each scenario from the `previous` one with shape
+    [<scenarios>, <houses>, <social_groups>, 2, <ages>]: age all people by a year (the last age people are gone), and
+    then for each sex and age balance primary social groups total to the `needed` array with shape
+    [<scenarios>, 2, <ages>], correct primary social groups of houses deviating from the distribution and balance
+    additional social groups members to the expected number.
+
+    `capacity` is an array of houses capacities (living area) used to settle new people.
+    """
+    # people are processed in [sex, age, scenarios, houses, social_groups] layout so each sex and age slice of all
+    # of the scenarios is contiguous
+    scenarios, houses, sgs, sexes, ages = previous.shape
+    people = np.zeros((sexes, ages, scenarios, houses, sgs), dtype=np.int64)
+    people[:, 1:] = previous.transpose(3, 4, 0, 1, 2)[:, :-1]
+    primary_number = social_groups.primary_number
+    additional_expected = get_additional_expected(needed, social_groups)
+    capacity = np.where(np.asarray(capacity, dtype=float) > 0, np.asarray(capacity, dtype=float), 1.0)
+
+    for sex in range(sexes):
+        houses_people = people[sex, :, :, :, :primary_number].sum(axis=(0, 3)).astype(float)
+        for age in range(ages):
+            primary = people[sex, age, :, :, :primary_number]
+            _balance_age_total(
+                primary,
+                needed[:, sex, age],
+                houses_people,
+                capacity,
+                social_groups.probabilities * social_groups.sex_age_probabilities[:primary_number, sex, age],
+                1 - social_groups.probabilities,
+                rng,
+                max_tries,
+            )
+            _balance_primary_social_groups(primary, social_groups.primary_given_sex_age[:, sex, age], rng)
+            if primary_number < sgs:
+                _balance_additional_social_groups(
+                    people[sex, age, :, :, primary_number:],
+                    primary.sum(axis=2),
+                    additional_expected[:, sex, age],
+                    rng,
+                )
+    return np.ascontiguousarray(people.transpose(2, 3, 4, 0, 1))
+
+
+def forecast_people_batch(  # pylint: disable=too-many-arguments
+    start: np.ndarray,
+    capacity: np.ndarray,
+    social_groups: SocialGroupsDistribution,
+    survivability_coefficients: list[SurvivabilityCoefficients],
+    fertility_coefficients: list[float],
+    years: int,
+    rng: np.random.Generator | None = None,
+) -> Iterator[np.ndarray]:
+    """Forecast people of the `start` year array with shape [<houses>, <social_groups>, 2, <ages>] for the given
+    number of `years` for a batch of scenarios (given by their survivability and fertility coefficients) at once,
+    yielding each next year array with shape [<scenarios>, <houses>, <social_groups>, 2, <ages>] as soon as it is
+    ready. All of the scenarios share the start year, unless `start` has an additional leading dimension with a start
+    year of each scenario (for example, of ensemble replicas).
+    """
+    if rng is None:
+        rng = np.random.default_rng(seed=int(time.time()))
+    arrays = SocialGroupsArrays(social_groups)
+    if start.ndim == 4:
+        start = np.broadcast_to(start, (len(survivability_coefficients), *start.shape))
+    totals = np.stack(
+        [
+            forecast_ages_totals(scenario_start, arrays.primary_number, years, coefficients, fertility_coefficient)
+            for scenario_start, coefficients, fertility_coefficient in zip(
+                start, survivability_coefficients, fertility_coefficients
+            )
+        ]
+    )
+    people = start
+    for year in range(1, years + 1):
+        people = forecast_year(people, totals[:, year], capacity, arrays, rng)
+        logger.debug(
+            "Forecasted year +{} of {} scenarios: {} men, {} women of primary social groups, {} additional social"
+            " groups members",
+            year,
+            people.shape[0],
+            int(people[:, :, : arrays.primary_number, 0].sum()),
+            int(people[:, :, : arrays.primary_number, 1].sum()),
+            int(people[:, :, arrays.primary_number :].sum()),
+        )
+        yield people
+
+
+def forecast_people_arrays(  # pylint: disable=too-many-arguments
+    start: np.ndarray,
+    capacity: np.ndarray,
+    social_groups: SocialGroupsDistribution,
+    survivability_coefficients: SurvivabilityCoefficients,
+    years: int,
+    fertility_coefficient: float,
+    rng: np.random.Generator | None = None,
+) -> Iterator[np.ndarray]:
+    """Forecast people of the `start` year array with shape [<houses>, <social_groups>, 2, <ages>] for the given
+    number of `years`, yielding each next year array as soon as it is ready.
+
+    Survivability coefficients and fertility coefficient are expected to be already multiplied by the scenario
+    multiplier.
+    """
+    for people in forecast_people_batch(
+        start, capacity, social_groups, [survivability_coefficients], [fertility_coefficient], years, rng
+    ):
+        yield people[0]
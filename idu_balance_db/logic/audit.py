@@ -0,0 +1,256 @@
+"""Post-run consistency audit of the forecast results is defined here.
+
+Results of each scenario are loaded to numpy arrays by `ForecastResultsReader` with a single streamed query, and the
+invariants are checked by vectorized operations over them instead of a SQL query for each invariant:
+
+- no people number is negative (values out of the smallint range cannot be stored, so they are not checked);
+- every living house has results for every year of the run;
+- start year people of the primary social groups of each house sum up to its balanced population;
+- start year people of the houses of each leaf territory sum up to the territory population;
+- municipalities totals of men and women are close to `age_sex_stat_municipalities` statistics, where it is present.
+
+With the deltas storage layout loading of the whole forecast range rebuilds each year from the differences since the
+latest keyframe year (see `create_deltas_storage`).
+"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from population_restorator.models import Territory
+from sqlalchemy import Connection, Engine, inspect, select
+
+from idu_balance_db.db.entities import t_age_sex_stat_municipalities
+from idu_balance_db.db.entities.enums import ForecastScenario, StorageLayout
+
+from .results import ForecastResults, ForecastResultsReader
+
+
+DEFAULT_MARGINALS_TOLERANCE = 0.05
+"""Relative difference of municipalities men and women totals with the statistics considered a mismatch."""
+
+
+@dataclass
+class AuditCheck:
+    """Result of a single invariant check: number of checked entities and number of those violating it."""
+
+    name: str
+    scenario: str
+    checked: int
+    mismatches: int
+
+    @property
+    def passed(self) -> bool:
+        """Whether the invariant holds for all of the checked entities."""
+        return self.mismatches == 0
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return check as a JSON-serializable dictionary."""
+        return asdict(self) | {"passed": self.passed}
+
+
+@dataclass
+class AuditReport:
+    """Results of all of the audit checks."""
+
+    checks: list[AuditCheck] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        """Whether all of the checks have passed."""
+        return all(check.passed for check in self.checks)
+
+    @property
+    def mismatches(self) -> int:
+        """Total number of mismatches of all of the checks."""
+        return sum(check.mismatches for check in self.checks)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return audit report as a JSON-serializable dictionary."""
+        return {
+            "passed": self.passed,
+            "mismatches": self.mismatches,
+            "checks": [check.to_dict() for check in self.checks],
+        }
+
+
+def check_cells(results: ForecastResults) -> AuditCheck:
+    """Check that no people number is negative."""
+    return AuditCheck(
+        "negative",
+        results.scenario.value,
+        results.men.size + results.women.size,
+        int((results.men < 0).sum() + (results.women < 0).sum()),
+    )
+
+
+def check_years_coverage(results: ForecastResults, houses_ids: Iterable[int]) -> AuditCheck:
+    """Check that each of the given houses has results rows for each year of the results range, counting missing
+    (house, year) pairs."""
+    houses = pd.Index(list(houses_ids))
+    positions = houses.get_indexer(results.buildings)
+    present = np.zeros((len(houses), results.year_end - results.year_begin + 1), dtype=bool)
+    known = positions >= 0
+    present[positions[known], results.years[known] - results.year_begin] = True
+    return AuditCheck("years_coverage", results.scenario.value, present.size, int(present.size - present.sum()))
+
+
+def _get_start_houses_population(results: ForecastResults, primary_social_groups_ids: Iterable[int]) -> pd.Series:
+    """Return start year people of the primary social groups of each house."""
+    rows = (results.years == results.year_begin) & np.isin(results.social_groups, list(primary_social_groups_ids))
+    people = results.men[rows].sum(axis=1, dtype=np.int64) + results.women[rows].sum(axis=1, dtype=np.int64)
+    return pd.Series(people).groupby(results.buildings[rows]).sum()
+
+
+def check_buildings_population(
+    results: ForecastResults, houses_population: pd.Series, primary_social_groups_ids: Iterable[int]
+) -> AuditCheck:
+    """Check that start year people of the primary social groups of each house sum up to its balanced population
+    (`houses_population` indexed by house id)."""
+    people = _get_start_houses_population(results, primary_social_groups_ids).reindex(
+        houses_population.index, fill_value=0
+    )
+    return AuditCheck(
+        "buildings_population",
+        results.scenario.value,
+        len(houses_population),
+        int((people.to_numpy() != houses_population.fillna(0).astype(int).to_numpy()).sum()),
+    )
+
+
+def get_leaf_territories(city_territory: Territory) -> tuple[pd.Series, pd.Series]:
+    """Return population of the leaf territories of the city indexed by "<outer>/<inner>" key and the leaf territory
+    key of each house indexed by house id."""
+    populations = {}
+    houses_territories = []
+    for outer_territory in city_territory.inner_territories:
+        for inner_territory in outer_territory.inner_territories:
+            key = f"{outer_territory.name}/{inner_territory.name}"
+            populations[key] = int(inner_territory.population or 0)
+            if inner_territory.houses is not None and inner_territory.houses.shape[0] > 0:
+                houses_territories.append(pd.Series(key, index=inner_territory.houses["id"].astype(int).to_numpy()))
+    houses = pd.concat(houses_territories) if houses_territories else pd.Series(dtype=object)
+    return pd.Series(populations, dtype=np.int64), houses
+
+
+def check_territories_population(
+    results: ForecastResults,
+    territories_population: pd.Series,
+    houses_territories: pd.Series,
+    primary_social_groups_ids: Iterable[int],
+) -> AuditCheck:
+    """Check that start year people of the primary social groups of each leaf territory houses sum up to the
+    territory population (see `get_leaf_territories`)."""
+    houses_people = _get_start_houses_population(results, primary_social_groups_ids)
+    people = (
+        houses_people.groupby(houses_territories.reindex(houses_people.index))
+        .sum()
+        .reindex(territories_population.index, fill_value=0)
+    )
+    return AuditCheck(
+        "territories_population",
+        results.scenario.value,
+        len(territories_population),
+        int((people.to_numpy() != territories_population.to_numpy()).sum()),
+    )
+
+
+def get_municipalities_marginals(
+    conn: Connection, municipalities_ids: Iterable[int], year_begin: int, year_end: int
+) -> pd.DataFrame | None:
+    """Return men and women totals of the given municipalities for each year of the range indexed by
+    (year, municipality_id) from `age_sex_stat_municipalities`, or None if the table is missing."""
+    if not inspect(conn).has_table(t_age_sex_stat_municipalities.name, schema=t_age_sex_stat_municipalities.schema):
+        return None
+    stat = t_age_sex_stat_municipalities
+    marginals = pd.DataFrame(
+        conn.execute(
+            select(stat.c.year, stat.c.municipality_id, stat.c.men, stat.c.women).where(
+                stat.c.municipality_id.in_(list(municipalities_ids)), stat.c.year.between(year_begin, year_end)
+            )
+        ).all(),
+        columns=["year", "municipality_id", "men", "women"],
+    )
+    return marginals.fillna(0).groupby(["year", "municipality_id"])[["men", "women"]].sum()
+
+
+def check_municipalities_marginals(
+    results: ForecastResults,
+    marginals: pd.DataFrame,
+    primary_social_groups_ids: Iterable[int],
+    tolerance: float = DEFAULT_MARGINALS_TOLERANCE,
+) -> AuditCheck:
+    """Check that men and women of the primary social groups of each (year, municipality) present in `marginals` (see
+    `get_municipalities_marginals`) differ from the statistics by not more than `tolerance` share, counting
+    mismatching (year, municipality, sex) totals."""
+    rows = np.isin(results.social_groups, list(primary_social_groups_ids))
+    totals = (
+        pd.DataFrame(
+            {
+                "year": results.years[rows],
+                "municipality_id": results.municipalities[rows],
+                "men": results.men[rows].sum(axis=1, dtype=np.int64),
+                "women": results.women[rows].sum(axis=1, dtype=np.int64),
+            }
+        )
+        .groupby(["year", "municipality_id"])[["men", "women"]]
+        .sum()
+        .reindex(marginals.index, fill_value=0)
+    )
+    expected = marginals[["men", "women"]].to_numpy(dtype=float)
+    difference = np.abs(totals.to_numpy(dtype=float) - expected)
+    return AuditCheck(
+        "municipalities_marginals",
+        results.scenario.value,
+        expected.size,
+        int((difference > tolerance * np.maximum(expected, 1)).sum()),
+    )
+
+
+def audit_forecast_results(  # pylint: disable=too-many-arguments,too-many-locals
+    engine: Engine,
+    city_id: int,
+    city_territory: Territory,
+    primary_social_groups_ids: list[int],
+    year_begin: int,
+    years: int,
+    scenarios: list[ForecastScenario],
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    base_year_once: bool = False,
+    marginals_tolerance: float = DEFAULT_MARGINALS_TOLERANCE,
+) -> AuditReport:
+    """Check the saved city results of each scenario against the balanced `city_territory` (with houses `population`
+    set by balancing) and municipalities statistics, returning the audit report.
+    """
+    reader = ForecastResultsReader(engine, layout=layout, base_year_once=base_year_once)
+    territories_population, houses_territories = get_leaf_territories(city_territory)
+    houses = city_territory.get_all_houses()
+    houses_population = houses.set_index("id")["population"] if houses.shape[0] > 0 else pd.Series(dtype=int)
+    living_houses_ids = houses_population[houses_population.fillna(0) > 0].index
+    report = AuditReport()
+    marginals: pd.DataFrame | None = None
+    marginals_loaded = False
+    for scenario in scenarios:
+        results = reader.load(city_id, scenario, year_begin, year_begin + years)
+        if not marginals_loaded:
+            marginals_loaded = True
+            municipalities_ids = np.unique(results.municipalities[results.municipalities >= 0]).tolist()
+            with engine.connect() as conn:
+                marginals = get_municipalities_marginals(conn, municipalities_ids, year_begin, year_begin + years)
+            if marginals is None:
+                logger.info("{} table is missing, skipping statistics check", t_age_sex_stat_municipalities.name)
+        report.checks.append(check_cells(results))
+        report.checks.append(check_years_coverage(results, living_houses_ids))
+        report.checks.append(check_buildings_population(results, houses_population, primary_social_groups_ids))
+        report.checks.append(
+            check_territories_population(results, territories_population, houses_territories, primary_social_groups_ids)
+        )
+        if marginals is not None and marginals.shape[0] > 0:
+            report.checks.append(
+                check_municipalities_marginals(results, marginals, primary_social_groups_ids, marginals_tolerance)
+            )
+        reader.cache.clear()
+    return report
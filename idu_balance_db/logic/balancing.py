@@ -34,11 +34,19 @@ def _syncronize_inner_territory(
         syncronize_municipality_population(conn, territory_id, population)
 
 
-def balance_houses_from_territory(conn: Connection, city_territory: Territory) -> pd.DataFrame:
-    """Balance territories and houses and save updated data to the database."""
+def balance_city(city_territory: Territory) -> pd.DataFrame:
+    """Balance territories and houses population in memory and return all of the city houses."""
     logger.info("Balancing city territories")
     balance_territories(city_territory)
 
+    logger.info("Balancing city houses")
+    balance_houses(city_territory)
+
+    return city_territory.get_all_houses()
+
+
+def save_balanced_city(conn: Connection, city_territory: Territory, houses_df: pd.DataFrame) -> None:
+    """Save balanced territories population and buildings `population_balanced` to the database."""
     for outer_territory in city_territory.inner_territories:
         _syncronize_outer_territory(
             conn, city_territory.name[-5:], int(outer_territory.name), outer_territory.population
@@ -48,14 +56,14 @@ def balance_houses_from_territory(conn: Connection, city_territory: Territory) -
                 conn, city_territory.name[-5:], int(inner_territory.name), inner_territory.population
             )
 
-    logger.info("Balancing city houses")
-    balance_houses(city_territory)
-
-    houses_df = city_territory.get_all_houses()
-
     logger.info("Updating buildings population_balanced")
 
     for house_id, population in houses_df[["id", "population"]].set_index("id")["population"].items():
         update_house_population(conn, int(house_id), int(population))
 
+
+def balance_houses_from_territory(conn: Connection, city_territory: Territory) -> pd.DataFrame:
+    """Balance territories and houses and save updated data to the database."""
+    houses_df = balance_city(city_territory)
+    save_balanced_city(conn, city_territory, houses_df)
     return houses_df
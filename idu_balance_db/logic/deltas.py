@@ -0,0 +1,194 @@
+"""Year-over-year delta encoding of the people distribution (`StorageLayout.DELTAS`) is defined here.
+
+People of a year are mostly the people of the previous year who became one year older, so each year after the start
+is stored as a difference with the previous year people shifted by one age, which is zero for the most of the ages
+of the most of the houses. Only changed ages of (house, social group) pairs with changes are stored, while the start
+year and each year divisible by `KEYFRAME_INTERVAL` (keyframes) are stored in full as a difference with the empty
+distribution. A year is reconstructed by summing differences of the years since the latest keyframe or the start year,
+in the database by `social_stats.sex_age_social_houses_deltas_year` function (see `create_deltas_storage`) and in
+memory by `decode_year_delta`. Years forecasted in temporary databases are read to arrays by `read_year_people_array`
+to be encoded.
+"""
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+from population_restorator.db.entities import t_population_divided, t_social_groups_probabilities
+from sqlalchemy import Connection, Row, delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from idu_balance_db.db.entities.enums import ForecastScenario
+from idu_balance_db.db.entities.social_stats import (
+    t_sex_age_social_houses_deltas,
+    t_sex_age_social_houses_deltas_keyframes,
+)
+from idu_balance_db.utils.streaming import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_INSERT_BATCH_SIZE,
+    batched,
+    insert_batched,
+    stream_rows,
+)
+
+
+KEYFRAME_INTERVAL = 5
+"""Years divisible by this number are stored in full (keyframes), so reconstruction of a year sums differences of not
+more than this number of years."""
+
+
+def age_people(people: np.ndarray) -> np.ndarray:
+    """Return people array with shape [..., <ages>] of the next year without any births, deaths or migration: each
+    age people become one year older and the oldest age people are left out."""
+    aged = np.zeros_like(people)
+    aged[..., 1:] = people[..., :-1]
+    return aged
+
+
+def encode_people_delta(people: np.ndarray, previous: np.ndarray | None = None) -> np.ndarray:
+    """Return difference of the year people array with the `previous` year people one year older, or the people array
+    itself for the start year (`previous` is None)."""
+    if previous is None:
+        return people.copy()
+    return people - age_people(previous)
+
+
+def decode_people_delta(delta: np.ndarray, previous: np.ndarray | None = None) -> np.ndarray:
+    """Return the year people array from its difference with the `previous` year people (inverse of
+    `encode_people_delta`)."""
+    if previous is None:
+        return delta.copy()
+    return delta + age_people(previous)
+
+
+def is_keyframe_year(year: int) -> bool:
+    """Return whether the year is stored in full as a keyframe of the deltas layout."""
+    return year % KEYFRAME_INTERVAL == 0
+
+
+def encode_year_delta(people: np.ndarray, previous: np.ndarray | None, year: int) -> np.ndarray:
+    """Return stored difference of the `year` people array: the array itself for a keyframe year or the start year
+    (`previous` is None), or the difference with the `previous` year people one year older otherwise."""
+    return encode_people_delta(people, None if is_keyframe_year(year) else previous)
+
+
+def decode_year_delta(delta: np.ndarray, previous: np.ndarray | None, year: int) -> np.ndarray:
+    """Return the `year` people array from its stored difference (inverse of `encode_year_delta`)."""
+    return decode_people_delta(delta, None if is_keyframe_year(year) else previous)
+
+
+def get_temporary_social_groups(year_conn: Connection) -> dict[int, int]:
+    """Return mapping of all of the temporary database social groups identifiers to the main database ones (which are
+    stored as temporary social groups names), including social groups without population."""
+    return {
+        sg_id: int(sg_name)
+        for sg_id, sg_name in year_conn.execute(
+            select(t_social_groups_probabilities.c.id, t_social_groups_probabilities.c.name)
+        )
+    }
+
+
+def read_year_people_array(  # pylint: disable=too-many-arguments
+    year_conn: Connection,
+    year: int,
+    houses_ids: list[int],
+    social_groups_ids: list[int],
+    db_max_age: int = 100,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> np.ndarray:
+    """Read people of the given houses from the temporary year database to an array with shape
+    [<houses>, <social_groups>, 2, <db_max_age + 1>], ordered as `houses_ids` and `social_groups_ids` (main database
+    identifiers). Rows are streamed and placed to the array by `batch_size` batches.
+    """
+    people = np.zeros((len(houses_ids), len(social_groups_ids), 2, db_max_age + 1), dtype=np.int32)
+    if len(houses_ids) == 0:
+        return people
+    houses = pd.Index(houses_ids)
+    temporary_social_groups = get_temporary_social_groups(year_conn)
+    social_groups = pd.Series(
+        pd.Index(social_groups_ids).get_indexer(list(temporary_social_groups.values())),
+        index=list(temporary_social_groups.keys()),
+    )
+    rows = stream_rows(
+        year_conn,
+        select(
+            t_population_divided.c.house_id,
+            t_population_divided.c.social_group_id,
+            t_population_divided.c.age,
+            t_population_divided.c.men,
+            t_population_divided.c.women,
+        ).where(
+            (t_population_divided.c.year == year)
+            & (t_population_divided.c.age <= db_max_age)
+            & t_population_divided.c.house_id.between(min(houses_ids), max(houses_ids))
+        ),
+        batch_size=batch_size,
+    )
+    for batch in batched(rows, batch_size):
+        _place_people_rows(people, batch, houses, social_groups)
+    return people
+
+
+def _place_people_rows(people: np.ndarray, rows: list[Row], houses: pd.Index, social_groups: pd.Series) -> None:
+    """Place (house_id, social_group_id, age, men, women) rows of the temporary database to the people array by
+    houses index and temporary social groups identifiers mapped to the array social groups positions (-1 if unknown),
+    skipping unknown houses and social groups."""
+    house_id, sg_id, age, men, women = (np.array(column) for column in zip(*rows))
+    houses_idx = houses.get_indexer(house_id)
+    sgs_idx = social_groups.reindex(sg_id, fill_value=-1).to_numpy()
+    known = (houses_idx >= 0) & (sgs_idx >= 0)
+    people[houses_idx[known], sgs_idx[known], 0, age[known]] = men[known]
+    people[houses_idx[known], sgs_idx[known], 1, age[known]] = women[known]
+
+
+def save_people_delta_to_database(  # pylint: disable=too-many-arguments
+    conn: Connection,
+    delta: np.ndarray,
+    houses_ids: list[int],
+    social_groups_ids: list[int],
+    year: int,
+    scenario: ForecastScenario,
+    db_max_age: int = 100,
+    insert_batch_size: int = DEFAULT_INSERT_BATCH_SIZE,
+) -> int:
+    """Save a year people difference array with shape [<houses>, <social_groups>, 2, <ages>] (see
+    `encode_year_delta`) to `social_stats.sex_age_social_houses_deltas`, replacing the given houses rows. A keyframe
+    year (see `is_keyframe_year`) is also registered in `social_stats.sex_age_social_houses_deltas_keyframes`.
+
+    Only (house, social group) pairs with changes are inserted with the changed ages. Returns number of rows inserted.
+    """
+    table = t_sex_age_social_houses_deltas
+    for houses_batch in batched(houses_ids):
+        conn.execute(
+            delete(table).where(
+                table.c.year == year,
+                table.c.scenario == scenario,
+                table.c.building_id.in_(houses_batch),
+            )
+        )
+    changed = delta[..., : db_max_age + 1].any(axis=2)
+    houses_idx, sgs_idx = np.nonzero(changed.any(axis=2))
+
+    def house_social_groups_deltas() -> Iterable[dict[str, Any]]:
+        """Yield insertion parameters for each (house, social group) pair with changes."""
+        for house_idx, sg_idx in zip(houses_idx.tolist(), sgs_idx.tolist()):
+            ages = np.flatnonzero(changed[house_idx, sg_idx])
+            men, women = delta[house_idx, sg_idx][:, ages].tolist()
+            yield {
+                "year": year,
+                "scenario": scenario,
+                "building_id": houses_ids[house_idx],
+                "social_group_id": social_groups_ids[sg_idx],
+                "ages": ages.tolist(),
+                "men": men,
+                "women": women,
+            }
+
+    if is_keyframe_year(year):
+        conn.execute(
+            insert(t_sex_age_social_houses_deltas_keyframes)
+            .values(year=year, scenario=scenario)
+            .on_conflict_do_nothing()
+        )
+    return insert_batched(conn, insert(table), house_social_groups_deltas(), insert_batch_size)
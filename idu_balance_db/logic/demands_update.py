@@ -1,19 +1,42 @@
 """Services demands update logic is defined here."""
+from contextlib import nullcontext
+
+import numpy as np
 import pandas as pd
 from loguru import logger
 from numpy import isnan, nan
 from sqlalchemy import Engine, text
-from tqdm import tqdm, trange
 
-from idu_balance_db.db.entities.enums import ForecastScenario
+from idu_balance_db.db.entities.enums import ForecastScenario, StorageLayout
+from idu_balance_db.db.ops.social_stats import get_people_source, get_people_sum_sql
+from idu_balance_db.utils.progress import track
+from idu_balance_db.utils.streaming import stream_scalars, stream_series
 
 
-def update_demands_table(  # pylint: disable=too-many-locals,too-many-branches,too-many-statements
-    engine: Engine, city_id: int, start_year: int, years: int, scenario: ForecastScenario = ForecastScenario.mod
+def update_demands_table(  # pylint: disable=too-many-arguments,too-many-locals,too-many-branches,too-many-statements
+    engine: Engine,
+    city_id: int,
+    start_year: int,
+    years: int,
+    scenario: ForecastScenario = ForecastScenario.mod,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    services_engine: Engine | None = None,
+    base_year_once: bool = False,
+    primary_social_groups_ids: list[int] | None = None,
 ) -> None:
-    """Update services-buildings demands table for the given city."""
+    """Update services-buildings demands table for the given city. People distribution is read from the table of
+    the given storage `layout` (or its `*_resolved` view if the base year is saved once, or reconstructed years view
+    of the deltas layout). Buildings population is the sum of the primary social groups people (all of the social
+    groups if `primary_social_groups_ids` is not given), and social groups population is the sum of all of the social
+    groups people. Services types, normatives and social groups of services are read from `services_engine` (a city
+    snapshot database) if it is given."""
     scenario_name = scenario.value
-    with engine.connect() as conn:
+    people_table = get_people_source(layout, base_year_once)
+    people_table_name = f"{people_table.schema}.{people_table.name}"
+    primary_filter = "   AND social_group_id IN :primary_social_groups" if primary_social_groups_ids else ""
+    with engine.connect() as conn, (
+        services_engine.connect() if services_engine is not None else nullcontext(conn)
+    ) as services_conn:
         logger.debug("Creating temporary buildings table")
         conn.execute(
             text(
@@ -27,24 +50,24 @@ def update_demands_table(  # pylint: disable=too-many-locals,too-many-branches,t
             {"city_id": city_id},
         )
         logger.debug("Selecting city buildings")
-        city_buildings = (
-            conn.execute(
+        city_buildings = np.fromiter(
+            stream_scalars(
+                conn,
                 text(
                     " SELECT DISTINCT building_id"
-                    " FROM social_stats.sex_age_social_houses"
+                    f" FROM {people_table_name}"
                     " WHERE building_id in (SELECT id FROM city_buildings)"
                     " ORDER BY 1"
                 ),
                 {"city_id": city_id},
-            )
-            .scalars()
-            .all()
+            ),
+            dtype=np.int64,
         )
-        houses = pd.DataFrame([[h] for h in city_buildings], columns=["building_id"]).set_index("building_id")
+        houses = pd.DataFrame(index=pd.Index(city_buildings, name="building_id"))
 
         services_normatives: dict[str, float] = {
             service: norm / 1000
-            for service, norm in conn.execute(
+            for service, norm in services_conn.execute(
                 text(
                     "SELECT st.code, normative FROM provision.normatives"
                     " JOIN city_service_types st ON city_service_type_id = st.id"
@@ -52,13 +75,12 @@ def update_demands_table(  # pylint: disable=too-many-locals,too-many-branches,t
             )
         }
 
-        men_column = "(" + "+".join(f"men_{i}" for i in range(101)) + ")"
-        women_column = "(" + "+".join(f"women_{i}" for i in range(101)) + ")"
+        people_sum = get_people_sum_sql(layout)
 
         houses_year = houses.copy()
         city_df = pd.DataFrame()
         logger.info("Calculating demands")
-        for year in trange(start_year, start_year + years + 1, desc="years"):
+        for year in track(range(start_year, start_year + years + 1), "demands", scenario=scenario_name):
             logger.debug("Calculating demands for year {}", year)
             if "year" in city_df.columns and year in city_df["year"].unique().tolist():
                 continue
@@ -70,50 +92,57 @@ def update_demands_table(  # pylint: disable=too-many-locals,too-many-branches,t
                 houses_year = houses.copy()
                 houses_year["year"] = year
             if "year_population_sgs" not in houses_year.columns:
-                res = conn.execute(
+                res = stream_series(
+                    conn,
                     text(
-                        "SELECT house_id, people"
-                        " FROM social_stats.calculated_people_houses"
+                        f"SELECT building_id, sum({people_sum})::integer"
+                        f" FROM {people_table_name}"
                         " WHERE year = :year"
                         "   AND scenario = :scenario"
-                        "   AND house_id in (SELECT id FROM city_buildings)"
-                        " ORDER BY house_id"
+                        "   AND building_id in (SELECT id FROM city_buildings)"
+                        " GROUP BY building_id ORDER BY building_id"
                     ),
-                    ({"city_id": city_id, "year": year, "scenario": scenario_name}),
-                ).all()
-                if len(res) == 0:
+                    {"year": year, "scenario": scenario_name},
+                    name="year_population_sgs",
+                )
+                if res.shape[0] == 0:
                     logger.error(
-                        "Year {} data for city with id={} is missing social groups population data"
-                        " in calculated_people_houses!",
+                        "Year {} data for city with id={} is missing social groups population data in {}!",
                         year,
                         city_id,
+                        people_table_name,
                     )
                     continue
-                idxs, values = map(list, zip(*res))
-                houses_year = houses_year.join(pd.Series(values, idxs, name="year_population_sgs"))
+                houses_year = houses_year.join(res)
             if "year_population" not in houses_year.columns:
-                res = conn.execute(
+                res = stream_series(
+                    conn,
                     text(
-                        "SELECT house_id, people"
-                        " FROM social_stats.calculated_people_houses"
+                        f"SELECT building_id, sum({people_sum})::integer"
+                        f" FROM {people_table_name}"
                         " WHERE year = :year"
                         "   AND scenario = :scenario"
-                        "   AND house_id in (SELECT id FROM city_buildings)"
-                        " ORDER BY house_id"
+                        f"{primary_filter}"
+                        "   AND building_id in (SELECT id FROM city_buildings)"
+                        " GROUP BY building_id ORDER BY building_id"
                     ),
-                    ({"city_id": city_id, "year": year, "scenario": scenario_name}),
-                ).all()
-                if len(res) == 0:
+                    {
+                        "year": year,
+                        "scenario": scenario_name,
+                        **({"primary_social_groups": tuple(primary_social_groups_ids)} if primary_filter else {}),
+                    },
+                    name="year_population",
+                )
+                if res.shape[0] == 0:
                     logger.error(
-                        "Year {} data for city with id={} is missing basic people population data"
-                        " in social_stats.calculated_people_houses!",
+                        "Year {} data for city with id={} is missing basic people population data in {}!",
                         year,
                         city_id,
+                        people_table_name,
                     )
                     continue
-                idxs, values = map(list, zip(*res))
-                houses_year = houses_year.join(pd.Series(values, idxs, name="year_population"))
-            service_types = conn.execute(
+                houses_year = houses_year.join(res)
+            service_types = services_conn.execute(
                 text(
                     "SELECT DISTINCT st.id as city_service_type_id, st.code as city_service_type"
                     " FROM maintenance.social_groups_city_service_types"
@@ -124,11 +153,11 @@ def update_demands_table(  # pylint: disable=too-many-locals,too-many-branches,t
             for (
                 city_service_type_id,
                 service_type,
-            ) in tqdm(service_types, desc=f"model@{year}", leave=False):
+            ) in track(service_types, "demands_model", scenario=scenario_name, year=year):
                 if f"{service_type}_service_demand_value_model" in houses_year.columns:
                     continue
                 social_groups = tuple(
-                    conn.execute(
+                    services_conn.execute(
                         text(
                             "SELECT social_group_id FROM maintenance.social_groups_city_service_types"
                             " WHERE city_service_type_id = :city_service_type_id"
@@ -138,30 +167,30 @@ def update_demands_table(  # pylint: disable=too-many-locals,too-many-branches,t
                     .scalars()
                     .all()
                 )
-                res = conn.execute(
+                res = stream_series(
+                    conn,
                     text(
-                        f" SELECT building_id, sum({men_column} + {women_column})::integer"
-                        " FROM social_stats.sex_age_social_houses"
+                        f" SELECT building_id, sum({people_sum})::integer"
+                        f" FROM {people_table_name}"
                         " WHERE year = :year AND scenario = :scenario"
                         "   AND social_group_id IN :social_groups AND building_id in (SELECT id FROM city_buildings)"
                         " GROUP BY building_id ORDER BY building_id"
                     ),
                     {"year": year, "scenario": scenario_name, "social_groups": social_groups},
-                ).all()
-                if len(res) == 0:
+                    name=f"{service_type}_service_demand_value_model",
+                )
+                if res.shape[0] == 0:
                     logger.warning(
-                        "No data for year={}, scenario={}, social_groups={} in social_stats.sex_age_social_houses",
+                        "No data for year={}, scenario={}, social_groups={} in {}",
                         year,
                         scenario.value,
                         social_groups,
+                        people_table_name,
                     )
                     continue
-                idxs, values = map(list, zip(*res))
-                houses_year = houses_year.join(
-                    pd.Series(values, index=idxs, name=f"{service_type}_service_demand_value_model"), how="left"
-                )
+                houses_year = houses_year.join(res, how="left")
 
-            for service_type in tqdm(services_normatives, desc=f"normative@{year}", leave=False):
+            for service_type in services_normatives:
                 if f"{service_type}_service_demand_value_normative" in houses_year.columns:
                     continue
                 houses_year[f"{service_type}_service_demand_value_normative"] = (
@@ -210,7 +239,9 @@ def update_demands_table(  # pylint: disable=too-many-locals,too-many-branches,t
         )
 
         logger.info("Saving demands")
-        for _, row in tqdm(city_df.fillna(0).iterrows(), total=city_df.shape[0], desc="Uploading demands"):
+        for _, row in track(
+            city_df.fillna(0).iterrows(), "demands_upload", total=city_df.shape[0], scenario=scenario_name
+        ):
             conn.execute(
                 query,
                 dict(row.to_dict()),
@@ -0,0 +1,110 @@
+"""Vectorized houses population division by sex, age and social groups is defined here.
+
+It is a drop-in replacement of `population_restorator.divider.divide_houses` sampling all of the people of a chunk of
+houses at once with `np.searchsorted` over the cumulative arrays precomputed by
+`PrecomputedSocialGroupsDistribution` instead of a `Generator.choice` call (normalizing probabilities each time)
+for every house and every additional social group member.
+"""
+from __future__ import annotations
+
+import time
+
+import numpy as np
+from loguru import logger
+from population_restorator.models import SocialGroupsDistribution
+
+from .social import PrecomputedSocialGroupsDistribution
+
+
+DEFAULT_DIVISION_CHUNK_SIZE = 10_000
+"""Number of houses to sample people for at once, limits memory usage of the temporary arrays."""
+
+
+def divide_houses(
+    houses_population: list[int],
+    social_groups: SocialGroupsDistribution,
+    rng: np.random.Generator | None = None,
+    chunk_size: int = DEFAULT_DIVISION_CHUNK_SIZE,
+) -> list[np.ndarray]:
+    """Divide houses population by sex, age and social groups.
+
+    Each person gets a (primary social group, sex, age) cell with the primary distribution probabilities. Then
+    `int(population * additional_probability)` times a random person of a house which sex and age allow any
+    additional social group is chosen, and one of the additional social groups is chosen for them.
+
+    Returns people distribution for houses in format of numpy array with shape [<social_groups>, 2, <ages>]. First
+    dimension is a social group (index = index in `social_groups.get_combined_names()`), second - sex (0 - man,
+    1 - woman) and third is age (index = age).
+    """
+    if not isinstance(social_groups, PrecomputedSocialGroupsDistribution):
+        social_groups = PrecomputedSocialGroupsDistribution(social_groups.primary, social_groups.additional)
+    if rng is None:
+        rng = np.random.default_rng(seed=int(time.time()))
+
+    population = np.asarray(houses_population, dtype=np.int64)
+    divided_population: list[np.ndarray] = []
+    for chunk_start in range(0, population.shape[0], chunk_size):
+        divided_population.extend(
+            _divide_houses_chunk(population[chunk_start : chunk_start + chunk_size], social_groups, rng)
+        )
+    return divided_population
+
+
+def _divide_houses_chunk(  # pylint: disable=too-many-locals
+    population: np.ndarray, social_groups: PrecomputedSocialGroupsDistribution, rng: np.random.Generator
+) -> np.ndarray:
+    """Divide population of a chunk of houses, returning array with shape [<houses>, <social_groups>, 2, <ages>]."""
+    primary_sgs, sexes, ages = social_groups.primary_probabilities.shape
+    additional_sgs = len(social_groups.additional)
+    sex_age_cells = sexes * ages
+    houses = population.shape[0]
+
+    people_houses = np.repeat(np.arange(houses), population)
+    people_cells = np.searchsorted(social_groups.primary_cumulative, rng.random(people_houses.shape[0]), side="right")
+    people_cells = np.minimum(people_cells, primary_sgs * sex_age_cells - 1)
+
+    divided = np.zeros((houses, primary_sgs + additional_sgs, sexes, ages), dtype=np.int64)
+    divided[:, :primary_sgs] = np.bincount(
+        people_houses * (primary_sgs * sex_age_cells) + people_cells, minlength=houses * primary_sgs * sex_age_cells
+    ).reshape((houses, primary_sgs, sexes, ages))
+
+    additional_probability = social_groups.get_additional_probability()
+    if additional_sgs == 0 or additional_probability <= 0:
+        return divided
+
+    people_sex_age = people_cells % sex_age_cells
+    eligible = social_groups.additional_eligible.ravel()[people_sex_age]
+    eligible_houses = people_houses[eligible]
+    eligible_sex_age = people_sex_age[eligible]
+    eligible_counts = np.bincount(eligible_houses, minlength=houses)
+    eligible_starts = np.cumsum(eligible_counts) - eligible_counts
+
+    additional_numbers = (population * additional_probability).astype(np.int64)
+    unsettled = (additional_numbers > 0) & (eligible_counts == 0)
+    if unsettled.any():
+        logger.warning(
+            "Could not add additional population of {} houses as none of their people can be in additional groups",
+            int(unsettled.sum()),
+        )
+        additional_numbers[unsettled] = 0
+
+    members_houses = np.repeat(np.arange(houses), additional_numbers)
+    members = eligible_starts[members_houses] + (
+        rng.random(members_houses.shape[0]) * eligible_counts[members_houses]
+    ).astype(np.int64)
+    members_sex_age = eligible_sex_age[members]
+
+    # cumulative probabilities of each sex and age are shifted by the row number to search all of them at once
+    cumulative = social_groups.additional_cumulative.reshape(sex_age_cells, additional_sgs)
+    shifted_cumulative = (cumulative + np.arange(sex_age_cells)[:, None]).ravel()
+    members_sgs = (
+        np.searchsorted(shifted_cumulative, rng.random(members.shape[0]) + members_sex_age, side="right")
+        - members_sex_age * additional_sgs
+    )
+    members_sgs = np.clip(members_sgs, 0, additional_sgs - 1)
+
+    divided[:, primary_sgs:] += np.bincount(
+        (members_houses * additional_sgs + members_sgs) * sex_age_cells + members_sex_age,
+        minlength=houses * additional_sgs * sex_age_cells,
+    ).reshape((houses, additional_sgs, sexes, ages))
+    return divided
@@ -0,0 +1,292 @@
+"""Monte Carlo ensemble of division and forecast replicas is defined here.
+
+Each replica divides the balanced houses population with its own random generator, and replicas are forecasted with
+the in-memory model in batches of (replica, scenario) pairs advanced together as an additional array dimension (see
+`forecast_people_batch`). Only the number of people of each building and social group is kept for each replica, and
+the mean and quantiles over replicas are saved to `social_stats.houses_population_ensemble` instead of the full
+copies. Full results of the first replica are saved to the people distribution table, so materialized views and
+demands are calculated as usual.
+"""
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Mapping
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from population_restorator.models import SocialGroupsDistribution, SurvivabilityCoefficients
+from sqlalchemy import Connection, Engine, delete, insert
+
+from idu_balance_db.db.entities.enums import ForecastScenario, StorageLayout
+from idu_balance_db.db.entities.social_stats import t_houses_population_ensemble
+from idu_balance_db.utils.streaming import DEFAULT_INSERT_BATCH_SIZE, batched
+
+from .array_forecast import forecast_people_batch
+from .deltas import encode_year_delta
+from .in_memory import DEFAULT_BASE_FERTILITY, divide_population, multiply_coefficients
+from .parquet_export import export_people_array_to_parquet
+from .saving import DEFAULT_SAVE_ATTEMPTS, DEFAULT_SAVE_CHUNK_SIZE, save_in_chunks, save_people_in_chunks
+
+
+DEFAULT_ENSEMBLE_QUANTILES = (0.05, 0.5, 0.95)
+
+DEFAULT_ENSEMBLE_BATCH_SIZE = 12
+"""Number of (replica, scenario) pairs forecasted together, each of them takes a full people array of memory."""
+
+
+def get_quantile_name(quantile: float) -> str:
+    """Return statistic name of the given quantile level in percents (q5 for 0.05, q50 for 0.5, q99.5 for 0.995)."""
+    return f"q{quantile * 100:g}"
+
+
+def get_quantiles_names(quantiles: Iterable[float]) -> list[str]:
+    """Return statistics names of the given quantile levels, raising ValueError if some of them share a name."""
+    names = [get_quantile_name(quantile) for quantile in quantiles]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if len(duplicates) > 0:
+        raise ValueError(f"Ensemble quantiles are given more than once: {', '.join(duplicates)}")
+    return names
+
+
+def forecast_replicas(  # pylint: disable=too-many-arguments,too-many-locals
+    houses: pd.DataFrame,
+    social_groups: SocialGroupsDistribution,
+    survivability_coefficients: SurvivabilityCoefficients | None,
+    years: int,
+    scenarios: Mapping[str, float],
+    replicas: int,
+    seed: int | np.random.SeedSequence,
+    base_fertility: float = DEFAULT_BASE_FERTILITY,
+    batch_size: int = DEFAULT_ENSEMBLE_BATCH_SIZE,
+    callback: Callable[[int, str | None, np.ndarray], None] | None = None,
+) -> dict[str, np.ndarray]:
+    """Divide and forecast houses population of `replicas` replicas for each of the `scenarios` (mapped to their
+    multipliers). Each replica is divided with a random generator of its own child of `seed`, then (replica, scenario)
+    pairs are forecasted in batches of about `batch_size` pairs (whole replicas with all of the scenarios).
+
+    If `callback` is given, it is called with the number of years after the start, scenario (None for the start year)
+    and full people array of each year of the first replica.
+
+    Returns number of people of each house and social group with shape
+    [<replicas>, <years> + 1, <houses>, <social_groups>] for each scenario.
+    """
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    division_seeds = seed_sequence.spawn(replicas)
+    rng = np.random.default_rng(seed_sequence.spawn(1)[0])
+    capacity = houses["living_area"].to_numpy()
+    names = list(scenarios)
+    replicas_per_batch = max(batch_size // max(len(names), 1), 1)
+    sums: dict[str, list[np.ndarray]] = {name: [] for name in names}
+    for batch_begin in range(0, replicas, replicas_per_batch):
+        batch_replicas = range(batch_begin, min(batch_begin + replicas_per_batch, replicas))
+        logger.info("Forecasting replicas {}-{} of {}", batch_replicas[0] + 1, batch_replicas[-1] + 1, replicas)
+        starts = np.stack(
+            [divide_population(houses, social_groups, np.random.default_rng(division_seeds[r])) for r in batch_replicas]
+        )
+        if callback is not None and batch_begin == 0:
+            callback(0, None, starts[0])
+        batch_sums = [starts.sum(axis=(3, 4), dtype=np.int32)]
+        if years > 0:
+            items_starts = np.repeat(starts, len(names), axis=0)
+            for year, people in enumerate(
+                forecast_people_batch(
+                    items_starts,
+                    capacity,
+                    social_groups,
+                    [multiply_coefficients(survivability_coefficients, scenarios[name]) for name in names]
+                    * len(batch_replicas),
+                    [base_fertility * scenarios[name] for name in names] * len(batch_replicas),
+                    years,
+                    rng,
+                ),
+                1,
+            ):
+                if callback is not None and batch_begin == 0:
+                    for name, scenario_people in zip(names, people):
+                        callback(year, name, scenario_people)
+                batch_sums.append(
+                    people.sum(axis=(3, 4), dtype=np.int32).reshape(len(batch_replicas), len(names), *starts.shape[1:3])
+                )
+        for scenario_idx, name in enumerate(names):
+            years_sums = [batch_sums[0]] + [year_sums[:, scenario_idx] for year_sums in batch_sums[1:]]
+            sums[name].append(np.stack(years_sums, axis=1))
+    return {name: np.concatenate(scenario_sums) for name, scenario_sums in sums.items()}
+
+
+def calculate_ensemble_statistics(
+    replicas: np.ndarray, quantiles: Iterable[float] = DEFAULT_ENSEMBLE_QUANTILES
+) -> dict[str, np.ndarray]:
+    """Calculate mean and quantiles over the first axis of replicas people array, returning statistics names mapped
+    to arrays of the shape of a single replica. Raises ValueError if some of the quantiles share a name."""
+    quantiles = list(quantiles)
+    names = get_quantiles_names(quantiles)
+    statistics = {"mean": replicas.mean(axis=0)}
+    if len(quantiles) > 0:
+        for name, values in zip(names, np.quantile(replicas, quantiles, axis=0)):
+            statistics[name] = values
+    return statistics
+
+
+def save_ensemble_statistics(  # pylint: disable=too-many-arguments
+    conn: Connection,
+    statistics: dict[str, np.ndarray],
+    replicas: int,
+    year_begin: int,
+    scenario: ForecastScenario,
+    houses_ids: list[int],
+    social_groups_ids: list[int],
+    insert_batch_size: int = DEFAULT_INSERT_BATCH_SIZE,
+) -> int:
+    """Replace ensemble statistics of the given houses for a scenario (arrays with shape
+    [<years> + 1, <houses>, <social_groups>]) in `social_stats.houses_population_ensemble`, skipping buildings social
+    groups which have no people in every replica. Returns number of rows inserted.
+    """
+    t_houses_population_ensemble.create(conn, checkfirst=True)
+    for houses_batch in batched(houses_ids):
+        conn.execute(
+            delete(t_houses_population_ensemble).where(
+                t_houses_population_ensemble.c.scenario == scenario,
+                t_houses_population_ensemble.c.building_id.in_(houses_batch),
+            )
+        )
+    present = np.stack(list(statistics.values())).any(axis=0)
+
+    def rows() -> Iterable[dict]:
+        for year_idx, house_idx, sg_idx in zip(*(indexes.tolist() for indexes in np.nonzero(present))):
+            for name, values in statistics.items():
+                yield {
+                    "year": year_begin + year_idx,
+                    "scenario": scenario,
+                    "building_id": houses_ids[house_idx],
+                    "social_group_id": social_groups_ids[sg_idx],
+                    "statistic": name,
+                    "people": float(values[year_idx, house_idx, sg_idx]),
+                    "replicas": replicas,
+                }
+
+    rows_inserted = 0
+    for values_batch in batched(rows(), insert_batch_size):
+        conn.execute(insert(t_houses_population_ensemble), values_batch)
+        rows_inserted += len(values_batch)
+    return rows_inserted
+
+
+def save_ensemble_statistics_in_chunks(  # pylint: disable=too-many-arguments
+    engine: Engine,
+    statistics: dict[str, np.ndarray],
+    replicas: int,
+    year_begin: int,
+    scenario: ForecastScenario,
+    houses_ids: list[int],
+    social_groups_ids: list[int],
+    chunk_size: int = DEFAULT_SAVE_CHUNK_SIZE,
+    max_attempts: int = DEFAULT_SAVE_ATTEMPTS,
+) -> int:
+    """Save ensemble statistics of a scenario with `save_ensemble_statistics` by chunks of `chunk_size` houses with up
+    to `max_attempts` consecutive attempts (see `save_in_chunks`). Returns number of rows inserted.
+    """
+
+    def save_chunk(conn: Connection, begin: int, end: int) -> int:
+        return save_ensemble_statistics(
+            conn,
+            {name: values[:, begin:end] for name, values in statistics.items()},
+            replicas,
+            year_begin,
+            scenario,
+            houses_ids[begin:end],
+            social_groups_ids,
+        )
+
+    return save_in_chunks(engine, houses_ids, save_chunk, year_begin, scenario, chunk_size, max_attempts)
+
+
+def run_ensemble_to_db(  # pylint: disable=too-many-arguments,too-many-locals
+    engine: Engine,
+    houses: pd.DataFrame,
+    social_groups: SocialGroupsDistribution,
+    survivability_coefficients: SurvivabilityCoefficients | None,
+    year_begin: int,
+    years: int,
+    scenarios: Mapping[ForecastScenario, float],
+    replicas: int,
+    quantiles: Iterable[float] = DEFAULT_ENSEMBLE_QUANTILES,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    seed: int | None = None,
+    base_year_once: bool = False,
+    parquet_dir: Path | None = None,
+    save_chunk_size: int = DEFAULT_SAVE_CHUNK_SIZE,
+    save_attempts: int = DEFAULT_SAVE_ATTEMPTS,
+) -> int:
+    """Run `replicas` division and forecast replicas of the balanced `houses` (indexed by id) for each scenario
+    (mapped to its multiplier), save full results of the first replica to the people distribution table of the given
+    `layout` and ensemble statistics to `social_stats.houses_population_ensemble`. If `base_year_once` is set, the
+    first replica start year is saved once to the base year table. If `parquet_dir` is set, years of the first replica
+    are also exported to Parquet files in it.
+
+    Years of the first replica and statistics are saved by chunks of `save_chunk_size` houses with up to
+    `save_attempts` consecutive attempts (see `save_in_chunks`), and `ResultsSavingError` is raised if they could not
+    be saved. Raises ValueError if some of the quantiles share a name.
+
+    Returns number of ensemble statistics rows inserted.
+    """
+    quantiles = list(quantiles)
+    get_quantiles_names(quantiles)
+    if base_year_once and layout == StorageLayout.DELTAS:
+        raise ValueError("Deltas storage layout keeps the start year for each scenario as the base of its differences")
+    houses_ids = houses.index.to_list()
+    social_groups_ids = [int(name) for name in social_groups.get_combined_names()]
+    previous_years: dict[ForecastScenario, np.ndarray] = {}
+
+    def save_first_replica(year: int, scenario_name: str | None, people: np.ndarray) -> None:
+        year_scenarios = list(scenarios) if scenario_name is None else [ForecastScenario(scenario_name)]
+        for scenario in [None] if scenario_name is None and base_year_once else year_scenarios:
+            save_people_in_chunks(
+                engine,
+                (
+                    encode_year_delta(people, previous_years.get(scenario), year_begin + year)
+                    if layout == StorageLayout.DELTAS
+                    else people
+                ),
+                houses_ids,
+                social_groups_ids,
+                year_begin + year,
+                scenario,
+                layout,
+                save_chunk_size,
+                save_attempts,
+            )
+        for scenario in year_scenarios:
+            previous_years[scenario] = people
+            if parquet_dir is not None:
+                export_people_array_to_parquet(
+                    people, houses_ids, social_groups_ids, parquet_dir, year_begin + year, scenario
+                )
+
+    logger.info("Running {} division and forecast replicas", replicas)
+    results = forecast_replicas(
+        houses,
+        social_groups,
+        survivability_coefficients,
+        years,
+        {scenario.value: multiplier for scenario, multiplier in scenarios.items()},
+        replicas,
+        seed if seed is not None else int(time.time()),
+        callback=save_first_replica,
+    )
+
+    rows = 0
+    for scenario in scenarios:
+        rows += save_ensemble_statistics_in_chunks(
+            engine,
+            calculate_ensemble_statistics(results[scenario.value], quantiles),
+            replicas,
+            year_begin,
+            scenario,
+            houses_ids,
+            social_groups_ids,
+            save_chunk_size,
+            save_attempts,
+        )
+    return rows
@@ -1,39 +1,342 @@
 """Forecasting-related methods are located here."""
+from __future__ import annotations
+
 import multiprocessing as mp
+import queue as queue_module
 import time
+from contextlib import ExitStack
+from multiprocessing.synchronize import Event as EventType
+from pathlib import Path
+from typing import Any, Callable
 
 import numpy as np
 from loguru import logger
 from population_restorator.forecaster import forecast_ages, forecast_people
-from population_restorator.models import SurvivabilityCoefficients
-from sqlalchemy import create_engine, text
+from population_restorator.models import SocialGroupsDistribution, SurvivabilityCoefficients
+from sqlalchemy import Connection, Engine, create_engine, text
 
-from idu_balance_db.db.entities.enums import ForecastScenario
+from idu_balance_db.db.entities.enums import ForecastScenario, StorageLayout
+from idu_balance_db.exceptions.db.saving import ResultsSavingError, SaverProcessError
+from idu_balance_db.utils.measurement import StageMeasurement, StagesMeasurer
+from idu_balance_db.utils.progress import report_progress, set_progress_process
+from idu_balance_db.utils.shared_arrays import SharedArray, SharedArrayHandle, attach_shared_array, share_array
 from idu_balance_db.utils.tmp_db import clear_tmp_db_except_start
 
-from .saving import save_year_to_database
+from .deltas import (
+    decode_year_delta,
+    encode_year_delta,
+    get_temporary_social_groups,
+    is_keyframe_year,
+    read_year_people_array,
+    save_people_delta_to_database,
+)
+from .in_memory import DEFAULT_BASE_FERTILITY, DEFAULT_SCENARIOS_MULTIPLIERS, forecast_population
+from .parquet_export import export_people_array_to_parquet, export_year_to_parquet
+from .saving import (
+    DEFAULT_SAVE_ATTEMPTS,
+    DEFAULT_SAVE_CHUNK_SIZE,
+    save_in_chunks,
+    save_people_in_chunks,
+    save_temporary_year_in_chunks,
+)
+
+
+SOCIAL_MATVIEWS = [
+    "calculated_sex_age_houses",  # to be removed
+    "calculated_sex_age_buildings",
+    "calculated_people_houses",  # to be removed
+    "calculated_people_buildings",
+    "calculated_social_people_buildings",
+    "calculated_sex_age_social_administrative_units",
+    "calculated_sex_age_social_municipalities",
+    "calculated_sex_age_administrative_units",
+    "calculated_sex_age_municipalities",
+]
+"""Materialized views of social_stats schema which are to be refreshed after the forecast results are saved."""
+
+SAVER_POLL_INTERVAL = 1.0
+"""Interval in seconds of checking that the saver process is alive while waiting for it."""
+
+
+def db_saver_process(  # pylint: disable=too-many-arguments,too-many-locals
+    main_db_dsn: str,
+    queue: mp.Queue,
+    houses_ids_handle: SharedArrayHandle,
+    report_queue: mp.Queue | None = None,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    parquet_dir: Path | None = None,
+    social_groups_ids: list[int] | None = None,
+    chunk_size: int = DEFAULT_SAVE_CHUNK_SIZE,
+    max_attempts: int = DEFAULT_SAVE_ATTEMPTS,
+) -> None:
+    """Process function which saves years to the main database as they are ready and sent to the queue as
+    (source, year, scenario) tuples, where scenario is None for the base year saved once for all of the scenarios
+    (see `replace_houses_year_rows`). Source is either a temporary year database DSN or a handle of the year people
+    array in shared memory (freed after saving), see `_save_year_source`.
+
+    Each year is saved and committed by chunks of `chunk_size` houses, a failed chunk is retried from the last
+    committed one up to `max_attempts` times (see `save_in_chunks`). After a year fails, the rest of the queue is
+    only drained (freeing shared memory blocks) without saving.
+
+    Houses identifiers are attached from shared memory once. If `parquet_dir` is set, saved years are also exported to
+    the partitioned Parquet dataset in this directory (see `_export_year_source`).
+
+    Stops when `None` is sent to the pipe and previous years are saved. If `report_queue` is given, measurements of
+    each year saving as a list of dictionaries and `ResultsSavingError` (or None) are sent to it before exit."""
+    measurer = StagesMeasurer(process="saver")
+    set_progress_process("saver")
+    main_db_engine = create_engine(main_db_dsn)
+    with attach_shared_array(houses_ids_handle) as houses_ids_array:
+        houses_ids = houses_ids_array.tolist()
+    previous_sources: dict[ForecastScenario | None, str] = {}
+    previous_people: dict[ForecastScenario | None, np.ndarray] = {}
+    error: ResultsSavingError | None = None
+    while (value := queue.get()) is not None:
+        source, year, scenario = value
+        scenario_name = scenario.value if scenario is not None else "base"
+        with ExitStack() as stack:
+            if isinstance(source, SharedArrayHandle):
+                source = stack.enter_context(attach_shared_array(source, unlink=True))
+            if error is not None:
+                logger.warning("Skipping saving of year {} as saving of a previous year has failed", year)
+                continue
+            with measurer.stage("save", scenario=scenario_name, year=year) as measurement:
+                try:
+                    measurement.rows = _save_year_source(
+                        main_db_engine,
+                        source,
+                        year,
+                        scenario,
+                        houses_ids,
+                        social_groups_ids,
+                        layout,
+                        previous_sources.get(scenario),
+                        chunk_size,
+                        max_attempts,
+                    )
+                except ResultsSavingError as exc:
+                    logger.error("{}", exc)
+                    if isinstance(source, str):
+                        logger.error(
+                            "The rest of the year can be saved from the temporary database {} with"
+                            " `balance-db save-year`, which resumes from house {}",
+                            source,
+                            exc.next_house_id,
+                        )
+                    error = exc
+                    continue
+            if isinstance(source, str):
+                previous_sources[scenario] = source
+            if parquet_dir is not None:
+                with measurer.stage("parquet_export", scenario=scenario_name, year=year) as measurement:
+                    measurement.rows = _export_year_source(
+                        parquet_dir, source, year, scenario, houses_ids, social_groups_ids, layout, previous_people
+                    )
+    measurer.close()
+    if report_queue is not None:
+        report_queue.put(([measurement.to_dict() for measurement in measurer.measurements], error))
+
 
+def _save_year_source(  # pylint: disable=too-many-arguments,too-many-locals
+    engine: Engine,
+    source: str | np.ndarray,
+    year: int,
+    scenario: ForecastScenario | None,
+    houses_ids: list[int],
+    social_groups_ids: list[int] | None,
+    layout: StorageLayout,
+    previous_source: str | None,
+    chunk_size: int,
+    max_attempts: int,
+) -> int:
+    """Save a year of the saver queue by chunks. People array `source` (years difference with the deltas `layout`, see
+    `encode_year_delta`) is saved with `save_people_in_chunks` with the given `social_groups_ids`. Temporary year
+    database DSN `source` is saved by chunks of sorted houses with `save_temporary_year_in_chunks`, or read by chunks
+    together with the `previous_source` year of the scenario and encoded with the deltas layout.
+    """
+    if not isinstance(source, str):
+        return save_people_in_chunks(
+            engine, source, houses_ids, social_groups_ids, year, scenario, layout, chunk_size, max_attempts
+        )
+    if layout != StorageLayout.DELTAS:
+        return save_temporary_year_in_chunks(
+            engine, create_engine(source), year, scenario, sorted(houses_ids), layout, chunk_size, max_attempts
+        )
+    sorted_houses_ids = sorted(houses_ids)
+    year_engine = create_engine(source)
+    previous_engine = (
+        create_engine(previous_source) if previous_source is not None and not is_keyframe_year(year) else None
+    )
+    with year_engine.connect() as year_conn:
+        years_social_groups_ids = sorted(set(get_temporary_social_groups(year_conn).values()))
 
-def db_saver_process(main_db_dsn: str, queue: mp.Queue) -> None:
-    """Process function which calls save_year_to_database as the year is ready and parameters are sent to the queue.
+    def save_chunk(main_db_conn: Connection, begin: int, end: int) -> int:
+        chunk_houses_ids = sorted_houses_ids[begin:end]
+        with year_engine.connect() as year_conn:
+            year_people = read_year_people_array(year_conn, year, chunk_houses_ids, years_social_groups_ids)
+        previous_year_people = None
+        if previous_engine is not None:
+            with previous_engine.connect() as previous_conn:
+                previous_year_people = read_year_people_array(
+                    previous_conn, year - 1, chunk_houses_ids, years_social_groups_ids
+                )
+        return save_people_delta_to_database(
+            main_db_conn,
+            encode_year_delta(year_people, previous_year_people, year),
+            chunk_houses_ids,
+            years_social_groups_ids,
+            year,
+            scenario,
+        )
 
-    Stops when `None` is sent to the pipe and previous years are saved."""
+    return save_in_chunks(engine, sorted_houses_ids, save_chunk, year, scenario, chunk_size, max_attempts)
+
+
+def _export_year_source(  # pylint: disable=too-many-arguments
+    parquet_dir: Path,
+    source: str | np.ndarray,
+    year: int,
+    scenario: ForecastScenario,
+    houses_ids: list[int],
+    social_groups_ids: list[int] | None,
+    layout: StorageLayout,
+    previous_people: dict[ForecastScenario | None, np.ndarray],
+) -> int:
+    """Export a saved year of the saver queue to the Parquet dataset in `parquet_dir`. With the deltas `layout` people
+    array `source` is decoded with the previous year of the scenario kept in `previous_people`, which is updated.
+    Returns number of rows written.
+    """
+    if isinstance(source, str):
+        with create_engine(source).connect() as year_conn:
+            return export_year_to_parquet(year_conn, parquet_dir, year, scenario)
+    people = source
+    if layout == StorageLayout.DELTAS:
+        people = decode_year_delta(source, previous_people.get(scenario), year)
+        previous_people[scenario] = people
+    return export_people_array_to_parquet(people, houses_ids, social_groups_ids, parquet_dir, year, scenario)
+
+
+def _receive_saver_report(
+    report_queue: mp.Queue, saving_process: mp.Process
+) -> tuple[list[StageMeasurement], ResultsSavingError | None]:
+    """Wait for the saver process measurements and saving error if a year could not be saved. Queue is read before
+    the process is joined, as the process would not exit until its queue buffer is flushed.
+
+    Raises `SaverProcessError` if the process has exited without sending them.
+    """
     while True:
-        value = queue.get()
-        if value is None:
-            break
-        year_dsn, year, scenario, houses_ids = value
-        year_engine = create_engine(year_dsn)
-        main_db_engine = create_engine(main_db_dsn)
-        while True:
-            try:
-                with main_db_engine.connect() as main_db_conn, year_engine.connect() as year_conn:
-                    save_year_to_database(main_db_conn, year_conn, year, scenario, houses_ids)
-                    main_db_conn.commit()
-                break
-            except Exception as exc:  # pylint: disable=broad-except
-                logger.error("Got exception on saving data: {!r} of year {}. Trying again in 20 seconds", exc, year)
-                time.sleep(20)
+        try:
+            measurements, error = report_queue.get(timeout=SAVER_POLL_INTERVAL)
+            return [StageMeasurement.from_dict(data) for data in measurements], error
+        except queue_module.Empty:
+            _check_saver_alive(saving_process)
+
+
+def _check_saver_alive(saving_process: mp.Process) -> None:
+    """Raise `SaverProcessError` if the saver process has exited before it was expected to."""
+    if not saving_process.is_alive():
+        raise SaverProcessError(saving_process.exitcode)
+
+
+def _free_saving_queue(saving_queue: mp.Queue) -> None:
+    """Free shared memory blocks of the years left in the queue of the exited saver process."""
+    while True:
+        try:
+            value = saving_queue.get(timeout=SAVER_POLL_INTERVAL / 10)
+        except queue_module.Empty:
+            return
+        if value is not None and isinstance(value[0], SharedArrayHandle):
+            with attach_shared_array(value[0], unlink=True):
+                pass
+
+
+def _wait_for_saver(report_queue: mp.Queue, saving_process: mp.Process, measurer: StagesMeasurer) -> None:
+    """Wait for the saver process to save all of the years sent before `None`, adding its measurements to `measurer`.
+
+    Raises `ResultsSavingError` if a year could not be saved.
+    """
+    logger.success("Waiting for the saving process to be finished")
+    measurements, error = _receive_saver_report(report_queue, saving_process)
+    measurer.measurements.extend(measurements)
+    saving_process.join()
+    if error is not None:
+        raise error
+
+
+def _kill_saver(saving_process: mp.Process | None) -> None:
+    """Kill the saver process if it is still running after an error."""
+    if saving_process is not None and saving_process.is_alive():
+        logger.info("Waiting until saving process is properly killed")
+        saving_process.kill()
+        saving_process.join()
+
+
+def _put_to_saver(saving_queue: mp.Queue, value: Any, is_saver_stopped: Callable[[], bool]) -> None:
+    """Put the value to the (bounded) saver queue, waiting for a free place while the saver is running. Raises
+    `SaverProcessError` if `is_saver_stopped` returns True while waiting, as nobody would read the queue anymore."""
+    while True:
+        try:
+            saving_queue.put(value, timeout=SAVER_POLL_INTERVAL)
+            return
+        except queue_module.Full:
+            if is_saver_stopped():
+                raise SaverProcessError(None) from None
+
+
+def _forecast_scenario_in_databases(  # pylint: disable=too-many-arguments,too-many-locals
+    start_db_dsn: str,
+    databases: list[str],
+    base_survivability_coefficients: SurvivabilityCoefficients,
+    year_begin: int,
+    houses_ids: list[int],
+    scenario: ForecastScenario,
+    multiplier: float,
+    base_fertility: float,
+    threads: int,
+    measurer: StagesMeasurer,
+    callback: Callable[[str, int], None],
+) -> None:
+    """Forecast ages and people of the scenario years from the start year temporary database to the year `databases`
+    with population_restorator, balancing ages of a year in `threads` processes (each of them reads the start year
+    from `start_db_dsn` itself) and calling `callback` with each year database DSN and year."""
+    boys_to_girls = 1.05
+    fertility_begin = 20
+    fertility_end = 39
+    start_year_engine = create_engine(start_db_dsn)
+    current_coeffs = SurvivabilityCoefficients(
+        (np.array(base_survivability_coefficients.men) * multiplier).tolist(),
+        (np.array(base_survivability_coefficients.women) * multiplier).tolist(),
+    )
+    with measurer.stage("forecast_ages", scenario=scenario.value) as measurement:
+        forecasted_ages = forecast_ages(
+            start_year_engine,
+            year_begin,
+            year_begin + len(databases),
+            boys_to_girls,
+            current_coeffs,
+            base_fertility * multiplier,
+            fertility_begin,
+            fertility_end,
+            houses_ids=houses_ids,
+        )
+        measurement.rows = len(databases)
+
+    logger.success("Starting forecast for scenario '{}'", scenario.value)
+    measurer.start("forecast", scenario=scenario.value, year=year_begin + 1).rows = len(houses_ids)
+    report_progress("forecast", 0, len(databases), scenario.value)
+    try:
+        forecast_people(
+            start_year_engine,
+            forecasted_ages,
+            databases,
+            year_begin,
+            houses_ids,
+            callback=callback,
+            threads=threads,
+        )
+    finally:
+        measurer.cancel()
+    logger.success("Finished forecast for scenario '{}'", scenario.value)
 
 
 def forecast_people_scenarios_with_transfering_to_db(  # pylint: disable=too-many-arguments,too-many-locals
@@ -50,24 +353,61 @@ def forecast_people_scenarios_with_transfering_to_db(  # pylint: disable=too-man
     negative_scenario_multiplier: float = 0.9,
     positive_scenario_multiplier: float = 1.1,
     threads: int = 1,
+    measurer: StagesMeasurer | None = None,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    parquet_dir: Path | None = None,
+    base_year_once: bool = False,
+    save_chunk_size: int = DEFAULT_SAVE_CHUNK_SIZE,
+    save_attempts: int = DEFAULT_SAVE_ATTEMPTS,
 ) -> None:
     """Forecast people with a given base `survivability_coefficients` to multiply by `negative_scenario_multiplier` or
     `positive_scenario_multiplier` and save to `conn` PosgreSQL database connection.
+
+    If `measurer` is given, ages forecast, each year forecast and materialized views refresh stages are measured with
+    it, and the saver processes measurements are added to its measurements list. Results are saved in the given
+    storage `layout`, and also exported to Parquet files in `parquet_dir` if it is set. If `base_year_once` is set,
+    the start year is saved once to the base year table instead of being saved for each scenario. Years are saved by
+    chunks of `save_chunk_size` houses with up to `save_attempts` consecutive attempts (see `save_in_chunks`), and
+    `ResultsSavingError` is raised if a year could not be saved.
+
+    Ages of a year are balanced in `threads` population_restorator processes, each of them reads the start year from
+    `start_db_dsn` itself (only houses identifiers are shared with the saver process in memory), so an in-memory SQLite
+    start year database can not be used with more than one thread.
     """
     if scenarios is ...:
         scenarios = list(ForecastScenario)
+    if base_year_once and layout == StorageLayout.DELTAS:
+        raise ValueError("Deltas storage layout keeps the start year for each scenario as the base of its differences")
+    own_measurer = measurer is None
+    if own_measurer:
+        measurer = StagesMeasurer()
 
-    boys_to_girls = 1.05
-    fertility_begin = 20
-    fertility_end = 39
-
+    shared_houses_ids = SharedArray(np.array(houses_ids, dtype=np.int64))
+    saving_process = None
     try:
         for scenario in scenarios:
             saving_queue = mp.Queue()
-            saving_process = mp.Process(target=db_saver_process, args=(main_db_dsn, saving_queue))
+            report_queue = mp.Queue()
+            saving_process = mp.Process(
+                target=db_saver_process,
+                args=(
+                    main_db_dsn,
+                    saving_queue,
+                    shared_houses_ids.handle,
+                    report_queue,
+                    layout,
+                    parquet_dir,
+                    None,
+                    save_chunk_size,
+                    save_attempts,
+                ),
+            )
             saving_process.start()
 
-            saving_queue.put_nowait((start_db_dsn, year_begin, scenario, houses_ids))
+            if not base_year_once:
+                saving_queue.put_nowait((start_db_dsn, year_begin, scenario))
+            elif scenario == scenarios[0]:
+                saving_queue.put_nowait((start_db_dsn, year_begin, None))
             multiplier = (
                 negative_scenario_multiplier
                 if scenario == ForecastScenario.neg
@@ -81,9 +421,12 @@ def forecast_people_scenarios_with_transfering_to_db(  # pylint: disable=too-man
                 year_dsn: str, year: int, scenario: ForecastScenario = scenario, saving_queue: mp.Queue = saving_queue
             ) -> None:
                 """Save results from the temporary year database to PostgreSQL main DB."""
-                saving_queue.put_nowait((year_dsn, year, scenario, houses_ids))
-
-            start_year_engine = create_engine(start_db_dsn)
+                _check_saver_alive(saving_process)
+                measurer.finish()
+                report_progress("forecast", year - year_begin, years, scenario.value)
+                saving_queue.put_nowait((year_dsn, year, scenario))
+                if year < year_begin + years:
+                    measurer.start("forecast", scenario=scenario.value, year=year + 1).rows = len(houses_ids)
 
             databases = [
                 year_db_dsn_template.format(year=year) for year in range(year_begin + 1, year_begin + years + 1)
@@ -97,60 +440,247 @@ def forecast_people_scenarios_with_transfering_to_db(  # pylint: disable=too-man
                         tmp_conn.commit()
 
             if years > 0:
-                fertility_coefficient = base_fertility * multiplier
-                current_coeffs = SurvivabilityCoefficients(
-                    (np.array(base_survivability_coefficients.men) * multiplier).tolist(),
-                    (np.array(base_survivability_coefficients.women) * multiplier).tolist(),
-                )
-                forecasted_ages = forecast_ages(
-                    start_year_engine,
-                    year_begin,
-                    year_begin + years,
-                    boys_to_girls,
-                    current_coeffs,
-                    fertility_coefficient,
-                    fertility_begin,
-                    fertility_end,
-                    houses_ids=houses_ids,
-                )
-
-                logger.success("Starting forecast for scenario '{}'", scenario.value)
-                start_year_db = create_engine(start_db_dsn)
-                forecast_people(
-                    start_year_db,
-                    forecasted_ages,
+                _forecast_scenario_in_databases(
+                    start_db_dsn,
                     databases,
+                    base_survivability_coefficients,
                     year_begin,
                     houses_ids,
-                    callback=save_results,
-                    threads=threads,
+                    scenario,
+                    multiplier,
+                    base_fertility,
+                    threads,
+                    measurer,
+                    save_results,
                 )
-                logger.success("Finished forecast for scenario '{}'", scenario.value)
 
             saving_queue.put(None)
-            logger.success("Waiting for the saving process to be finished")
-            saving_process.join()
+            _wait_for_saver(report_queue, saving_process, measurer)
     finally:
-        if saving_process.is_alive():
-            logger.info("Waiting until saving process is properly killed")
-            saving_process.kill()
-            saving_process.join()
+        _kill_saver(saving_process)
+        shared_houses_ids.close()
+
+    with measurer.stage("matviews"):
+        refresh_materialized_views(create_engine(main_db_dsn))
+    if own_measurer:
+        measurer.close()
+
+
+_forecast_saving_queue: mp.Queue | None = None
+_forecast_saver_stopped: EventType | None = None
+
+
+def _set_forecast_saving_queue(saving_queue: mp.Queue, saver_stopped: EventType) -> None:
+    """Forecasting processes pool initializer setting the saver queue and the event set by the main process when the
+    saver has exited (queues and events can only be inherited)."""
+    global _forecast_saving_queue, _forecast_saver_stopped  # pylint: disable=global-statement
+    _forecast_saving_queue = saving_queue
+    _forecast_saver_stopped = saver_stopped
+
+
+def forecast_scenario_process(  # pylint: disable=too-many-arguments,too-many-locals
+    start_handle: SharedArrayHandle,
+    capacity_handle: SharedArrayHandle,
+    social_groups: SocialGroupsDistribution,
+    survivability_coefficients: SurvivabilityCoefficients,
+    year_begin: int,
+    years: int,
+    scenario: ForecastScenario,
+    multiplier: float,
+    base_fertility: float,
+    seed: np.random.SeedSequence,
+    deltas: bool = False,
+) -> list[dict]:
+    """Process function forecasting a single scenario with the in-memory model from the start year people array
+    attached from shared memory (as are houses capacities). Each forecasted year (or its stored difference if `deltas`
+    is set, see `encode_year_delta`) is copied to a new shared memory block, which is handed over to the saver process
+    through the queue set by the pool initializer. If the saver has exited, the block is freed and `SaverProcessError`
+    is raised instead of waiting for a free place in the queue forever.
+
+    Returns measurements of the process as a list of dictionaries.
+    """
+    measurer = StagesMeasurer(process=f"forecaster-{scenario.value}")
+    set_progress_process(f"forecaster-{scenario.value}")
+    with attach_shared_array(start_handle) as start, attach_shared_array(capacity_handle) as capacity:
+        forecast = forecast_population(
+            start,
+            capacity,
+            social_groups,
+            survivability_coefficients,
+            years,
+            multiplier,
+            base_fertility,
+            np.random.default_rng(seed),
+        )
+        previous = start
+        for year in range(year_begin + 1, year_begin + years + 1):
+            with measurer.stage("forecast", scenario=scenario.value, year=year) as measurement:
+                people = next(forecast)
+                measurement.rows = people.shape[0]
+            result = encode_year_delta(people, previous, year) if deltas else people
+            handle = share_array(result.astype(np.int32))
+            try:
+                _put_to_saver(_forecast_saving_queue, (handle, year, scenario), _forecast_saver_stopped.is_set)
+            except SaverProcessError:
+                with attach_shared_array(handle, unlink=True):
+                    pass
+                raise
+            previous = people
+            report_progress("forecast", year - year_begin, years, scenario.value)
+    measurer.close()
+    return [measurement.to_dict() for measurement in measurer.measurements]
 
+
+def _run_forecast_pool(  # pylint: disable=too-many-arguments
+    processes: int,
+    arguments: list[tuple],
+    saving_queue: mp.Queue,
+    saver_stopped: EventType,
+    saving_process: mp.Process,
+    measurer: StagesMeasurer,
+) -> None:
+    """Run `forecast_scenario_process` with each of the `arguments` in a pool of `processes` workers, adding their
+    measurements to `measurer`. If the saver process exits in the meantime, `saver_stopped` is set for workers to stop
+    waiting for the queue and `SaverProcessError` is raised."""
+    with mp.Pool(processes, initializer=_set_forecast_saving_queue, initargs=(saving_queue, saver_stopped)) as pool:
+        result = pool.starmap_async(forecast_scenario_process, arguments)
+        while not result.ready():
+            result.wait(SAVER_POLL_INTERVAL)
+            if not saving_process.is_alive():
+                saver_stopped.set()
+                result.wait(SAVER_POLL_INTERVAL * 3)
+                raise SaverProcessError(saving_process.exitcode)
+        for measurements in result.get():
+            measurer.measurements.extend(StageMeasurement.from_dict(data) for data in measurements)
+
+
+def forecast_people_scenarios_in_processes(  # pylint: disable=too-many-arguments,too-many-locals
+    main_db_dsn: str,
+    start: np.ndarray,
+    capacity: np.ndarray,
+    houses_ids: list[int],
+    social_groups: SocialGroupsDistribution,
+    base_survivability_coefficients: SurvivabilityCoefficients | None,
+    year_begin: int,
+    years: int = 10,
+    scenarios: list[ForecastScenario] = ...,
+    base_fertility: float = DEFAULT_BASE_FERTILITY,
+    threads: int = 1,
+    measurer: StagesMeasurer | None = None,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    seed: int | None = None,
+    base_year_once: bool = False,
+    save_chunk_size: int = DEFAULT_SAVE_CHUNK_SIZE,
+    save_attempts: int = DEFAULT_SAVE_ATTEMPTS,
+    parquet_dir: Path | None = None,
+) -> None:
+    """Forecast people of the `start` year array with shape [<houses>, <social_groups>, 2, <ages>] for each of the
+    scenarios in `threads` worker processes with the in-memory model and save results to the main database. Each
+    scenario is forecasted by a single worker, so not more than `len(scenarios)` workers are started.
+
+    Start year people, houses capacities and identifiers are placed in shared memory once and attached by every
+    worker and the saver process without copying, so workers start immediately and do not read the start year from
+    a database. Forecasted years are handed over to the saver as shared memory blocks, so saving starts as soon as
+    a year is ready without serialization or temporary databases reads. Not more than `threads` years wait for
+    saving at once, so forecasting processes wait for a slow database instead of filling the memory. If
+    `base_year_once` is set, the start year is saved once to the base year table instead of being saved for each
+    scenario. With the deltas `layout` workers hand over differences of consecutive years instead of the full years.
+    Years are saved by chunks of `save_chunk_size` houses with up to `save_attempts` consecutive attempts, and
+    `ResultsSavingError` is raised if a year could not be saved. If `parquet_dir` is set, years are also exported to
+    Parquet files in it by the saver.
+    """
+    if scenarios is ...:
+        scenarios = list(ForecastScenario)
+    if base_year_once and layout == StorageLayout.DELTAS:
+        raise ValueError("Deltas storage layout keeps the start year for each scenario as the base of its differences")
+    own_measurer = measurer is None
+    if own_measurer:
+        measurer = StagesMeasurer()
+    social_groups_ids = [int(name) for name in social_groups.get_combined_names()]
+    if years > 0 and base_survivability_coefficients is None:
+        raise ValueError("Survivability coefficients are required to forecast population")
+    processes = max(min(threads, len(scenarios)), 1)
+    if threads > processes:
+        logger.warning(
+            "Array model forecasts each scenario in a single process, using {} processes instead of {}",
+            processes,
+            threads,
+        )
+
+    with ExitStack() as stack:
+        shared_start = stack.enter_context(SharedArray(start))
+        shared_capacity = stack.enter_context(SharedArray(np.asarray(capacity, dtype=float)))
+        shared_houses_ids = stack.enter_context(SharedArray(np.array(houses_ids, dtype=np.int64)))
+        saving_queue = mp.Queue(maxsize=processes)
+        saver_stopped = mp.Event()
+        report_queue = mp.Queue()
+        saving_process = mp.Process(
+            target=db_saver_process,
+            args=(
+                main_db_dsn,
+                saving_queue,
+                shared_houses_ids.handle,
+                report_queue,
+                layout,
+                parquet_dir,
+                social_groups_ids,
+                save_chunk_size,
+                save_attempts,
+            ),
+        )
+        saving_process.start()
+
+        def is_saver_stopped() -> bool:
+            return not saving_process.is_alive()
+
+        try:
+            for scenario in [None] if base_year_once else scenarios:
+                _put_to_saver(
+                    saving_queue, (share_array(start.astype(np.int32)), year_begin, scenario), is_saver_stopped
+                )
+            if years > 0:
+                seeds = np.random.SeedSequence(seed if seed is not None else int(time.time())).spawn(len(scenarios))
+                arguments = [
+                    (
+                        shared_start.handle,
+                        shared_capacity.handle,
+                        social_groups,
+                        base_survivability_coefficients,
+                        year_begin,
+                        years,
+                        scenario,
+                        DEFAULT_SCENARIOS_MULTIPLIERS[scenario.value],
+                        base_fertility,
+                        scenario_seed,
+                        layout == StorageLayout.DELTAS,
+                    )
+                    for scenario, scenario_seed in zip(scenarios, seeds)
+                ]
+                logger.info(
+                    "Forecasting {} scenarios in {} processes sharing {:.1f} MB of the start year people",
+                    len(scenarios),
+                    processes,
+                    shared_start.handle.nbytes / 2**20,
+                )
+                _run_forecast_pool(processes, arguments, saving_queue, saver_stopped, saving_process, measurer)
+            _put_to_saver(saving_queue, None, is_saver_stopped)
+            _wait_for_saver(report_queue, saving_process, measurer)
+        finally:
+            _kill_saver(saving_process)
+            _free_saving_queue(saving_queue)
+
+    with measurer.stage("matviews"):
+        refresh_materialized_views(create_engine(main_db_dsn))
+    if own_measurer:
+        measurer.close()
+
+
+def refresh_materialized_views(main_db_engine: Engine) -> None:
+    """Refresh social_stats materialized views depending on the people distribution, skipping missing ones. `balance-db
+    run` refuses to start if they do not read the relation exposing the run results (see `get_mismatched_matviews`)."""
     logger.info("Refreshing materialized views")
-    main_db_engine = create_engine(main_db_dsn)
-    social_matviews = [
-        "calculated_sex_age_houses",  # to be removed
-        "calculated_sex_age_buildings",
-        "calculated_people_houses",  # to be removed
-        "calculated_people_buildings",
-        "calculated_social_people_buildings",
-        "calculated_sex_age_social_administrative_units",
-        "calculated_sex_age_social_municipalities",
-        "calculated_sex_age_administrative_units",
-        "calculated_sex_age_municipalities",
-    ]
     with main_db_engine.connect() as conn:
-        for matview_name in social_matviews:
+        for matview_name in SOCIAL_MATVIEWS:
             exists = conn.execute(
                 text("SELECT EXISTS(SELECT 1 FROM pg_matviews WHERE schemaname = :schema AND matviewname = :name)"),
                 {"schema": "social_stats", "name": matview_name},
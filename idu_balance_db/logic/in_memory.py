@@ -0,0 +1,313 @@
+"""Embeddable in-memory population model API is defined here.
+
+Functions of this module take in-memory inputs (buildings frame with territories, territories population, social
+groups distribution and survivability coefficients) and return balanced houses, people arrays of each forecast year
+and services demands without any database access, so the model can be embedded in other services and tested at full
+speed. Results can be saved to the database with `save_population_model`, which is the only function here performing
+database writes.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Literal, Mapping
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from population_restorator.models import SocialGroupsDistribution, SurvivabilityCoefficients, Territory
+from sqlalchemy import Connection
+
+from idu_balance_db.db.entities.enums import ForecastModel, ForecastScenario, StorageLayout
+from idu_balance_db.db.ops.social_stats import set_forecast_results_model
+
+from .array_forecast import forecast_people_arrays, forecast_people_batch
+from .balancing import balance_city, save_balanced_city
+from .deltas import encode_year_delta, save_people_delta_to_database
+from .division import divide_houses
+from .saving import save_people_array_to_database
+
+
+DEFAULT_SCENARIOS_MULTIPLIERS: dict[str, float] = {"neg": 0.9, "mod": 1.0, "pos": 1.1}
+"""Survivability and fertility multipliers of the scenarios used by the command-line pipeline."""
+
+DEFAULT_BASE_FERTILITY = 0.07
+
+DEFAULT_SCENARIOS_BATCH_SIZE = 4
+"""Number of scenarios forecasted together, which bounds memory use to this number of years arrays."""
+
+
+@dataclass(frozen=True)
+class ScenarioParameters:
+    """Named forecast scenario with survivability coefficients and base fertility multipliers."""
+
+    name: str
+    survivability_multiplier: float = 1.0
+    fertility_multiplier: float = 1.0
+
+    @classmethod
+    def from_multiplier(cls, name: str, multiplier: float) -> ScenarioParameters:
+        """Return scenario with the same multiplier of survivability and fertility (as the default scenarios)."""
+        return cls(name, multiplier, multiplier)
+
+
+def make_scenarios_grid(
+    survivability_multipliers: Iterable[float], fertility_multipliers: Iterable[float] = (1.0,)
+) -> list[ScenarioParameters]:
+    """Return scenarios of all combinations of survivability and fertility multipliers named like `s0.90_f1.10`."""
+    fertility_multipliers = list(fertility_multipliers)
+    return [
+        ScenarioParameters(f"s{survivability:.2f}_f{fertility:.2f}", survivability, fertility)
+        for survivability in survivability_multipliers
+        for fertility in fertility_multipliers
+    ]
+
+
+@dataclass
+class PopulationModel:
+    """In-memory population model results.
+
+    `houses` is a DataFrame of balanced houses indexed by id with `living_area` and `population` columns, people
+    arrays have shape [<houses>, <social_groups>, 2, <ages>] with houses in `houses` order and social groups in
+    `social_groups` (`SocialGroupsDistribution.get_combined_names()`) order. `forecasts` contains people arrays
+    for each scenario and forecast year (the start year is stored once in `start`).
+    """
+
+    territory: Territory
+    houses: pd.DataFrame
+    social_groups: list[str]
+    year_begin: int
+    start: np.ndarray
+    forecasts: dict[str, dict[int, np.ndarray]] = field(default_factory=dict)
+
+    def get_year(self, year: int, scenario: str) -> np.ndarray:
+        """Return people array of the given year and scenario (the start year is the same for all scenarios)."""
+        if year == self.year_begin:
+            return self.start
+        return self.forecasts[scenario][year]
+
+
+def make_city_territory(  # pylint: disable=too-many-arguments
+    buildings: pd.DataFrame,
+    territories_population: Mapping[int, int],
+    city_population: int,
+    division_type: Literal["au_mo", "mo_au", "au_au", "mo_mo"] = "au_mo",
+    outer_column: str = "outer_territory_id",
+    inner_column: str = "inner_territory_id",
+) -> Territory:
+    """Build a city territory from the buildings DataFrame with `id`, `living_area` and outer and inner territories
+    identifiers columns and the population of the territories. Name of the city ends with `division_type` the same way
+    as the city loaded from the database.
+    """
+    outer_territories = []
+    for outer_id, outer_buildings in buildings.groupby(outer_column, sort=True):
+        inner_territories = [
+            Territory(
+                str(inner_id),
+                territories_population.get(inner_id, 0),
+                houses=inner_buildings[["id", "living_area"]].reset_index(drop=True),
+            )
+            for inner_id, inner_buildings in outer_buildings.groupby(inner_column, sort=True)
+        ]
+        outer_territories.append(Territory(str(outer_id), territories_population.get(outer_id, 0), inner_territories))
+    return Territory(f"City in-memory {division_type}", city_population, outer_territories)
+
+
+def divide_population(
+    houses: pd.DataFrame, social_groups: SocialGroupsDistribution, rng: np.random.Generator | None = None
+) -> np.ndarray:
+    """Divide balanced houses population by social groups, sex and age, returning people array with shape
+    [<houses>, <social_groups>, 2, <ages>]."""
+    divided = divide_houses(houses["population"].astype(int).to_list(), social_groups, rng)
+    if len(divided) == 0:
+        ages = len(social_groups.primary[0].distribution.men)
+        return np.zeros((0, len(social_groups.get_combined_names()), 2, ages), dtype=np.int64)
+    return np.stack(divided)
+
+
+def forecast_population(  # pylint: disable=too-many-arguments
+    start: np.ndarray,
+    capacity: np.ndarray,
+    social_groups: SocialGroupsDistribution,
+    survivability_coefficients: SurvivabilityCoefficients,
+    years: int,
+    multiplier: float = 1.0,
+    base_fertility: float = DEFAULT_BASE_FERTILITY,
+    rng: np.random.Generator | None = None,
+) -> Iterator[np.ndarray]:
+    """Forecast `start` people array for the given number of years with survivability and fertility coefficients
+    multiplied by the scenario `multiplier`, yielding people array of each next year."""
+    yield from forecast_people_arrays(
+        start,
+        capacity,
+        social_groups,
+        multiply_coefficients(survivability_coefficients, multiplier),
+        years,
+        base_fertility * multiplier,
+        rng,
+    )
+
+
+def multiply_coefficients(coefficients: SurvivabilityCoefficients, multiplier: float) -> SurvivabilityCoefficients:
+    """Return survivability coefficients of a scenario multiplied by its `multiplier`."""
+    return SurvivabilityCoefficients(
+        (np.array(coefficients.men) * multiplier).tolist(), (np.array(coefficients.women) * multiplier).tolist()
+    )
+
+
+def forecast_scenarios(  # pylint: disable=too-many-arguments
+    start: np.ndarray,
+    capacity: np.ndarray,
+    social_groups: SocialGroupsDistribution,
+    survivability_coefficients: SurvivabilityCoefficients,
+    years: int,
+    scenarios: Iterable[ScenarioParameters],
+    base_fertility: float = DEFAULT_BASE_FERTILITY,
+    rng: np.random.Generator | None = None,
+    batch_size: int = DEFAULT_SCENARIOS_BATCH_SIZE,
+) -> Iterator[tuple[ScenarioParameters, int, np.ndarray]]:
+    """Forecast `start` people array for the given number of years for each of the `scenarios`, yielding scenario,
+    number of years after the start and people array of each scenario and year.
+
+    Scenarios share the start array and are forecasted in batches of `batch_size` as an additional array dimension, so
+    a sensitivity sweep costs much less than separate forecasts of each scenario. Arrays of all scenarios of a batch
+    are yielded for a year before the next year is forecasted.
+    """
+    scenarios = list(scenarios)
+    for batch_begin in range(0, len(scenarios), max(batch_size, 1)):
+        batch = scenarios[batch_begin : batch_begin + max(batch_size, 1)]
+        logger.info("Forecasting scenarios {} together", ", ".join(scenario.name for scenario in batch))
+        for year, people in enumerate(
+            forecast_people_batch(
+                start,
+                capacity,
+                social_groups,
+                [
+                    multiply_coefficients(survivability_coefficients, scenario.survivability_multiplier)
+                    for scenario in batch
+                ],
+                [base_fertility * scenario.fertility_multiplier for scenario in batch],
+                years,
+                rng,
+            ),
+            1,
+        ):
+            for scenario, scenario_people in zip(batch, people):
+                yield scenario, year, scenario_people
+
+
+def run_population_model(  # pylint: disable=too-many-arguments
+    territory: Territory,
+    social_groups: SocialGroupsDistribution,
+    survivability_coefficients: SurvivabilityCoefficients | None,
+    year_begin: int,
+    years: int = 10,
+    scenarios: Mapping[str, float] | Iterable[ScenarioParameters] = ...,
+    base_fertility: float = DEFAULT_BASE_FERTILITY,
+    rng: np.random.Generator | None = None,
+    batch_size: int = DEFAULT_SCENARIOS_BATCH_SIZE,
+) -> PopulationModel:
+    """Balance the city territory population in place, divide its houses population and forecast it for each of the
+    `scenarios` (names mapped to survivability and fertility multiplier or `ScenarioParameters`) without any database
+    access. Scenarios are forecasted together in batches of `batch_size`.
+
+    All of the years arrays are kept in memory (houses * social_groups * 2 * ages * 8 bytes each), use
+    `forecast_population` directly to process years one by one for large cities.
+    """
+    if scenarios is ...:
+        scenarios = DEFAULT_SCENARIOS_MULTIPLIERS
+    if rng is None:
+        rng = np.random.default_rng(seed=int(time.time()))
+    houses = balance_city(territory).set_index("id")
+    houses["population"] = houses["population"].fillna(0).astype(int)
+    start = divide_population(houses, social_groups, rng)
+    model = PopulationModel(territory, houses, social_groups.get_combined_names(), year_begin, start)
+    if years == 0:
+        return model
+    if survivability_coefficients is None:
+        raise ValueError("Survivability coefficients are required to forecast population")
+    if isinstance(scenarios, Mapping):
+        scenarios = [ScenarioParameters.from_multiplier(name, multiplier) for name, multiplier in scenarios.items()]
+    for scenario, year, people in forecast_scenarios(
+        start,
+        houses["living_area"].to_numpy(),
+        social_groups,
+        survivability_coefficients,
+        years,
+        scenarios,
+        base_fertility,
+        rng,
+        batch_size,
+    ):
+        model.forecasts.setdefault(scenario.name, {})[year_begin + year] = people
+    return model
+
+
+def calculate_demands(  # pylint: disable=too-many-arguments
+    people: np.ndarray,
+    social_groups: list[str],
+    houses_ids: pd.Index,
+    services_social_groups: Mapping[str, list[str]],
+    services_normatives: Mapping[str, float],
+    primary_number: int | None = None,
+) -> pd.DataFrame:
+    """Calculate services demands of a year people array in the `provision.buildings_load_future` format (without
+    the `year` column) as `update_demands_table` does: houses population (sum of the first `primary_number` social
+    groups people, all of them by default), social groups population (sum of all of the social groups people), model
+    demand (number of people of the social groups of a service) and normative demand (population multiplied by the
+    normative per 1000 people) of each service type.
+    """
+    if primary_number is None:
+        primary_number = len(social_groups)
+    sgs_people = people.sum(axis=(2, 3))
+    population = sgs_people[:, :primary_number].sum(axis=1)
+    demands = {"year_population_sgs": sgs_people.sum(axis=1), "year_population": population}
+    indexes = {name: idx for idx, name in enumerate(social_groups)}
+    for service, service_social_groups in services_social_groups.items():
+        sgs_indexes = [indexes[sg] for sg in service_social_groups if sg in indexes]
+        demands[f"{service}_service_demand_value_model"] = sgs_people[:, sgs_indexes].sum(axis=1)
+    for service, normative in services_normatives.items():
+        demands[f"{service}_service_demand_value_normative"] = np.round(population * normative / 1000).astype(int)
+    return pd.DataFrame(demands, index=pd.Index(houses_ids, name="building_id"))
+
+
+def save_population_model(
+    conn: Connection, model: PopulationModel, layout: StorageLayout = StorageLayout.COLUMNS, city_id: int | None = None
+) -> int:
+    """Save balanced territories and houses population and people of all of the model years to the database without
+    committing, returning number of people distribution rows inserted. Forecast scenarios must be named the same as
+    `ForecastScenario` values, the start year is saved for all of the default scenarios if nothing was forecasted.
+    If `city_id` is given, the array model is recorded as the one which has produced the city scenarios results.
+    """
+    save_balanced_city(conn, model.territory, model.houses.reset_index())
+    houses_ids = model.houses.index.to_list()
+    social_groups_ids = [int(name) for name in model.social_groups]
+    rows = 0
+    scenarios_forecasts = model.forecasts or {scenario: {} for scenario in DEFAULT_SCENARIOS_MULTIPLIERS}
+    for scenario, forecasts in scenarios_forecasts.items():
+        previous = None
+        for year, people in ((model.year_begin, model.start), *sorted(forecasts.items())):
+            if layout == StorageLayout.DELTAS:
+                rows += save_people_delta_to_database(
+                    conn,
+                    encode_year_delta(people, previous, year),
+                    houses_ids,
+                    social_groups_ids,
+                    year,
+                    ForecastScenario(scenario),
+                )
+                previous = people
+                continue
+            rows += save_people_array_to_database(
+                conn, people, houses_ids, social_groups_ids, year, ForecastScenario(scenario), layout=layout
+            )
+    if city_id is not None:
+        set_forecast_results_model(
+            conn,
+            city_id,
+            scenarios_forecasts,
+            ForecastModel.ARRAY.value,
+            model.year_begin,
+            max((len(forecasts) for forecasts in scenarios_forecasts.values()), default=0),
+        )
+    return rows
@@ -0,0 +1,299 @@
+"""Incremental balancing of the city buildings changed since the previous run is defined here.
+
+Building inputs (leaf territory and living area of each living building) and balanced leaf territories population
+are fingerprinted into a JSON state file after each run. On the next run only leaf territories with different
+fingerprints are rebalanced, so only the buildings whose balanced population has changed (and the new ones) need to be
+divided, forecasted and rewritten. Forecast inputs (social groups distribution and survivability coefficients) are
+fingerprinted too, and the run is full if they have changed.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+from loguru import logger
+from population_restorator.balancer import balance_houses, balance_territories
+from population_restorator.models import Territory
+from sqlalchemy import Connection, delete
+
+from idu_balance_db.db.entities.enums import StorageLayout
+from idu_balance_db.db.ops.social_stats import get_base_year_table, get_sex_age_social_houses_table
+from idu_balance_db.utils.streaming import DEFAULT_BATCH_SIZE, batched
+
+
+@dataclass
+class BuildingFingerprint:
+    """Balancing inputs and result of a single living building."""
+
+    leaf: str
+    living_area: float
+    population: int
+
+
+@dataclass
+class IncrementalState:  # pylint: disable=too-many-instance-attributes
+    """Fingerprints of the previous run balancing inputs and the forecast parameters its results were saved with."""
+
+    city_id: int
+    year_begin: int
+    years: int
+    scenarios: list[str]
+    storage_layout: str
+    base_year_once: bool = False
+    forecast_model: str = "restorator"
+    distribution_fingerprint: str | None = None
+    coefficients_fingerprint: str | None = None
+    buildings: dict[int, BuildingFingerprint] = field(default_factory=dict)
+    territories: dict[str, int] = field(default_factory=dict)
+
+    def is_compatible(  # pylint: disable=too-many-arguments
+        self,
+        city_id: int,
+        year_begin: int,
+        years: int,
+        scenarios: list[str],
+        storage_layout: str,
+        base_year_once: bool = False,
+        forecast_model: str = "restorator",
+        distribution_fingerprint: str | None = None,
+        coefficients_fingerprint: str | None = None,
+    ) -> bool:
+        """Check that results of the previous run were saved for the same city, years range, scenarios, layout and
+        forecast model from the same social groups distribution and survivability coefficients (see `fingerprint_file`
+        and `fingerprint_dataframe`), so rows of the unchanged buildings can be kept.
+        """
+        return (
+            self.city_id == city_id
+            and self.year_begin == year_begin
+            and self.years == years
+            and sorted(self.scenarios) == sorted(scenarios)
+            and self.storage_layout == storage_layout
+            and self.base_year_once == base_year_once
+            and self.forecast_model == forecast_model
+            and self.distribution_fingerprint == distribution_fingerprint
+            and self.coefficients_fingerprint == coefficients_fingerprint
+        )
+
+    def to_dict(self) -> dict:
+        """Return state as a JSON-serializable dictionary."""
+        return {
+            "city_id": self.city_id,
+            "year_begin": self.year_begin,
+            "years": self.years,
+            "scenarios": sorted(self.scenarios),
+            "storage_layout": self.storage_layout,
+            "base_year_once": self.base_year_once,
+            "forecast_model": self.forecast_model,
+            "distribution_fingerprint": self.distribution_fingerprint,
+            "coefficients_fingerprint": self.coefficients_fingerprint,
+            "buildings": {
+                str(building_id): [fingerprint.leaf, fingerprint.living_area, fingerprint.population]
+                for building_id, fingerprint in self.buildings.items()
+            },
+            "territories": self.territories,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> IncrementalState:
+        """Construct state from a dictionary produced by `to_dict`. Forecast inputs fingerprints are missing in the
+        states written by the previous versions, so such states are not compatible with any run."""
+        return cls(
+            data["city_id"],
+            data["year_begin"],
+            data["years"],
+            data["scenarios"],
+            data["storage_layout"],
+            data.get("base_year_once", False),
+            data.get("forecast_model", "restorator"),
+            data.get("distribution_fingerprint"),
+            data.get("coefficients_fingerprint"),
+            {
+                int(building_id): BuildingFingerprint(leaf, living_area, population)
+                for building_id, (leaf, living_area, population) in data["buildings"].items()
+            },
+            data["territories"],
+        )
+
+    def save_json(self, path: Path) -> None:
+        """Write state to the given path atomically, so an interrupted run does not leave a broken state file."""
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_json(cls, path: Path) -> IncrementalState | None:
+        """Read state from the given path, returning None if it is missing."""
+        if not path.exists():
+            return None
+        with path.open("r", encoding="utf-8") as file:
+            return cls.from_dict(json.load(file))
+
+
+@dataclass
+class IncrementalBalancingResult:
+    """Result of the incremental balancing: all of the city houses with population, identifiers of the houses which
+    population has changed (or which are new) and identifiers of the houses which are not living anymore.
+    """
+
+    houses: pd.DataFrame
+    changed_houses_ids: list[int]
+    removed_houses_ids: list[int]
+    rebalanced_territories: list[str]
+
+
+def _iterate_leaves(city_territory: Territory) -> list[tuple[str, Territory]]:
+    """Return leaf territories of the city with their keys unique within the city."""
+    return [
+        (f"{outer_territory.name}/{inner_territory.name}", inner_territory)
+        for outer_territory in city_territory.inner_territories
+        for inner_territory in outer_territory.inner_territories
+    ]
+
+
+def _living_area_fingerprint(living_area) -> float:
+    """Return living area rounded to make fingerprints stable over numeric types of the database driver."""
+    return round(float(living_area), 2)
+
+
+def fingerprint_file(path: Path) -> str:
+    """Return SHA-256 digest of the file contents."""
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for block in iter(lambda: file.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_dataframe(dataframe: pd.DataFrame) -> str:
+    """Return SHA-256 digest of the DataFrame columns and values (for inputs which are not read from a file)."""
+    digest = hashlib.sha256(",".join(map(str, dataframe.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(dataframe, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def make_state(  # pylint: disable=too-many-arguments
+    city_territory: Territory,
+    city_id: int,
+    year_begin: int,
+    years: int,
+    scenarios: list[str],
+    storage_layout: str,
+    base_year_once: bool = False,
+    forecast_model: str = "restorator",
+    distribution_fingerprint: str | None = None,
+    coefficients_fingerprint: str | None = None,
+) -> IncrementalState:
+    """Fingerprint balanced city territories and houses together with the forecast parameters and inputs
+    fingerprints."""
+    state = IncrementalState(
+        city_id,
+        year_begin,
+        years,
+        sorted(scenarios),
+        storage_layout,
+        base_year_once,
+        forecast_model,
+        distribution_fingerprint,
+        coefficients_fingerprint,
+    )
+    for leaf_key, leaf in _iterate_leaves(city_territory):
+        state.territories[leaf_key] = int(leaf.population or 0)
+        state.buildings.update(_fingerprint_leaf_houses(leaf_key, leaf))
+    return state
+
+
+def _fingerprint_leaf_houses(leaf_key: str, leaf: Territory) -> dict[int, BuildingFingerprint]:
+    """Fingerprint balanced houses of the leaf territory (none if it is not balanced yet)."""
+    if "population" not in leaf.houses.columns:
+        return {}
+    return {
+        int(house_id): BuildingFingerprint(
+            leaf_key, _living_area_fingerprint(living_area), int(population) if pd.notna(population) else 0
+        )
+        for house_id, living_area, population in leaf.houses[["id", "living_area", "population"]].itertuples(
+            index=False
+        )
+    }
+
+
+def _is_leaf_changed(
+    leaf_key: str, leaf: Territory, previous_state: IncrementalState, previous_buildings: set[int]
+) -> bool:
+    """Check if the leaf territory population or any of its buildings inputs differ from the previous run."""
+    if previous_state.territories.get(leaf_key) != int(leaf.population or 0):
+        return True
+    if set(leaf.houses["id"].astype(int)) != previous_buildings:
+        return True
+    return any(
+        previous_state.buildings[int(house_id)].living_area != _living_area_fingerprint(living_area)
+        for house_id, living_area in leaf.houses[["id", "living_area"]].itertuples(index=False)
+    )
+
+
+def balance_city_incrementally(
+    city_territory: Territory, previous_state: IncrementalState
+) -> IncrementalBalancingResult:
+    """Balance city territories and rebalance houses of the leaf territories which inputs have changed since the
+    previous run.
+
+    Houses of the unchanged leaf territories get their previous population, houses of the changed ones are balanced
+    from scratch the same way the full run does it.
+    """
+    logger.info("Balancing city territories")
+    balance_territories(city_territory)
+
+    previous_leaves_buildings: dict[str, set[int]] = {}
+    for building_id, fingerprint in previous_state.buildings.items():
+        previous_leaves_buildings.setdefault(fingerprint.leaf, set()).add(building_id)
+
+    rebalanced_territories = []
+    for leaf_key, leaf in _iterate_leaves(city_territory):
+        if _is_leaf_changed(leaf_key, leaf, previous_state, previous_leaves_buildings.get(leaf_key, set())):
+            rebalanced_territories.append(leaf_key)
+            balance_houses(leaf)
+        else:
+            leaf.houses["population"] = [
+                previous_state.buildings[int(house_id)].population for house_id in leaf.houses["id"]
+            ]
+    logger.info(
+        "Rebalanced {} of {} territories changed since the previous run",
+        len(rebalanced_territories),
+        len(previous_state.territories),
+    )
+
+    houses = city_territory.get_all_houses()
+    changed_houses_ids = [
+        int(house_id)
+        for house_id, population in houses[["id", "population"]].itertuples(index=False)
+        if int(house_id) not in previous_state.buildings
+        or previous_state.buildings[int(house_id)].population != (int(population) if pd.notna(population) else 0)
+    ]
+    current_houses_ids = set(houses["id"].astype(int))
+    removed_houses_ids = [
+        building_id for building_id in previous_state.buildings if building_id not in current_houses_ids
+    ]
+    return IncrementalBalancingResult(houses, changed_houses_ids, removed_houses_ids, rebalanced_territories)
+
+
+def delete_buildings_results(
+    conn: Connection,
+    buildings_ids: list[int],
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    base_year_once: bool = False,
+) -> int:
+    """Delete people distribution rows of the given buildings for all years and scenarios (and base year rows if
+    `base_year_once` is set), returning number of rows deleted."""
+    tables = [get_sex_age_social_houses_table(layout)]
+    if base_year_once:
+        tables.append(get_base_year_table(layout))
+    deleted = 0
+    for buildings_batch in batched(buildings_ids, batch_size):
+        for table in tables:
+            deleted += conn.execute(delete(table).where(table.c.building_id.in_(buildings_batch))).rowcount
+    return deleted
@@ -0,0 +1,216 @@
+"""Export of forecast results to partitioned Parquet files is defined here.
+
+`pyarrow` is an optional dependency (`parquet` extra), it is imported only when the export is performed.
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+import numpy as np
+from loguru import logger
+from population_restorator.db.entities import t_population_divided
+from sqlalchemy import Connection, select
+
+from idu_balance_db.db.entities.enums import ForecastScenario
+from idu_balance_db.db.ops.buildings import get_city_buildings_territories
+from idu_balance_db.exceptions import OptionalDependencyMissingError
+from idu_balance_db.utils.streaming import DEFAULT_BATCH_SIZE, batched, stream_rows
+
+from .saving import get_social_groups_mapping
+
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+PARQUET_COMPRESSION = "zstd"
+
+PEOPLE_DATASET = "sex_age_social_houses"
+"""Name of the directory of people distribution dataset partitioned by scenario and year."""
+
+BUILDINGS_FILE = "buildings_territories.parquet"
+"""Name of the file with buildings to territories mapping."""
+
+
+def _import_pyarrow() -> tuple[Any, Any]:
+    """Import pyarrow and pyarrow.parquet modules, raising an error with installation hint if they are missing."""
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise OptionalDependencyMissingError("pyarrow", "parquet") from exc
+    return pyarrow, pyarrow.parquet
+
+
+def _get_people_schema(pyarrow: Any) -> "pa.Schema":
+    return pyarrow.schema(
+        [
+            ("building_id", pyarrow.int32()),
+            ("social_group_id", pyarrow.int32()),
+            ("age", pyarrow.int16()),
+            ("men", pyarrow.int16()),
+            ("women", pyarrow.int16()),
+        ]
+    )
+
+
+def get_partition_path(output_dir: Path, scenario: ForecastScenario, year: int) -> Path:
+    """Return path of the Parquet file of a given (scenario, year) in a hive-style partitioned dataset."""
+    return output_dir / PEOPLE_DATASET / f"scenario={scenario.value}" / f"year={year}" / "part-0.parquet"
+
+
+def _write_people_partition(
+    output_dir: Path, scenario: ForecastScenario, year: int, tables: Iterable["pa.Table"]
+) -> int:
+    """Write the given Arrow tables as row groups of the Parquet file of a (scenario, year) partition, replacing the
+    file atomically. Returns number of rows written."""
+    pyarrow, parquet = _import_pyarrow()
+    schema = _get_people_schema(pyarrow)
+    path = get_partition_path(output_dir, scenario, year)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+    rows_written = 0
+    with parquet.ParquetWriter(tmp_path, schema, compression=PARQUET_COMPRESSION) as writer:
+        for table in tables:
+            writer.write_table(table)
+            rows_written += table.num_rows
+        if rows_written == 0:
+            writer.write_table(schema.empty_table())
+    os.replace(tmp_path, path)
+    logger.debug("Exported {} rows of year {} scenario '{}' to {}", rows_written, year, scenario.value, path)
+    return rows_written
+
+
+def export_year_to_parquet(  # pylint: disable=too-many-arguments
+    year_conn: Connection,
+    output_dir: Path,
+    year: int,
+    scenario: ForecastScenario,
+    db_max_age: int = 100,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Write people distribution of the given year from the temporary database to the Parquet file of the
+    (scenario, year) partition in a long format (`building_id`, `social_group_id`, `age`, `men`, `women`), sorted by
+    building and social group. Rows are streamed and written by `batch_size` row groups, file is replaced atomically.
+
+    Returns number of rows written.
+    """
+    pyarrow, _ = _import_pyarrow()
+    schema = _get_people_schema(pyarrow)
+    social_groups = get_social_groups_mapping(year_conn)
+
+    rows = stream_rows(
+        year_conn,
+        select(
+            t_population_divided.c.house_id,
+            t_population_divided.c.social_group_id,
+            t_population_divided.c.age,
+            t_population_divided.c.men,
+            t_population_divided.c.women,
+        )
+        .where(
+            (t_population_divided.c.year == year)
+            & ((t_population_divided.c.men > 0) | (t_population_divided.c.women > 0))
+            & (t_population_divided.c.age <= db_max_age)
+        )
+        .order_by(t_population_divided.c.house_id, t_population_divided.c.social_group_id),
+        batch_size=batch_size,
+    )
+    return _write_people_partition(
+        output_dir,
+        scenario,
+        year,
+        (_people_batch_to_table(pyarrow, schema, batch, social_groups) for batch in batched(rows, batch_size)),
+    )
+
+
+def export_people_array_to_parquet(  # pylint: disable=too-many-arguments
+    people: np.ndarray,
+    houses_ids: list[int],
+    social_groups_ids: list[int],
+    output_dir: Path,
+    year: int,
+    scenario: ForecastScenario,
+    db_max_age: int = 100,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Write a year people array with shape [<houses>, <social_groups>, 2, <ages>] (for example, of the in-memory
+    population model) to the Parquet file of the (scenario, year) partition in the same format as
+    `export_year_to_parquet`, sorted by building and social group. Row groups are written for batches of houses
+    of about `batch_size` rows.
+
+    Returns number of rows written.
+    """
+    pyarrow, _ = _import_pyarrow()
+    houses_per_batch = max(batch_size // max(people.shape[1] * min(people.shape[3], db_max_age + 1), 1), 1)
+    return _write_people_partition(
+        output_dir,
+        scenario,
+        year,
+        _people_array_to_tables(
+            pyarrow, people[..., : db_max_age + 1], houses_ids, social_groups_ids, houses_per_batch
+        ),
+    )
+
+
+def _people_array_to_tables(
+    pyarrow: Any, people: np.ndarray, houses_ids: list[int], social_groups_ids: list[int], houses_per_batch: int
+) -> Iterator["pa.Table"]:
+    """Yield Arrow table of people with non-zero number of men or women for each batch of houses sorted by building
+    and social group identifiers."""
+    schema = _get_people_schema(pyarrow)
+    houses_order = np.argsort(houses_ids, kind="stable")
+    sgs_order = np.argsort(social_groups_ids, kind="stable")
+    houses = np.asarray(houses_ids)[houses_order]
+    social_groups = np.asarray(social_groups_ids)[sgs_order]
+    for begin in range(0, len(houses), houses_per_batch):
+        batch = people[houses_order[begin : begin + houses_per_batch]][:, sgs_order]
+        house_idx, sg_idx, age = np.nonzero((batch[:, :, 0] > 0) | (batch[:, :, 1] > 0))
+        yield _columns_to_table(
+            pyarrow,
+            schema,
+            [
+                houses[begin + house_idx],
+                social_groups[sg_idx],
+                age,
+                batch[house_idx, sg_idx, 0, age],
+                batch[house_idx, sg_idx, 1, age],
+            ],
+        )
+
+
+def _people_batch_to_table(
+    pyarrow: Any, schema: "pa.Schema", batch: list[tuple[int, int, int, int, int]], social_groups: dict[int, int]
+) -> "pa.Table":
+    """Convert batch of temporary database rows to the Arrow table with main database social groups identifiers."""
+    columns = [list(column) for column in zip(*batch)]
+    columns[1] = [social_groups[sg_id] for sg_id in columns[1]]
+    return _columns_to_table(pyarrow, schema, columns)
+
+
+def _columns_to_table(pyarrow: Any, schema: "pa.Schema", columns: list[Any]) -> "pa.Table":
+    """Convert columns of the people schema fields order to the Arrow table."""
+    return pyarrow.Table.from_arrays(
+        [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+    )
+
+
+def export_buildings_territories(conn: Connection, city_id: int, output_dir: Path) -> int:
+    """Write living buildings of the city with their administrative unit, municipality and block identifiers,
+    living area and balanced population to the Parquet file next to the people dataset.
+
+    Returns number of buildings written.
+    """
+    pyarrow, parquet = _import_pyarrow()
+    buildings = get_city_buildings_territories(conn, city_id)
+    for column in ("administrative_unit_id", "municipality_id", "block_id", "population_balanced"):
+        buildings[column] = buildings[column].astype("Int32")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    parquet.write_table(
+        pyarrow.Table.from_pandas(buildings, preserve_index=False),
+        output_dir / BUILDINGS_FILE,
+        compression=PARQUET_COMPRESSION,
+    )
+    return buildings.shape[0]
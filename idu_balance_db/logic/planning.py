@@ -0,0 +1,194 @@
+"""Dry-run planning logic (balance-db run cost estimation without side effects) is defined here."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from sqlalchemy import Connection, select, text
+from sqlalchemy.sql.functions import count
+
+from idu_balance_db.db.entities import (
+    t_administrative_units,
+    t_buildings,
+    t_municipalities,
+    t_physical_objects,
+    t_social_groups,
+)
+from idu_balance_db.db.entities.enums import ForecastModel, StorageLayout
+from idu_balance_db.logic.social import DEFAULT_MAX_AGE
+from idu_balance_db.utils.run_report import RunReport
+
+
+SEX_AGE_SOCIAL_HOUSES_ROW_BYTES = 24 + 4 * 4 + 2 * 2 * (DEFAULT_MAX_AGE + 1) + 16
+"""Approximate size of `sex_age_social_houses` row with an index entry (tuple header, keys, smallint ages)."""
+
+SMALLINT_ARRAY_BYTES = 24 + 2 * (DEFAULT_MAX_AGE + 1)
+"""Approximate size of a smallint array of all of the ages (array header and elements)."""
+
+PEOPLE_ROW_BYTES: dict[StorageLayout, int] = {
+    StorageLayout.COLUMNS: SEX_AGE_SOCIAL_HOUSES_ROW_BYTES,
+    StorageLayout.ARRAYS: 24 + 4 * 4 + 2 * SMALLINT_ARRAY_BYTES + 16,
+    StorageLayout.DELTAS: 24 + 4 * 4 + 3 * SMALLINT_ARRAY_BYTES + 16,
+}
+"""Approximate size of a people distribution row with an index entry for each storage layout (upper bound for the
+deltas layout, which stores only changed ages)."""
+
+BUILDINGS_LOAD_FUTURE_ROW_BYTES = 24 + 4 * 4 + 16
+"""Approximate size of `buildings_load_future` row without the service columns and with an index entry."""
+
+POPULATION_DIVIDED_ROW_BYTES = 48
+"""Approximate size of a temporary database `population_divided` row."""
+
+
+@dataclass
+class CityCounts:
+    """Sizes of the city data which the run cost depends on."""
+
+    buildings: int
+    administrative_units: int
+    municipalities: int
+    social_groups: int
+    service_types: int
+
+
+@dataclass
+class StagePlan:
+    """Expected stage executions count, number of entities it is going to process and its estimated duration
+    (None if there is no run reports with this stage to calibrate on)."""
+
+    stage: str
+    count: int
+    rows: int
+    estimated_time: float | None = None
+
+
+@dataclass
+class RunPlan:  # pylint: disable=too-many-instance-attributes
+    """Estimated cost of a balance-db run. Rows numbers are upper bounds, as empty social groups of a house are
+    not saved (and only changed social groups are saved for forecasted years with the deltas layout).
+    `sex_age_social_houses_rows` is the number of people distribution rows of the `layout` table (and of its base
+    year table if `base_year_once` is set)."""
+
+    counts: CityCounts
+    years: int
+    scenarios: int
+    sex_age_social_houses_rows: int
+    buildings_load_future_rows: int
+    main_db_bytes: int
+    tmp_db_bytes_per_year: int
+    layout: StorageLayout = StorageLayout.COLUMNS
+    model: ForecastModel = ForecastModel.RESTORATOR
+    base_year_once: bool = False
+    stages: list[StagePlan] = field(default_factory=list)
+
+    @property
+    def estimated_time(self) -> float | None:
+        """Total estimated time, None if any of the stages could not be estimated."""
+        if any(stage.estimated_time is None for stage in self.stages):
+            return None
+        return sum(stage.estimated_time for stage in self.stages)
+
+
+def get_city_counts(conn: Connection, city_id: int, social_groups: int | None = None) -> CityCounts:
+    """Count city living buildings, territories and service types with cheap aggregate queries. If `social_groups`
+    number is not given (i.e. taken from the distribution file), all of the social groups in the database are counted.
+    """
+    buildings = conn.execute(
+        select(count())
+        .select_from(t_buildings)
+        .join(t_physical_objects, t_buildings.c.physical_object_id == t_physical_objects.c.id)
+        .where(
+            (t_physical_objects.c.city_id == city_id)
+            & (t_buildings.c.is_living == True)  # pylint: disable=singleton-comparison
+            & (t_buildings.c.living_area > 0)
+        )
+    ).scalar_one()
+    administrative_units = conn.execute(
+        select(count()).select_from(t_administrative_units).where(t_administrative_units.c.city_id == city_id)
+    ).scalar_one()
+    municipalities = conn.execute(
+        select(count()).select_from(t_municipalities).where(t_municipalities.c.city_id == city_id)
+    ).scalar_one()
+    if social_groups is None:
+        social_groups = conn.execute(select(count()).select_from(t_social_groups)).scalar_one()
+    service_types = conn.execute(
+        text("SELECT count(DISTINCT city_service_type_id) FROM maintenance.social_groups_city_service_types")
+    ).scalar_one()
+    return CityCounts(buildings, administrative_units, municipalities, social_groups, service_types)
+
+
+def calibrate_from_reports(reports: list[RunReport]) -> dict[str, tuple[float, bool]]:
+    """Return stage name -> (seconds per row, True) for stages with rows set and (seconds per execution, False)
+    for the others, calculated over all of the given run reports.
+    """
+    sums: dict[str, list[float]] = {}
+    for report in reports:
+        for stage in report.stages:
+            wall_time, rows, executions = sums.setdefault(stage.stage, [0.0, 0, 0])
+            sums[stage.stage] = [wall_time + stage.wall_time, rows + stage.rows, executions + 1]
+    return {
+        stage: (wall_time / rows, True) if rows > 0 else (wall_time / executions, False)
+        for stage, (wall_time, rows, count) in sums.items()
+    }
+
+
+def plan_run(  # pylint: disable=too-many-arguments,too-many-locals
+    counts: CityCounts,
+    years: int,
+    scenarios: int,
+    reports: list[RunReport] | None = None,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    model: ForecastModel = ForecastModel.RESTORATOR,
+    base_year_once: bool = False,
+) -> RunPlan:
+    """Estimate rows written, databases size and stages time of the run with the given storage `layout`, forecast
+    `model` and start year saving. Stage rows match the ones set by the balance-db run report, so time estimation
+    uses throughput of the previous runs from `reports`. Start year is saved for each scenario with the deltas
+    layout, as the run does regardless of `base_year_once`.
+    """
+    base_year_once = base_year_once and layout != StorageLayout.DELTAS
+    houses = counts.buildings
+    saved_years = years * scenarios + (1 if base_year_once else scenarios)
+    sash_rows = houses * counts.social_groups * saved_years
+    blf_rows = houses * (years + 1)
+    in_memory = model == ForecastModel.ARRAY
+    plan = RunPlan(
+        counts,
+        years,
+        scenarios,
+        sash_rows,
+        blf_rows,
+        sash_rows * PEOPLE_ROW_BYTES[layout]
+        + blf_rows * (BUILDINGS_LOAD_FUTURE_ROW_BYTES + 2 * 2 * counts.service_types),
+        0 if in_memory else houses * counts.social_groups * (DEFAULT_MAX_AGE + 1) * POPULATION_DIVIDED_ROW_BYTES,
+        layout,
+        model,
+        base_year_once,
+    )
+    plan.stages = [
+        StagePlan("hierarchy_load", 1, houses),
+        StagePlan("balancing", 1, houses),
+        StagePlan("write_back", 1, houses),
+        StagePlan("social_groups_load", 1, 0),
+        StagePlan("division", 1, houses),
+    ]
+    if not in_memory:
+        plan.stages.append(StagePlan("division_save", 1, houses))
+    if years > 0 and not in_memory:
+        plan.stages.append(StagePlan("forecast_ages", scenarios, years * scenarios))
+    if years > 0:
+        plan.stages.append(StagePlan("forecast", years * scenarios, houses * years * scenarios))
+    plan.stages.extend(
+        [
+            StagePlan("save", saved_years, sash_rows),
+            StagePlan("matviews", 1, 0),
+            StagePlan("demands", 1, blf_rows),
+        ]
+    )
+
+    rates = calibrate_from_reports(reports or [])
+    for stage in plan.stages:
+        if stage.stage not in rates:
+            continue
+        rate, per_row = rates[stage.stage]
+        stage.estimated_time = rate * (stage.rows if per_row else stage.count)
+    return plan
@@ -0,0 +1,99 @@
+"""Database preparation logic (supporting indexes and query plans checks) is defined here."""
+import re
+
+from loguru import logger
+from sqlalchemy import Connection, Engine, Executable, Index, Table, select
+
+from idu_balance_db.db.entities import t_buildings, t_physical_objects
+from idu_balance_db.db.entities.enums import StorageLayout
+from idu_balance_db.db.ops.indexes import create_index, explain, index_exists, is_index_valid
+from idu_balance_db.db.ops.social_stats import get_sex_age_social_houses_table
+
+
+def get_supporting_indexes(layout: StorageLayout = StorageLayout.COLUMNS) -> list[Index]:
+    """Return indexes declared in the entities definitions which the pipeline queries rely on."""
+    results_table = get_sex_age_social_houses_table(layout)
+    return sorted(t_physical_objects.indexes, key=lambda index: index.name) + sorted(
+        results_table.indexes, key=lambda index: index.name
+    )
+
+
+def ensure_indexes(engine: Engine, layout: StorageLayout = StorageLayout.COLUMNS, concurrently: bool = False) -> int:
+    """Create missing supporting indexes, returning number of indexes created.
+
+    With `concurrently` indexes are created without locking tables for writes, each in its own transaction.
+    """
+    created = 0
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in get_supporting_indexes(layout):
+            if index_exists(conn, index):
+                if not is_index_valid(conn, index):
+                    logger.warning(
+                        "Index {} is invalid (previous concurrent creation has failed), drop it and run again",
+                        index.name,
+                    )
+                continue
+            logger.info("Creating index {} on {}", index.name, index.table.fullname)
+            create_index(conn, index, concurrently)
+            created += 1
+    return created
+
+
+def get_hot_statements(
+    conn: Connection, city_id: int, layout: StorageLayout = StorageLayout.COLUMNS
+) -> dict[str, tuple[Executable, Table]]:
+    """Return pipeline statements which performance depends on the supporting indexes, parametrized by the given city
+    sample territories and buildings, along with the large table each of them filters by an indexed column."""
+    municipality_id, administrative_unit_id = conn.execute(
+        select(t_physical_objects.c.municipality_id, t_physical_objects.c.administrative_unit_id)
+        .where(t_physical_objects.c.city_id == city_id)
+        .limit(1)
+    ).one_or_none() or (0, 0)
+    buildings_ids = list(
+        conn.execute(
+            select(t_buildings.c.id)
+            .join(t_physical_objects, t_buildings.c.physical_object_id == t_physical_objects.c.id)
+            .where(t_physical_objects.c.city_id == city_id)
+            .limit(100)
+        ).scalars()
+    ) or [0]
+    buildings_statement = select(t_buildings.c.id, t_buildings.c.living_area).join(
+        t_physical_objects, t_buildings.c.physical_object_id == t_physical_objects.c.id
+    )
+    results_table = get_sex_age_social_houses_table(layout)
+    return {
+        "municipality buildings": (
+            buildings_statement.where(t_physical_objects.c.municipality_id == municipality_id),
+            t_physical_objects,
+        ),
+        "administrative unit buildings": (
+            buildings_statement.where(t_physical_objects.c.administrative_unit_id == administrative_unit_id),
+            t_physical_objects,
+        ),
+        "city buildings": (buildings_statement.where(t_physical_objects.c.city_id == city_id), t_physical_objects),
+        "buildings results": (
+            select(results_table.c.building_id).where(results_table.c.building_id.in_(buildings_ids)),
+            results_table,
+        ),
+        "social group results": (
+            select(results_table.c.building_id).where(results_table.c.social_group_id == 0),
+            results_table,
+        ),
+    }
+
+
+def check_query_plans(conn: Connection, city_id: int, layout: StorageLayout = StorageLayout.COLUMNS) -> list[str]:
+    """Run EXPLAIN on each of the hot statements and warn if the table filtered by an indexed column is scanned
+    sequentially (which is fine only if the table is small yet).
+
+    Returns names of the statements with sequential scans.
+    """
+    slow_statements = []
+    for name, (statement, table) in get_hot_statements(conn, city_id, layout).items():
+        plan = explain(conn, statement)
+        logger.debug("Query plan of '{}':\n{}", name, "\n".join(plan))
+        seq_scan = re.compile(rf"Seq Scan on (?:{table.schema}\.)?{table.name}\b")
+        if any(seq_scan.search(line) is not None for line in plan):
+            logger.warning("Query '{}' performs sequential scan on {}", name, table.fullname)
+            slow_statements.append(name)
+    return slow_statements
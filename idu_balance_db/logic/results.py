@@ -0,0 +1,257 @@
+"""Cached read API of the forecast results is defined here.
+
+City results of a (scenario, years range) are fetched with a single streamed query to numpy arrays and kept in
+a memory-limited LRU cache, so repeated building-, municipality-, administrative unit- or city-level queries are
+answered by vectorized aggregation without touching the database.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy import Engine, select
+
+from idu_balance_db.db.entities import t_buildings, t_physical_objects
+from idu_balance_db.db.entities.enums import ForecastScenario, StorageLayout
+from idu_balance_db.db.ops.buildings import get_city_buildings_territories
+from idu_balance_db.db.ops.social_stats import get_people_source
+from idu_balance_db.utils.memory_cache import MemoryLRUCache
+from idu_balance_db.utils.streaming import DEFAULT_BATCH_SIZE, batched, stream_rows
+
+
+DEFAULT_CACHE_SIZE = 2**30
+"""Default forecast results cache size limit in bytes (1 GB)."""
+
+
+class AggregationLevel(Enum):
+    """Level to aggregate forecast results at."""
+
+    BUILDING = "building"
+    MUNICIPALITY = "municipality"
+    ADMINISTRATIVE_UNIT = "administrative_unit"
+    CITY = "city"
+
+
+@dataclass
+class ForecastResults:  # pylint: disable=too-many-instance-attributes
+    """Forecast results of a city for a (scenario, years range) as numpy arrays aligned by row. Each row is
+    a (year, building, social group) with people numbers by age in `men` and `women` matrices.
+
+    `municipalities` and `administrative_units` hold territory identifiers of each row building (-1 if missing).
+    """
+
+    city_id: int
+    scenario: ForecastScenario
+    year_begin: int
+    year_end: int
+    years: np.ndarray
+    buildings: np.ndarray
+    social_groups: np.ndarray
+    municipalities: np.ndarray
+    administrative_units: np.ndarray
+    men: np.ndarray
+    women: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        """Memory size of the results arrays."""
+        return sum(
+            array.nbytes
+            for array in (
+                self.years,
+                self.buildings,
+                self.social_groups,
+                self.municipalities,
+                self.administrative_units,
+                self.men,
+                self.women,
+            )
+        )
+
+    def get_level_ids(self, level: AggregationLevel) -> np.ndarray:
+        """Return identifiers of the territory of the given level for each row."""
+        if level == AggregationLevel.BUILDING:
+            return self.buildings
+        if level == AggregationLevel.MUNICIPALITY:
+            return self.municipalities
+        if level == AggregationLevel.ADMINISTRATIVE_UNIT:
+            return self.administrative_units
+        return np.full(self.buildings.shape[0], self.city_id, dtype=np.int32)
+
+
+class ForecastResultsReader:
+    """Forecast results reader with a cache limited by `max_cache_bytes`.
+
+    Results of a city and scenario are loaded for the requested years range once, later requests of the same or
+    narrower years range are served from the cache. With the deltas storage layout each year of the range is rebuilt
+    from the differences since the latest keyframe year before it (see `create_deltas_storage`).
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        engine: Engine,
+        max_cache_bytes: int = DEFAULT_CACHE_SIZE,
+        layout: StorageLayout = StorageLayout.COLUMNS,
+        max_age: int = 100,
+        base_year_once: bool = False,
+    ):
+        self.engine = engine
+        self.layout = layout
+        self.base_year_once = base_year_once
+        self.max_age = max_age
+        self.cache: MemoryLRUCache[tuple[int, ForecastScenario, int, int], ForecastResults] = MemoryLRUCache(
+            max_cache_bytes
+        )
+
+    def load(self, city_id: int, scenario: ForecastScenario, year_begin: int, year_end: int) -> ForecastResults:
+        """Return city results of the given scenario and years range (inclusive) from the cache or the database."""
+        for key in self.cache.keys():
+            cached_city_id, cached_scenario, cached_begin, cached_end = key
+            if (cached_city_id, cached_scenario) != (city_id, scenario):
+                continue
+            if cached_begin <= year_begin and year_end <= cached_end and (results := self.cache.get(key)) is not None:
+                return results
+        results = self._fetch(city_id, scenario, year_begin, year_end)
+        self.cache.put((city_id, scenario, year_begin, year_end), results)
+        return results
+
+    def get_people(  # pylint: disable=too-many-arguments,too-many-locals
+        self,
+        city_id: int,
+        scenario: ForecastScenario,
+        years: int | Iterable[int],
+        level: AggregationLevel = AggregationLevel.BUILDING,
+        ids: Iterable[int] | None = None,
+        social_groups: Iterable[int] | None = None,
+        ages: tuple[int, int] | None = None,
+        by_age: bool = False,
+        by_social_group: bool = False,
+    ) -> pd.DataFrame:
+        """Return number of men and women aggregated at the given `level` for each of the given `years`.
+
+        Results can be filtered by territories `ids` of the given level, `social_groups` identifiers and `ages`
+        range (inclusive). DataFrame is indexed by (year, `level` id[, social_group_id]) and contains `men`,
+        `women` and `total` columns, or `men_{age}` and `women_{age}` columns for each age if `by_age` is set.
+        """
+        years = [years] if isinstance(years, int) else sorted(set(years))
+        results = self.load(city_id, scenario, min(years), max(years))
+
+        level_ids = results.get_level_ids(level)
+        mask = np.isin(results.years, years)
+        if ids is not None:
+            mask &= np.isin(level_ids, np.fromiter(ids, dtype=np.int64))
+        if social_groups is not None:
+            mask &= np.isin(results.social_groups, np.fromiter(social_groups, dtype=np.int64))
+        age_from, age_to = ages if ages is not None else (0, results.men.shape[1] - 1)
+
+        keys = [results.years[mask], level_ids[mask]]
+        index_names = ["year", f"{level.value}_id"]
+        if by_social_group:
+            keys.append(results.social_groups[mask])
+            index_names.append("social_group_id")
+        men = results.men[mask, age_from : age_to + 1]
+        women = results.women[mask, age_from : age_to + 1]
+        if not by_age:
+            men = men.sum(axis=1, dtype=np.int64)[:, None]
+            women = women.sum(axis=1, dtype=np.int64)[:, None]
+
+        groups_index, men_sums, women_sums = _group_sum(keys, men, women)
+        index = pd.MultiIndex.from_arrays(groups_index, names=index_names)
+        if by_age:
+            ages_range = range(age_from, age_to + 1)
+            return pd.concat(
+                [
+                    pd.DataFrame(men_sums, index=index, columns=[f"men_{age}" for age in ages_range]),
+                    pd.DataFrame(women_sums, index=index, columns=[f"women_{age}" for age in ages_range]),
+                ],
+                axis=1,
+            )
+        return pd.DataFrame(
+            {"men": men_sums[:, 0], "women": women_sums[:, 0], "total": men_sums[:, 0] + women_sums[:, 0]},
+            index=index,
+        )
+
+    def _fetch(  # pylint: disable=too-many-locals
+        self, city_id: int, scenario: ForecastScenario, year_begin: int, year_end: int
+    ) -> ForecastResults:
+        """Read city results with a single streamed query converting each batch to numpy arrays right away."""
+        table = get_people_source(self.layout, self.base_year_once)
+        arrays = "men" in table.c
+        if arrays:
+            people_columns = [table.c.men, table.c.women]
+        else:
+            people_columns = [table.c[f"men_{age}"] for age in range(self.max_age + 1)] + [
+                table.c[f"women_{age}"] for age in range(self.max_age + 1)
+            ]
+        statement = (
+            select(table.c.year, table.c.building_id, table.c.social_group_id, *people_columns)
+            .join(t_buildings, table.c.building_id == t_buildings.c.id)
+            .join(t_physical_objects, t_buildings.c.physical_object_id == t_physical_objects.c.id)
+            .where(
+                (t_physical_objects.c.city_id == city_id)
+                & (table.c.scenario == scenario)
+                & (table.c.year.between(year_begin, year_end))
+            )
+        )
+        keys_batches: list[np.ndarray] = []
+        people_batches: list[np.ndarray] = []
+        logger.debug(
+            "Loading forecast results of city {}, scenario {}, years {}-{}", city_id, scenario, year_begin, year_end
+        )
+        with self.engine.connect() as conn:
+            for batch in batched(stream_rows(conn, statement), DEFAULT_BATCH_SIZE):
+                keys_batches.append(np.array([row[:3] for row in batch], dtype=np.int32).reshape(-1, 3))
+                if arrays:
+                    people = np.array([row[3] + row[4] for row in batch], dtype=np.int16)
+                else:
+                    people = np.array([row[3:] for row in batch], dtype=np.int16)
+                people_batches.append(people.reshape(len(batch), -1))
+            territories = get_city_buildings_territories(conn, city_id)
+
+        ages = self.max_age + 1
+        keys = np.concatenate(keys_batches) if keys_batches else np.empty((0, 3), dtype=np.int32)
+        people = np.concatenate(people_batches) if people_batches else np.empty((0, 2 * ages), dtype=np.int16)
+        positions = pd.Index(territories["building_id"]).get_indexer(keys[:, 1])
+        return ForecastResults(
+            city_id,
+            scenario,
+            year_begin,
+            year_end,
+            keys[:, 0].copy(),
+            keys[:, 1].copy(),
+            keys[:, 2].copy(),
+            _take_territories(territories["municipality_id"], positions),
+            _take_territories(territories["administrative_unit_id"], positions),
+            np.ascontiguousarray(people[:, :ages]),
+            np.ascontiguousarray(people[:, ages:]),
+        )
+
+
+def _take_territories(territories: pd.Series, positions: np.ndarray) -> np.ndarray:
+    """Return territory identifier by building position in the `territories` series (-1 for missing ones)."""
+    values = territories.fillna(-1).to_numpy(dtype=np.int32)
+    return np.where(positions >= 0, values[np.maximum(positions, 0)] if values.size > 0 else -1, -1).astype(np.int32)
+
+
+def _group_sum(
+    keys: list[np.ndarray], men: np.ndarray, women: np.ndarray
+) -> tuple[list[np.ndarray], np.ndarray, np.ndarray]:
+    """Sum `men` and `women` matrices rows by unique combinations of `keys` using sorting and `np.add.reduceat`."""
+    if men.shape[0] == 0:
+        return [key[:0] for key in keys], men.astype(np.int64), women.astype(np.int64)
+    order = np.lexsort(keys[::-1])
+    sorted_keys = [key[order] for key in keys]
+    changes = np.zeros(order.shape[0], dtype=bool)
+    changes[0] = True
+    for key in sorted_keys:
+        changes[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(changes)
+    return (
+        [key[starts] for key in sorted_keys],
+        np.add.reduceat(men[order].astype(np.int64), starts, axis=0),
+        np.add.reduceat(women[order].astype(np.int64), starts, axis=0),
+    )
@@ -1,30 +1,53 @@
 """Functionality of saving data to main DB is defined here."""
+from __future__ import annotations
+
+import itertools
+import time
+from typing import Any, Callable, Iterable
+
+import numpy as np
 from loguru import logger
-from population_restorator.db.entities import t_population_divided, t_social_groups_probabilities
-from sqlalchemy import Connection, delete, distinct, select
+from population_restorator.db.entities import t_houses_tmp, t_population_divided, t_social_groups_probabilities
+from sqlalchemy import Connection, Engine, Table, delete, select
 from sqlalchemy.dialects.postgresql import insert
-from tqdm import tqdm
+from sqlalchemy.sql.functions import now
 
-from idu_balance_db.db.entities.enums import ForecastScenario
-from idu_balance_db.db.entities.social_stats import t_sex_age_social_houses
+from idu_balance_db.db.entities.enums import ForecastScenario, StorageLayout
+from idu_balance_db.db.entities.social_stats import t_forecast_saving_progress
+from idu_balance_db.db.ops.social_stats import get_base_year_table, get_sex_age_social_houses_table
+from idu_balance_db.exceptions.db.saving import ResultsSavingError
+from idu_balance_db.utils.progress import progress_task
+from idu_balance_db.utils.streaming import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_INSERT_BATCH_SIZE,
+    batched,
+    insert_batched,
+    stream_rows,
+    stream_scalars,
+)
 
+from .deltas import save_people_delta_to_database
 
-def save_year_to_database(  # pylint: disable=too-many-locals
-    conn: Connection,
-    year_conn: Connection,
-    year: int,
-    scenario: ForecastScenario,
-    houses_ids: list[int],
-    db_max_age: int = 100,
-) -> None:
-    """Migrate year data from temporary database `year_db` with a data for a single year to a
-    `t_sex_age_social_houses` table at `conn` PostgreSQL database connection.
 
-    It deletes buildings with id in `houses_ids` and inserts data from year_conn.
+DEFAULT_SAVE_CHUNK_SIZE = 5_000
+"""Number of houses of a year saved and committed to the main database in a single transaction."""
+
+DEFAULT_SAVE_ATTEMPTS = 6
+"""Number of consecutive failed attempts to save a chunk of houses after which saving of the year fails."""
+
+DEFAULT_RETRY_DELAY = 2.0
+"""Delay in seconds before the first retry of saving, doubled on each next consecutive failure."""
+
+MAX_RETRY_DELAY = 60.0
+"""Maximal delay in seconds before a retry of saving, so a long database outage is polled at least once a minute."""
+
+
+def get_social_groups_mapping(year_conn: Connection) -> dict[int, int]:
+    """Return mapping of temporary database social groups identifiers to the main database ones (which are stored
+    as temporary social groups names) for social groups with non-zero population.
     """
-    base_population = {f"men_{i}": 0 for i in range(db_max_age + 1)} | {f"women_{i}": 0 for i in range(db_max_age + 1)}
-    social_groups = [
-        (sg_id, int(sg_name))
+    return {
+        sg_id: int(sg_name)
         for sg_id, sg_name in year_conn.execute(
             select(t_social_groups_probabilities.c.id, t_social_groups_probabilities.c.name)
             .select_from(t_population_divided)
@@ -34,50 +57,358 @@ def save_year_to_database(  # pylint: disable=too-many-locals
             )
             .where((t_population_divided.c.men > 0) | (t_population_divided.c.women > 0))
             .distinct()
-            .order_by(t_social_groups_probabilities.c.name)
         )
-    ]
-    conn.execute(
-        delete(t_sex_age_social_houses).where(
-            t_sex_age_social_houses.c.scenario == scenario,
-            t_sex_age_social_houses.c.year == year,
-            t_sex_age_social_houses.c.building_id.in_(houses_ids),
+    }
+
+
+def get_temporary_houses_ids(year_engine: Engine, from_house: int | None = None) -> list[int]:
+    """Return sorted identifiers of the temporary database houses, only not less than `from_house` if it is set."""
+    houses_select = select(t_houses_tmp.c.id.distinct()).order_by(t_houses_tmp.c.id)
+    if from_house is not None:
+        houses_select = houses_select.where(t_houses_tmp.c.id >= from_house)
+    with year_engine.connect() as year_conn:
+        return list(stream_scalars(year_conn, houses_select))
+
+
+def replace_houses_year_rows(  # pylint: disable=too-many-arguments
+    conn: Connection,
+    houses_ids: Iterable[int],
+    year: int,
+    scenario: ForecastScenario | None,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> None:
+    """Delete the given houses rows of the year and scenario before they are saved again.
+
+    If `scenario` is None, the year is to be saved once to the scenario-independent base year table, so the houses
+    rows of the year are deleted from it and from the people distribution table for all of the scenarios (base year
+    could be saved for each scenario by a previous run), as `*_resolved` view would have them twice otherwise.
+    """
+    table = get_sex_age_social_houses_table(layout)
+    base_table = get_base_year_table(layout)
+    for houses_batch in batched(houses_ids, batch_size):
+        if scenario is None:
+            conn.execute(
+                delete(base_table).where(base_table.c.year == year, base_table.c.building_id.in_(houses_batch))
+            )
+        conn.execute(
+            delete(table).where(
+                table.c.year == year,
+                table.c.building_id.in_(houses_batch),
+                *([table.c.scenario == scenario] if scenario is not None else []),
+            )
         )
+
+
+def save_year_to_database(  # pylint: disable=too-many-arguments,too-many-locals
+    conn: Connection,
+    year_conn: Connection,
+    year: int,
+    scenario: ForecastScenario | None,
+    houses_ids: Iterable[int],
+    db_max_age: int = 100,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    insert_batch_size: int = DEFAULT_INSERT_BATCH_SIZE,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    social_groups: dict[int, int] | None = None,
+) -> int:
+    """Migrate year data from temporary database `year_db` with a data for a single year to a
+    `t_sex_age_social_houses` table (or `t_sex_age_social_houses_compact` for `StorageLayout.ARRAYS` layout)
+    at `conn` PostgreSQL database connection.
+
+    It deletes buildings with id in `houses_ids` and inserts their data from year_conn. Both `houses_ids` and year data
+    are processed in batches of `batch_size`, year data is read with a server-side cursor ordered by house and
+    inserted by `insert_batch_size` rows, so memory usage does not depend on the city size. If `scenario` is None,
+    the year is saved once to the base year table of the layout (see `replace_houses_year_rows`). When a year is saved
+    by chunks of houses, social groups mapping (see `get_social_groups_mapping`) should be obtained once and given as
+    `social_groups`, as it takes a full scan of the year.
+
+    Returns number of rows inserted.
+    """
+    table = get_base_year_table(layout) if scenario is None else get_sex_age_social_houses_table(layout)
+    base_population = {f"men_{i}": 0 for i in range(db_max_age + 1)} | {f"women_{i}": 0 for i in range(db_max_age + 1)}
+    houses_ids = set(houses_ids)
+    if len(houses_ids) == 0:
+        return 0
+    if social_groups is None:
+        social_groups = get_social_groups_mapping(year_conn)
+    replace_houses_year_rows(conn, sorted(houses_ids), year, scenario, layout, batch_size)
+    year_filter = (
+        (t_population_divided.c.year == year)
+        & ((t_population_divided.c.men > 0) | (t_population_divided.c.women > 0))
+        & (t_population_divided.c.age <= db_max_age)
+        & t_population_divided.c.house_id.between(min(houses_ids), max(houses_ids))
     )
-    logger.info("Saving data from temporary database to PostgreSQL for year {}", year)
-    for house_id in tqdm(
-        year_conn.execute(select(distinct(t_population_divided.c.house_id)).order_by(t_population_divided.c.house_id))
-        .scalars()
-        .all(),
-        desc=f"{year} Temporary->PostgreSQL",
-        leave=False,
-    ):
-        for (
-            tmp_sg_id,
-            social_group_id,
-        ) in social_groups:
-            house_people = year_conn.execute(
-                select(t_population_divided.c.age, t_population_divided.c.men, t_population_divided.c.women).where(
-                    t_population_divided.c.year == year,
-                    t_population_divided.c.house_id == house_id,
-                    t_population_divided.c.social_group_id == tmp_sg_id,
-                    (t_population_divided.c.men > 0) | (t_population_divided.c.women > 0),
-                    (t_population_divided.c.age <= db_max_age),
-                )
-            ).all()
-            if len(house_people) == 0:
+    people_rows = stream_rows(
+        year_conn,
+        select(
+            t_population_divided.c.house_id,
+            t_population_divided.c.social_group_id,
+            t_population_divided.c.age,
+            t_population_divided.c.men,
+            t_population_divided.c.women,
+        )
+        .where(year_filter)
+        .order_by(t_population_divided.c.house_id, t_population_divided.c.social_group_id),
+        batch_size=batch_size,
+    )
+
+    def house_social_groups_populations() -> Iterable[dict[str, int]]:
+        """Group streamed rows by house and social group and yield insertion parameters for each pair."""
+        for (house_id, tmp_sg_id), house_people in itertools.groupby(people_rows, key=lambda row: row[:2]):
+            if house_id not in houses_ids:
                 continue
+            if layout == StorageLayout.ARRAYS:
+                men_by_age = [0] * (db_max_age + 1)
+                women_by_age = [0] * (db_max_age + 1)
+                for *_, age, men, women in house_people:
+                    men_by_age[age] = men
+                    women_by_age[age] = women
+                house_population = {"men": men_by_age, "women": women_by_age}
+            else:
+                house_population = base_population.copy()
+                for *_, age, men, women in house_people:
+                    house_population[f"men_{age}"] = men
+                    house_population[f"women_{age}"] = women
+            yield {
+                "year": year,
+                **({"scenario": scenario} if scenario is not None else {}),
+                "building_id": house_id,
+                "social_group_id": social_groups[tmp_sg_id],
+                **house_population,
+            }
 
-            house_population = base_population.copy()
-            for age, men, women in house_people:
-                house_population[f"men_{age}"] = men
-                house_population[f"women_{age}"] = women
+    return insert_batched(conn, insert(table), house_social_groups_populations(), insert_batch_size)
+
+
+def save_people_array_to_database(  # pylint: disable=too-many-arguments
+    conn: Connection,
+    people: np.ndarray,
+    houses_ids: list[int],
+    social_groups_ids: list[int],
+    year: int,
+    scenario: ForecastScenario | str | None,
+    db_max_age: int = 100,
+    insert_batch_size: int = DEFAULT_INSERT_BATCH_SIZE,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    table: Table | None = None,
+) -> int:
+    """Save a year people array with shape [<houses>, <social_groups>, 2, <ages>] (for example, of the in-memory
+    population model) to the table of the given storage `layout`, replacing the given houses rows. Another table with
+    `men` and `women` array columns (like `t_sex_age_social_houses_sweeps` for named scenarios) can be set by `table`.
+    If `scenario` is None, the year is saved once to the base year table of the layout.
+
+    Only (house, social group) pairs with people are inserted. Returns number of rows inserted.
+    """
+    if table is None:
+        table = get_base_year_table(layout) if scenario is None else get_sex_age_social_houses_table(layout)
+        replace_houses_year_rows(conn, houses_ids, year, scenario, layout)
+    else:
+        for houses_batch in batched(houses_ids):
             conn.execute(
-                insert(t_sex_age_social_houses).values(
-                    year=year,
-                    scenario=scenario,
-                    building_id=house_id,
-                    social_group_id=social_group_id,
-                    **house_population,
+                delete(table).where(
+                    table.c.scenario == scenario,
+                    table.c.year == year,
+                    table.c.building_id.in_(houses_batch),
                 )
             )
+    arrays = "men" in table.columns
+    people = people[..., : db_max_age + 1]
+    houses_idx, sgs_idx = np.nonzero(people.sum(axis=(2, 3)))
+
+    def house_social_groups_populations() -> Iterable[dict[str, Any]]:
+        """Yield insertion parameters for each (house, social group) pair with people."""
+        for house_idx, sg_idx in zip(houses_idx.tolist(), sgs_idx.tolist()):
+            men, women = people[house_idx, sg_idx].tolist()
+            if arrays:
+                house_population = {"men": men, "women": women}
+            else:
+                house_population = {f"men_{age}": value for age, value in enumerate(men)} | {
+                    f"women_{age}": value for age, value in enumerate(women)
+                }
+            yield {
+                "year": year,
+                **({"scenario": scenario} if scenario is not None else {}),
+                "building_id": houses_ids[house_idx],
+                "social_group_id": social_groups_ids[sg_idx],
+                **house_population,
+            }
+
+    return insert_batched(conn, insert(table), house_social_groups_populations(), insert_batch_size)
+
+
+def get_saved_houses_number(conn: Connection, year: int, scenario_name: str, houses_ids: list[int]) -> int:
+    """Return number of the first `houses_ids` saved by a failed saving of the year by chunks (see `save_in_chunks`),
+    or 0 if there is no saving progress of the year left or it was saved for different houses."""
+    progress = conn.execute(
+        select(
+            t_forecast_saving_progress.c.houses_number,
+            t_forecast_saving_progress.c.first_building_id,
+            t_forecast_saving_progress.c.next_building_id,
+        ).where(t_forecast_saving_progress.c.year == year, t_forecast_saving_progress.c.scenario == scenario_name)
+    ).one_or_none()
+    if progress is None or len(houses_ids) == 0:
+        return 0
+    houses_number, first_building_id, next_building_id = progress
+    if houses_number != len(houses_ids) or first_building_id != houses_ids[0] or next_building_id not in houses_ids:
+        logger.warning("Saving progress of year {} ({}) is left for other houses, ignoring it", year, scenario_name)
+        return 0
+    return houses_ids.index(next_building_id)
+
+
+def _set_saving_progress(conn: Connection, year: int, scenario_name: str, houses_ids: list[int], saved: int) -> None:
+    """Set the number of `houses_ids` saved of the year, deleting the saving progress when all of them are saved."""
+    table = t_forecast_saving_progress
+    if saved >= len(houses_ids):
+        conn.execute(delete(table).where(table.c.year == year, table.c.scenario == scenario_name))
+        return
+    statement = insert(table).values(
+        year=year,
+        scenario=scenario_name,
+        houses_number=len(houses_ids),
+        first_building_id=houses_ids[0],
+        next_building_id=houses_ids[saved],
+    )
+    conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.year, table.c.scenario],
+            set_={
+                "houses_number": statement.excluded.houses_number,
+                "first_building_id": statement.excluded.first_building_id,
+                "next_building_id": statement.excluded.next_building_id,
+                "updated_at": now(),
+            },
+        )
+    )
+
+
+def save_in_chunks(  # pylint: disable=too-many-arguments,too-many-locals
+    engine: Engine,
+    houses_ids: list[int],
+    save_chunk: Callable[[Connection, int, int], int],
+    year: int,
+    scenario: ForecastScenario | str | None,
+    chunk_size: int = DEFAULT_SAVE_CHUNK_SIZE,
+    max_attempts: int = DEFAULT_SAVE_ATTEMPTS,
+    retry_delay: float = DEFAULT_RETRY_DELAY,
+    resume: bool = False,
+) -> int:
+    """Save a year by chunks of `chunk_size` houses calling `save_chunk(conn, begin, end)` for positions range of
+    `houses_ids` and committing after each chunk, so each transaction is short and replacing the chunk houses rows
+    again is safe.
+
+    Number of saved houses is kept in `social_stats.forecast_saving_progress` in the transaction of each chunk (see
+    `get_saved_houses_number`), and if `resume` is set, saving starts after the houses saved by a failed saving of
+    the same houses. On an error the chunk is retried with a new connection from the last committed chunk after
+    an exponentially growing delay (capped by `MAX_RETRY_DELAY`). `ResultsSavingError` with the first not committed
+    house identifier is raised after `max_attempts` consecutive failures. Scenario can be a name of a sweep scenario,
+    None stands for the base year. Returns number of rows inserted.
+    """
+    houses_number = len(houses_ids)
+    scenario_name = scenario.value if isinstance(scenario, ForecastScenario) else (scenario or "base")
+    with engine.begin() as conn:
+        t_forecast_saving_progress.create(conn, checkfirst=True)
+        committed = get_saved_houses_number(conn, year, scenario_name, houses_ids) if resume else 0
+    if committed > 0:
+        logger.info(
+            "Resuming saving of year {} ({}) from house {}, {} of {} houses are saved",
+            year,
+            scenario_name,
+            houses_ids[committed],
+            committed,
+            houses_number,
+        )
+    else:
+        logger.info("Saving year {} ({}) to the main database by chunks of {} houses", year, scenario_name, chunk_size)
+    rows = 0
+    attempt = 0
+    with progress_task("save", houses_number, scenario_name, year) as progress:
+        progress.advance(committed)
+        while committed < houses_number:
+            try:
+                with engine.connect() as conn:
+                    while committed < houses_number:
+                        chunk_end = min(committed + chunk_size, houses_number)
+                        chunk_rows = save_chunk(conn, committed, chunk_end)
+                        _set_saving_progress(conn, year, scenario_name, houses_ids, chunk_end)
+                        conn.commit()
+                        rows += chunk_rows
+                        progress.advance(chunk_end - committed)
+                        committed = chunk_end
+                        attempt = 0
+            except Exception as exc:  # pylint: disable=broad-except
+                attempt += 1
+                if attempt >= max_attempts:
+                    raise ResultsSavingError(
+                        year, scenario_name, committed, houses_number, attempt, houses_ids[committed]
+                    ) from exc
+                delay = min(retry_delay * 2 ** (attempt - 1), MAX_RETRY_DELAY)
+                logger.error(
+                    "Got exception on saving data of year {} ({}): {!r}, {} of {} houses are saved."
+                    " Trying again in {:.0f} seconds (attempt {} of {})",
+                    year,
+                    scenario_name,
+                    exc,
+                    committed,
+                    houses_number,
+                    delay,
+                    attempt + 1,
+                    max_attempts,
+                )
+                time.sleep(delay)
+    return rows
+
+
+def save_people_in_chunks(  # pylint: disable=too-many-arguments
+    engine: Engine,
+    people: np.ndarray,
+    houses_ids: list[int],
+    social_groups_ids: list[int],
+    year: int,
+    scenario: ForecastScenario | None,
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    chunk_size: int = DEFAULT_SAVE_CHUNK_SIZE,
+    max_attempts: int = DEFAULT_SAVE_ATTEMPTS,
+) -> int:
+    """Save a year people array with shape [<houses>, <social_groups>, 2, <ages>] (or its difference with the previous
+    year for the deltas `layout`, see `encode_year_delta`) to the main database by chunks of `chunk_size` houses with
+    up to `max_attempts` consecutive attempts (see `save_in_chunks`). Returns number of rows inserted.
+    """
+
+    def save_chunk(conn: Connection, begin: int, end: int) -> int:
+        if layout == StorageLayout.DELTAS:
+            return save_people_delta_to_database(
+                conn, people[begin:end], houses_ids[begin:end], social_groups_ids, year, scenario
+            )
+        return save_people_array_to_database(
+            conn, people[begin:end], houses_ids[begin:end], social_groups_ids, year, scenario, layout=layout
+        )
+
+    return save_in_chunks(engine, houses_ids, save_chunk, year, scenario, chunk_size, max_attempts)
+
+
+def save_temporary_year_in_chunks(  # pylint: disable=too-many-arguments
+    engine: Engine,
+    year_engine: Engine,
+    year: int,
+    scenario: ForecastScenario | None,
+    houses_ids: list[int],
+    layout: StorageLayout = StorageLayout.COLUMNS,
+    chunk_size: int = DEFAULT_SAVE_CHUNK_SIZE,
+    max_attempts: int = DEFAULT_SAVE_ATTEMPTS,
+    resume: bool = False,
+) -> int:
+    """Save a year from the temporary database to the main database with `save_year_to_database` by chunks of
+    `chunk_size` of the sorted `houses_ids` with up to `max_attempts` consecutive attempts (see `save_in_chunks`),
+    starting after the houses saved by a failed saving of the year if `resume` is set. Returns number of rows inserted.
+    """
+    with year_engine.connect() as year_conn:
+        social_groups = get_social_groups_mapping(year_conn)
+
+    def save_chunk(conn: Connection, begin: int, end: int) -> int:
+        with year_engine.connect() as year_conn:
+            return save_year_to_database(
+                conn, year_conn, year, scenario, houses_ids[begin:end], layout=layout, social_groups=social_groups
+            )
+
+    return save_in_chunks(engine, houses_ids, save_chunk, year, scenario, chunk_size, max_attempts, resume=resume)
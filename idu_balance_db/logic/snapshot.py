@@ -0,0 +1,162 @@
+"""City snapshot files logic is defined here.
+
+Snapshot is a single compressed npz file with columns of the tables the pipeline reads (city territories, buildings,
+social groups and services metadata) limited to a single city, and optionally sex-age-social groups distribution.
+It is loaded to an in-memory SQLite database with the same tables, so the pipeline reads work with it unchanged
+and repeated runs do not query the main database.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy import Connection, Engine, Select, Table, column, insert, select, table
+
+from idu_balance_db import __version__
+from idu_balance_db.benchmarks.synthetic import (
+    create_synthetic_engine,
+    synthetic_metadata,
+    t_synthetic_administrative_units,
+    t_synthetic_buildings,
+    t_synthetic_cities,
+    t_synthetic_city_service_types,
+    t_synthetic_municipalities,
+    t_synthetic_normatives,
+    t_synthetic_physical_objects,
+    t_synthetic_social_groups,
+    t_synthetic_social_groups_city_service_types,
+)
+from idu_balance_db.utils.streaming import batched
+
+
+SNAPSHOT_TABLES: list[Table] = [
+    t_synthetic_cities,
+    t_synthetic_administrative_units,
+    t_synthetic_municipalities,
+    t_synthetic_physical_objects,
+    t_synthetic_buildings,
+    t_synthetic_social_groups,
+    t_synthetic_city_service_types,
+    t_synthetic_normatives,
+    t_synthetic_social_groups_city_service_types,
+]
+"""Tables (with only the columns the pipeline reads) saved to a snapshot, in the order of insertion on load."""
+
+_META_KEY = "__meta__"
+_DISTRIBUTION_PREFIX = "__distribution__/"
+
+
+@dataclass
+class CitySnapshot:
+    """City snapshot loaded to an in-memory database `engine`."""
+
+    city_id: int
+    engine: Engine
+    created_at: str
+    distribution: pd.DataFrame | None = None
+
+
+def _get_city_select(snapshot_table: Table, city_id: int) -> Select:
+    """Return select of the snapshot table columns from the database table of the same name, limited to the given
+    city if the table is city-related."""
+    source = table(
+        snapshot_table.name, *(column(col.name) for col in snapshot_table.columns), schema=snapshot_table.schema
+    )
+    statement = select(*source.columns)
+    if snapshot_table.name == "cities":
+        return statement.where(source.c.id == city_id)
+    if "city_id" in snapshot_table.columns:
+        return statement.where(source.c.city_id == city_id)
+    if snapshot_table.name == "buildings":
+        physical_objects = table("physical_objects", column("id"), column("city_id"))
+        return statement.where(
+            source.c.physical_object_id.in_(select(physical_objects.c.id).where(physical_objects.c.city_id == city_id))
+        )
+    return statement
+
+
+def _to_arrays(name: str, values: list) -> dict[str, np.ndarray]:
+    """Convert column values to a numpy array (strings are stored as unicode arrays, so the file can be loaded without
+    pickle) and a mask of missing values if there are any."""
+    nulls = np.array([value is None for value in values], dtype=bool)
+    values = [getattr(value, "name", value) for value in values]  # enumerations are stored by name
+    if any(isinstance(value, str) for value in values):
+        arrays = {name: np.array(["" if value is None else value for value in values], dtype=str)}
+    else:
+        arrays = {name: np.array([0 if value is None else value for value in values])}
+    if nulls.any():
+        arrays[f"{name}/null"] = nulls
+    return arrays
+
+
+def save_city_snapshot(
+    conn: Connection, city_id: int, path: Path, distribution: pd.DataFrame | None = None
+) -> dict[str, int]:
+    """Save the given city tables (and `distribution` if given) to a compressed snapshot file.
+
+    Returns number of rows saved for each table.
+    """
+    arrays: dict[str, np.ndarray] = {}
+    rows_numbers: dict[str, int] = {}
+    for snapshot_table in SNAPSHOT_TABLES:
+        rows = conn.execute(_get_city_select(snapshot_table, city_id)).all()
+        rows_numbers[snapshot_table.fullname] = len(rows)
+        for idx, col in enumerate(snapshot_table.columns):
+            arrays.update(_to_arrays(f"{snapshot_table.fullname}/{col.name}", [row[idx] for row in rows]))
+        logger.debug("Saving {} rows of {} to snapshot", len(rows), snapshot_table.fullname)
+    if distribution is not None:
+        for name, values in distribution[["social_group", "age", "men", "women"]].items():
+            arrays.update(_to_arrays(f"{_DISTRIBUTION_PREFIX}{name}", values.tolist()))
+    meta = {
+        "city_id": city_id,
+        "created_at": datetime.datetime.now().isoformat(),
+        "version": __version__,
+        "rows": rows_numbers,
+    }
+    arrays[_META_KEY] = np.array(json.dumps(meta))
+    tmp_path = path.with_name(f"{path.name}.tmp.npz")
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return rows_numbers
+
+
+def _from_arrays(data: np.lib.npyio.NpzFile, name: str) -> list:
+    """Restore column values list with missing values saved by `_to_arrays`."""
+    values = data[name].tolist()
+    if f"{name}/null" in data.files:
+        values = [None if is_null else value for value, is_null in zip(values, data[f"{name}/null"])]
+    return values
+
+
+def load_city_snapshot(path: Path) -> CitySnapshot:
+    """Load the snapshot file to an in-memory SQLite database."""
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data[_META_KEY]))
+        engine = create_synthetic_engine("sqlite://")
+        synthetic_metadata.create_all(engine)
+        with engine.connect() as conn:
+            for snapshot_table in SNAPSHOT_TABLES:
+                columns = {
+                    col.name: _from_arrays(data, f"{snapshot_table.fullname}/{col.name}")
+                    for col in snapshot_table.columns
+                }
+                rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+                for batch in batched(rows):
+                    conn.execute(insert(snapshot_table), batch)
+            conn.commit()
+        distribution = None
+        if f"{_DISTRIBUTION_PREFIX}social_group" in data.files:
+            distribution = pd.DataFrame(
+                {
+                    name: _from_arrays(data, f"{_DISTRIBUTION_PREFIX}{name}")
+                    for name in ("social_group", "age", "men", "women")
+                }
+            )
+    logger.info("Loaded city id={} snapshot created at {}", meta["city_id"], meta["created_at"])
+    return CitySnapshot(meta["city_id"], engine, meta["created_at"], distribution)
@@ -1,8 +1,11 @@
 """Social groups related methods are defined here."""
+from dataclasses import dataclass
+from functools import cached_property
 from typing import BinaryIO, Callable
-from loguru import logger
 
+import numpy as np
 import pandas as pd
+from loguru import logger
 from population_restorator.models import SocialGroupsDistribution, SocialGroupWithProbability
 from sqlalchemy import Connection, select
 
@@ -15,13 +18,77 @@ from idu_balance_db.db.entities import t_social_groups
 DEFAULT_MAX_AGE = 100
 
 
-def get_social_groups_distribution_from_db_and_excel(  # pylint: disable=too-many-locals
+@dataclass
+class PrecomputedSocialGroupsDistribution(SocialGroupsDistribution):
+    """Social groups distribution with probability arrays and cumulative arrays for the vectorized sampling
+    (`np.searchsorted` of uniform values) computed once on the first access instead of on each sampler call.
+
+    Social groups must not be changed after the first access.
+    """
+
+    @cached_property
+    def primary_probabilities(self) -> np.ndarray:
+        """Read-only non-crossing social groups probability array with shape [<social_groups>, 2, <ages>]."""
+        return _read_only(super().primary_as_probability_array())
+
+    @cached_property
+    def additional_probabilities(self) -> np.ndarray:
+        """Read-only additional social groups probability array with shape [2, <ages>, <social_groups>]."""
+        return _read_only(super().additonals_as_probability_array())
+
+    @cached_property
+    def primary_cumulative(self) -> np.ndarray:
+        """Cumulative probabilities of the flattened non-crossing social groups probability array, last one is 1."""
+        cumulative = np.cumsum(self.primary_probabilities.ravel())
+        cumulative[-1] = 1.0
+        return _read_only(cumulative)
+
+    @cached_property
+    def additional_eligible(self) -> np.ndarray:
+        """Boolean array with shape [2, <ages>] showing whether a person of the given sex and age can be a member
+        of any additional social group."""
+        if len(self.additional) == 0:
+            return _read_only(np.zeros(self.primary_probabilities.shape[1:], dtype=bool))
+        return _read_only(self.additional_probabilities.sum(axis=2) > 0)
+
+    @cached_property
+    def additional_cumulative(self) -> np.ndarray:
+        """Cumulative probabilities of the additional social groups for each sex and age with shape
+        [2, <ages>, <social_groups>], last one of each eligible sex and age is 1."""
+        if len(self.additional) == 0:
+            return _read_only(np.zeros((*self.primary_probabilities.shape[1:], 0)))
+        cumulative = np.cumsum(self.additional_probabilities, axis=2)
+        cumulative[..., -1] = np.where(self.additional_eligible, 1.0, 0.0)
+        return _read_only(cumulative)
+
+    def primary_as_probability_array(self) -> np.ndarray:
+        return self.primary_probabilities
+
+    def additonals_as_probability_array(self) -> np.ndarray:
+        return self.additional_probabilities
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    """Mark array as read-only, so the cached arrays could not be changed by a caller by mistake."""
+    array.setflags(write=False)
+    return array
+
+
+def get_social_groups_distribution_from_db_and_excel(
     conn: Connection, excel_file: str | BinaryIO, max_age: int = DEFAULT_MAX_AGE
-) -> SocialGroupsDistribution:
+) -> PrecomputedSocialGroupsDistribution:
     """Form a social groups distribution using excel file with distribution exported by export_social_distribution.py"""
-    distribution: pd.DataFrame = pd.read_excel(excel_file, sheet_name="distribution")[
-        ["social_group", "age", "men", "women"]
-    ]
+    distribution: pd.DataFrame = pd.read_excel(excel_file, sheet_name="distribution")
+    return get_social_groups_distribution_from_db_and_dataframe(conn, distribution, max_age)
+
+
+def get_social_groups_distribution_from_db_and_dataframe(  # pylint: disable=too-many-locals
+    conn: Connection, distribution: pd.DataFrame, max_age: int = DEFAULT_MAX_AGE
+) -> PrecomputedSocialGroupsDistribution:
+    """Form a social groups distribution using DataFrame with columns `social_group` (name), `age`, `men`
+    and `women` in format of 'distribution' sheet of the file exported by export_social_distribution.py.
+    """
+    distribution = distribution[["social_group", "age", "men", "women"]].copy()
 
     names_ids_mapping: dict[str, int] = dict(conn.execute(select(t_social_groups.c.name, t_social_groups.c.id)).all())
     try:
@@ -70,4 +137,4 @@ def get_social_groups_distribution_from_db_and_excel(  # pylint: disable=too-man
             )
         )
 
-    return SocialGroupsDistribution(primaries, additionals)
+    return PrecomputedSocialGroupsDistribution(primaries, additionals)
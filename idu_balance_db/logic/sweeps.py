@@ -0,0 +1,110 @@
+"""Scenarios sweeps (sensitivity analysis over survivability and fertility multipliers) are defined here.
+
+Sweep scenarios are forecasted by the in-memory model from the same start year people array in batches, where each
+batch is advanced as a single array with an additional scenarios dimension. As `ForecastScenario` enumeration has only
+the default scenarios, results are saved to `social_stats.sex_age_social_houses_sweeps` under scenarios names.
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from population_restorator.models import SocialGroupsDistribution, SurvivabilityCoefficients
+from sqlalchemy import Connection, Engine, delete
+
+from idu_balance_db.db.entities.social_stats import t_sex_age_social_houses_sweeps
+from idu_balance_db.utils.streaming import batched
+
+from .in_memory import (
+    DEFAULT_BASE_FERTILITY,
+    DEFAULT_SCENARIOS_BATCH_SIZE,
+    ScenarioParameters,
+    divide_population,
+    forecast_scenarios,
+)
+from .saving import DEFAULT_SAVE_ATTEMPTS, DEFAULT_SAVE_CHUNK_SIZE, save_in_chunks, save_people_array_to_database
+
+
+def run_scenarios_sweep_to_db(  # pylint: disable=too-many-arguments,too-many-locals
+    engine: Engine,
+    houses: pd.DataFrame,
+    social_groups: SocialGroupsDistribution,
+    survivability_coefficients: SurvivabilityCoefficients | None,
+    year_begin: int,
+    years: int,
+    scenarios: Iterable[ScenarioParameters],
+    start: np.ndarray | None = None,
+    base_fertility: float = DEFAULT_BASE_FERTILITY,
+    batch_size: int = DEFAULT_SCENARIOS_BATCH_SIZE,
+    rng: np.random.Generator | None = None,
+    save_chunk_size: int = DEFAULT_SAVE_CHUNK_SIZE,
+    save_attempts: int = DEFAULT_SAVE_ATTEMPTS,
+) -> int:
+    """Forecast balanced `houses` (indexed by id) population for each of the sweep `scenarios` and replace their
+    results (including the start year) in `social_stats.sex_age_social_houses_sweeps`.
+
+    `start` people array with shape [<houses>, <social_groups>, 2, <ages>] is reused if given (for example, the one
+    saved for the default scenarios), otherwise houses population is divided. Each scenario year is saved by chunks
+    of `save_chunk_size` houses with up to `save_attempts` consecutive attempts (see `save_in_chunks`).
+
+    Returns number of rows inserted.
+    """
+    scenarios = list(scenarios)
+    houses_ids = houses.index.to_list()
+    social_groups_ids = [int(name) for name in social_groups.get_combined_names()]
+    if start is None:
+        start = divide_population(houses, social_groups, rng)
+
+    with engine.begin() as conn:
+        _delete_sweep_scenarios(conn, scenarios, houses_ids)
+
+    def save(scenario: ScenarioParameters, year: int, people: np.ndarray) -> int:
+        def save_chunk(conn: Connection, begin: int, end: int) -> int:
+            return save_people_array_to_database(
+                conn,
+                people[begin:end],
+                houses_ids[begin:end],
+                social_groups_ids,
+                year_begin + year,
+                scenario.name,
+                table=t_sex_age_social_houses_sweeps,
+            )
+
+        return save_in_chunks(
+            engine, houses_ids, save_chunk, year_begin + year, scenario.name, save_chunk_size, save_attempts
+        )
+
+    rows = sum(save(scenario, 0, start) for scenario in scenarios)
+    if years == 0:
+        return rows
+    if survivability_coefficients is None:
+        raise ValueError("Survivability coefficients are required to forecast population")
+    logger.info("Forecasting {} sweep scenarios in batches of {}", len(scenarios), batch_size)
+    for scenario, year, people in forecast_scenarios(
+        start,
+        houses["living_area"].to_numpy(),
+        social_groups,
+        survivability_coefficients,
+        years,
+        scenarios,
+        base_fertility,
+        rng,
+        batch_size,
+    ):
+        rows += save(scenario, year, people)
+    return rows
+
+
+def _delete_sweep_scenarios(conn: Connection, scenarios: list[ScenarioParameters], houses_ids: list[int]) -> None:
+    """Delete all of the years of the given houses of the sweep scenarios left by a previous run."""
+    t_sex_age_social_houses_sweeps.create(conn, checkfirst=True)
+    for scenario in scenarios:
+        for houses_batch in batched(houses_ids):
+            conn.execute(
+                delete(t_sex_age_social_houses_sweeps).where(
+                    t_sex_age_social_houses_sweeps.c.scenario == scenario.name,
+                    t_sex_age_social_houses_sweeps.c.building_id.in_(houses_batch),
+                )
+            )
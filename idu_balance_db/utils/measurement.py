@@ -0,0 +1,228 @@
+"""Stages resources measurement (wall and CPU time, peak memory, rows processed, database round-trips)
+is defined here.
+"""
+from __future__ import annotations
+
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Iterator
+
+from sqlalchemy import Engine, event
+
+from idu_balance_db.utils.profiling import set_profiling_stage
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_DML_PREFIXES = ("INSERT", "UPDATE", "DELETE")
+
+
+@dataclass
+class DatabaseCounters:
+    """Number of statements executed by all of the SQLAlchemy engines of the current process and rows affected.
+
+    `rows_read` is based on the driver-reported rowcount of a SELECT statement, so it is only available for the
+    drivers reporting it (i.e. psycopg2 with client-side cursors), and is 0 for others.
+    """
+
+    round_trips: int = 0
+    rows_read: int = 0
+    rows_written: int = 0
+
+    def copy(self) -> "DatabaseCounters":
+        """Return a snapshot of the counters."""
+        return DatabaseCounters(self.round_trips, self.rows_read, self.rows_written)
+
+
+database_counters = DatabaseCounters()
+"""Process-wide database counters, updated only after `enable_database_counters` is called."""
+
+
+def _count_cursor_execute(  # pylint: disable=too-many-arguments
+    _conn, cursor, statement: str, parameters, _context, executemany: bool
+) -> None:
+    """Update process-wide database counters after a statement execution."""
+    database_counters.round_trips += 1
+    rowcount = cursor.rowcount if cursor.rowcount is not None else -1
+    if statement.lstrip()[:6].upper() in _DML_PREFIXES:
+        if rowcount < 0:
+            rowcount = len(parameters) if executemany else 1
+        database_counters.rows_written += rowcount
+    elif rowcount > 0:
+        database_counters.rows_read += rowcount
+
+
+def enable_database_counters() -> None:
+    """Start counting statements executed by all of the engines of the current process."""
+    if not event.contains(Engine, "after_cursor_execute", _count_cursor_execute):
+        event.listen(Engine, "after_cursor_execute", _count_cursor_execute)
+
+
+def get_children_cpu_time() -> float:
+    """Return CPU time of the terminated and waited for child processes (i.e. forecasting workers)."""
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def get_current_rss() -> int:
+    """Return current resident set size of the process in bytes.
+
+    `/proc/self/statm` is used when available, otherwise the maximum RSS of the process is returned.
+    """
+    try:
+        with open("/proc/self/statm", "r", encoding="utf-8") as file:
+            return int(file.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return get_max_rss()
+
+
+def get_max_rss() -> int:
+    """Return maximum resident set size of the process during all of its lifetime in bytes."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if os.uname().sysname == "Darwin" else max_rss * 1024
+
+
+@dataclass
+class StageMeasurement:  # pylint: disable=too-many-instance-attributes
+    """Resources used by a single stage of the pipeline.
+
+    `labels` contain additional stage identification (e.g. year and scenario), `rows` is the number of
+    entities (buildings, rows of the table, etc.) processed by the stage and is set by the stage itself.
+    `process` is a role of the process stage was executed in ("main", "saver").
+    """
+
+    stage: str
+    labels: dict[str, Any] = field(default_factory=dict)
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    children_cpu_time: float = 0.0
+    peak_rss: int = 0
+    rss_before: int = 0
+    rows: int = 0
+    rows_read: int = 0
+    rows_written: int = 0
+    db_round_trips: int = 0
+    process: str = "main"
+    pid: int = 0
+    started_at: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float | None:
+        """Stage throughput, None if rows count is not set or the stage took no time."""
+        if self.rows == 0 or self.wall_time == 0:
+            return None
+        return self.rows / self.wall_time
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return measurement as a JSON-serializable dictionary."""
+        return asdict(self) | {"rows_per_second": self.rows_per_second}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "StageMeasurement":
+        """Construct measurement from a dictionary produced by `to_dict`, unknown keys are ignored."""
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+
+class _RssSampler(threading.Thread):
+    """Daemon thread which samples current RSS of the process with a given interval and keeps the maximum value."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.peak = get_current_rss()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            rss = get_current_rss()
+            with self._lock:
+                self.peak = max(self.peak, rss)
+
+    def reset(self) -> int:
+        """Reset the peak value to the current RSS and return the previous peak."""
+        rss = get_current_rss()
+        with self._lock:
+            peak, self.peak = max(self.peak, rss), rss
+        return peak
+
+    def stop(self) -> None:
+        """Stop the sampling thread."""
+        self._stopped.set()
+
+
+class StagesMeasurer:  # pylint: disable=too-many-instance-attributes
+    """Measure time, memory and database usage of the sequential pipeline stages in a current process.
+
+    Peak memory is measured by a sampling thread with `sample_interval` seconds period, so very short memory
+    spikes can be missed. Measurer should be created in the process which is measured (after fork).
+    """
+
+    def __init__(self, process: str = "main", sample_interval: float = 0.01):
+        self.process = process
+        self.measurements: list[StageMeasurement] = []
+        self._sampler = _RssSampler(sample_interval)
+        self._sampler.start()
+        self._current: StageMeasurement | None = None
+        self._wall_start = 0.0
+        self._cpu_start = 0.0
+        self._children_cpu_start = 0.0
+        self._db_start = DatabaseCounters()
+        enable_database_counters()
+        set_profiling_stage(process, None)
+
+    def start(self, stage: str, **labels: Any) -> StageMeasurement:
+        """Start measuring of a stage (previously started stage is finished)."""
+        if self._current is not None:
+            self.finish()
+        self._sampler.reset()
+        self._current = StageMeasurement(
+            stage, labels, rss_before=get_current_rss(), process=self.process, pid=os.getpid(), started_at=time.time()
+        )
+        self._db_start = database_counters.copy()
+        self._children_cpu_start = get_children_cpu_time()
+        set_profiling_stage(self.process, stage, labels)
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self._current
+
+    def finish(self) -> StageMeasurement | None:
+        """Finish measuring of the current stage and return its measurement."""
+        measurement, self._current = self._current, None
+        if measurement is None:
+            return None
+        set_profiling_stage(self.process, None)
+        measurement.wall_time = time.perf_counter() - self._wall_start
+        measurement.cpu_time = time.process_time() - self._cpu_start
+        measurement.children_cpu_time = get_children_cpu_time() - self._children_cpu_start
+        measurement.peak_rss = self._sampler.reset()
+        measurement.db_round_trips = database_counters.round_trips - self._db_start.round_trips
+        measurement.rows_read = database_counters.rows_read - self._db_start.rows_read
+        measurement.rows_written = database_counters.rows_written - self._db_start.rows_written
+        self.measurements.append(measurement)
+        return measurement
+
+    def cancel(self) -> None:
+        """Stop measuring of the current stage without saving its measurement."""
+        self._current = None
+        set_profiling_stage(self.process, None)
+
+    @contextmanager
+    def stage(self, stage: str, **labels: Any) -> Iterator[StageMeasurement]:
+        """Measure the stage executed inside of the context manager."""
+        measurement = self.start(stage, **labels)
+        try:
+            yield measurement
+        finally:
+            if self._current is measurement:
+                self.finish()
+
+    def close(self) -> None:
+        """Finish the current stage and stop memory sampling."""
+        self.finish()
+        self._sampler.stop()
@@ -0,0 +1,83 @@
+"""LRU cache limited by the total memory size of its values is defined here."""
+from __future__ import annotations
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Iterator, TypeVar
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def get_nbytes(value: object) -> int:
+    """Return memory size of the value: `nbytes` attribute if it is present (numpy arrays, results containers)
+    or `sys.getsizeof` otherwise."""
+    nbytes = getattr(value, "nbytes", None)
+    return int(nbytes) if nbytes is not None else sys.getsizeof(value)
+
+
+class MemoryLRUCache(Generic[K, V]):
+    """Thread-safe LRU cache evicting least recently used values when their total size exceeds `max_bytes`.
+
+    Values larger than `max_bytes` are not cached at all.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[V], int] = get_nbytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._sizeof = sizeof
+        self._values: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> V | None:
+        """Return cached value marking it as recently used, or None if it is missing."""
+        with self._lock:
+            if key not in self._values:
+                self.misses += 1
+                return None
+            self._values.move_to_end(key)
+            self.hits += 1
+            return self._values[key][0]
+
+    def put(self, key: K, value: V) -> None:
+        """Cache the value evicting the least recently used ones if needed."""
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._values:
+                self.current_bytes -= self._values.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            while self.current_bytes + size > self.max_bytes:
+                self.current_bytes -= self._values.popitem(last=False)[1][1]
+            self._values[key] = (value, size)
+            self.current_bytes += size
+
+    def pop(self, key: K) -> V | None:
+        """Remove value from the cache and return it (None if it is missing)."""
+        with self._lock:
+            if key not in self._values:
+                return None
+            value, size = self._values.pop(key)
+            self.current_bytes -= size
+            return value
+
+    def keys(self) -> Iterator[K]:
+        """Return snapshot of cached keys from the least to the most recently used."""
+        with self._lock:
+            return iter(list(self._values))
+
+    def clear(self) -> None:
+        """Remove all of the cached values."""
+        with self._lock:
+            self._values.clear()
+            self.current_bytes = 0
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
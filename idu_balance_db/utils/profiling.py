@@ -0,0 +1,155 @@
+"""Low-overhead sampling profiler working in the main process and all of its forked children is defined here.
+
+Profiler is driven by `SIGPROF` timer signal (so only CPU time is sampled) and records the stack of the main thread of
+each process. Samples are grouped by the process role and the pipeline stage (with its labels) active at the time and
+written in a collapsed stacks format (`frame;frame;frame count`), which is accepted by flamegraph.pl, speedscope
+and similar tools.
+
+Child processes are profiled only when started with the "fork" start method: profiling timer is restarted in a child
+after the fork, and samples are written on the process exit (or termination by `SIGTERM`, as `multiprocessing.Pool`
+workers are stopped).
+"""
+from __future__ import annotations
+
+import os
+import re
+import signal
+from collections import Counter
+from multiprocessing import util as mp_util
+from pathlib import Path
+from types import FrameType
+from typing import Any
+
+from loguru import logger
+
+
+DEFAULT_INTERVAL = 0.005
+"""Default sampling interval in seconds of CPU time."""
+
+_MAX_DEPTH = 256
+
+
+def _format_frame(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _get_label_suffix(labels: dict[str, Any]) -> str:
+    """Return labels as a file name-safe string suffix."""
+    return "".join(f".{name}-{re.sub(r'[^A-Za-z0-9_+-]', '_', str(value))}" for name, value in labels.items())
+
+
+class SamplingProfiler:
+    """Sampling profiler writing collapsed stacks of the process to the `output_dir` grouped by a stage.
+
+    Only one profiler can be active in a process as the signal handler and the timer are process-wide.
+    """
+
+    def __init__(self, output_dir: Path, interval: float = DEFAULT_INTERVAL, process: str = "main"):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.process = process
+        self.stage: str | None = None
+        self.labels: dict[str, Any] = {}
+        self.samples: dict[tuple[str, str | None, tuple[tuple[str, Any], ...]], Counter[str]] = {}
+        self._running = False
+
+    def set_stage(self, process: str, stage: str | None, labels: dict[str, Any]) -> None:
+        """Set process role and the current stage, samples will be grouped by them."""
+        self.process = process
+        self.stage = stage
+        self.labels = dict(labels)
+
+    def start(self) -> None:
+        """Start sampling the current process."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self._running = True
+        mp_util.register_after_fork(self, SamplingProfiler._after_fork)
+
+    def stop(self) -> None:
+        """Stop sampling the current process. Collected samples are kept until `dump` is called."""
+        if not self._running:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_IGN)
+        self._running = False
+
+    def dump(self) -> list[Path]:
+        """Write collected samples of the process to the output directory (a file for each stage) and clear them.
+
+        Files are named `<process>.<stage>[.<label>-<value>...].<pid>.collapsed`.
+        """
+        paths = []
+        samples, self.samples = self.samples, {}
+        for (process, stage, labels), stacks in samples.items():
+            path = self.output_dir / (
+                f"{process}.{stage or 'idle'}{_get_label_suffix(dict(labels))}.{os.getpid()}.collapsed"
+            )
+            with path.open("w", encoding="utf-8") as file:
+                for stack, count in stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+            paths.append(path)
+        return paths
+
+    def _sample(self, _signum: int, frame: FrameType | None) -> None:
+        """SIGPROF handler, records the stack of the interrupted frame."""
+        frames = []
+        while frame is not None and len(frames) < _MAX_DEPTH:
+            frames.append(_format_frame(frame))
+            frame = frame.f_back
+        key = (self.process, self.stage, tuple(self.labels.items()))
+        self.samples.setdefault(key, Counter())[";".join(reversed(frames))] += 1
+
+    def _after_fork(self) -> None:
+        """Restart profiling in a forked child process (interval timers are not inherited on fork)."""
+        if not self._running:
+            return
+        self.samples = {}
+        self.process = "worker"
+        self._running = False
+        self.start()
+        mp_util.Finalize(self, self._finish, exitpriority=100)
+        signal.signal(signal.SIGTERM, self._finish_on_sigterm)
+
+    def _finish(self) -> None:
+        self.stop()
+        self.dump()
+
+    def _finish_on_sigterm(self, signum: int, _frame: FrameType | None) -> None:
+        """Write samples of the terminated child process and terminate it the default way."""
+        self._finish()
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+
+_profiler: SamplingProfiler | None = None
+
+
+def start_profiling(output_dir: Path, interval: float = DEFAULT_INTERVAL) -> SamplingProfiler:
+    """Start sampling profiler in the current process and its children forked later."""
+    global _profiler  # pylint: disable=global-statement
+    if _profiler is not None:
+        _profiler.stop()
+    _profiler = SamplingProfiler(output_dir, interval)
+    _profiler.start()
+    logger.info("Sampling profiler is started, collapsed stacks will be written to {}", output_dir)
+    return _profiler
+
+
+def stop_profiling() -> list[Path]:
+    """Stop profiler of the current process and write its samples, return the list of files written."""
+    global _profiler  # pylint: disable=global-statement
+    if _profiler is None:
+        return []
+    profiler, _profiler = _profiler, None
+    profiler.stop()
+    return profiler.dump()
+
+
+def set_profiling_stage(process: str, stage: str | None, labels: dict[str, Any] | None = None) -> None:
+    """Set process role and the current stage of the active profiler, does nothing if profiling is not enabled."""
+    if _profiler is not None:
+        _profiler.set_stage(process, stage, labels or {})
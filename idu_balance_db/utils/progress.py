@@ -0,0 +1,271 @@
+"""Cross-process progress events channel and its renderers are defined here.
+
+Stages of any process post `ProgressEvent`s with `report_progress`, `progress_task` or `track`. Events are sent
+to the queue set by `set_progress_queue` (children started with "fork" method inherit it), and `ProgressMonitor`
+in the main process renders them as a single consolidated display or as JSON lines. If no queue is set, reporting
+does nothing. Log lines written to `console_stream` are printed through the console of the display while it is
+shown, so they do not tear it.
+"""
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import os
+import queue as queue_module
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from typing import Any, Iterable, Iterator, TypeVar
+
+from rich.console import Console
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn, TimeElapsedColumn, TimeRemainingColumn
+from rich.text import Text
+
+
+T = TypeVar("T")
+
+MIN_EVENTS_INTERVAL = 0.5
+"""Minimal interval in seconds between intermediate events of the same task sent by a process."""
+
+
+class ProgressMode(str, Enum):
+    """Progress rendering mode."""
+
+    RICH = "rich"
+    JSON = "json"
+    NONE = "none"
+
+
+@dataclass
+class ProgressEvent:  # pylint: disable=too-many-instance-attributes
+    """Progress of a single task: `done` of `total` (None if unknown) entities of a `stage` are processed."""
+
+    stage: str
+    done: int
+    total: int | None
+    scenario: str | None = None
+    year: int | None = None
+    process: str = "main"
+    pid: int = field(default_factory=os.getpid)
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def key(self) -> tuple[Any, ...]:
+        """Identifier of a task the event belongs to."""
+        return (self.pid, self.stage, self.scenario, self.year)
+
+    @property
+    def finished(self) -> bool:
+        """Indicates whether the task is finished."""
+        return self.total is not None and self.done >= self.total
+
+    @property
+    def description(self) -> str:
+        """Human-readable task description."""
+        labels = ", ".join(str(label) for label in (self.scenario, self.year) if label is not None)
+        return f"{self.process}: {self.stage}" + (f" ({labels})" if labels else "")
+
+
+_queue: mp.Queue | None = None
+_process_role: str = "main"
+_last_sent: dict[tuple[Any, ...], float] = {}
+_live_console: Console | None = None
+
+
+def set_progress_queue(queue: mp.Queue | None) -> None:
+    """Set queue to send progress events of the current process to."""
+    global _queue  # pylint: disable=global-statement
+    _queue = queue
+
+
+def set_progress_process(process: str) -> None:
+    """Set role name of the current process ("main", "saver") to be sent with progress events."""
+    global _process_role  # pylint: disable=global-statement
+    _process_role = process
+
+
+def report_progress(  # pylint: disable=too-many-arguments
+    stage: str, done: int, total: int | None, scenario: str | None = None, year: int | None = None, force: bool = False
+) -> None:
+    """Send progress event to the channel. Intermediate events of the same task are throttled to be sent not more
+    often than `MIN_EVENTS_INTERVAL`, first, last and forced events are always sent.
+    """
+    if _queue is None:
+        return
+    event = ProgressEvent(stage, done, total, scenario, year, _process_role)
+    now = time.monotonic()
+    if not force and done != 0 and not event.finished and now - _last_sent.get(event.key, 0) < MIN_EVENTS_INTERVAL:
+        return
+    _last_sent[event.key] = now
+    if event.finished:
+        _last_sent.pop(event.key, None)
+    try:
+        _queue.put_nowait(event)
+    except (ValueError, OSError):  # queue is closed
+        pass
+
+
+class ProgressTask:
+    """Progress of a single task, sending events as it is advanced."""
+
+    def __init__(self, stage: str, total: int | None, scenario: str | None = None, year: int | None = None):
+        self.stage = stage
+        self.total = total
+        self.scenario = scenario
+        self.year = year
+        self.done = 0
+        report_progress(stage, 0, total, scenario, year)
+
+    def advance(self, count: int = 1) -> None:
+        """Mark `count` more entities as processed."""
+        self.done += count
+        report_progress(self.stage, self.done, self.total, self.scenario, self.year)
+
+    def finish(self) -> None:
+        """Mark task as finished (total is set to the number of processed entities)."""
+        if self.total == self.done:  # finishing event is already sent
+            return
+        self.total = self.done
+        report_progress(self.stage, self.done, self.total, self.scenario, self.year, force=True)
+
+
+@contextmanager
+def progress_task(
+    stage: str, total: int | None, scenario: str | None = None, year: int | None = None
+) -> Iterator[ProgressTask]:
+    """Track progress of a task executed inside of the context manager, it is finished on exit."""
+    task = ProgressTask(stage, total, scenario, year)
+    try:
+        yield task
+    finally:
+        task.finish()
+
+
+def track(
+    iterable: Iterable[T],
+    stage: str,
+    total: int | None = None,
+    scenario: str | None = None,
+    year: int | None = None,
+) -> Iterator[T]:
+    """Iterate over the `iterable` reporting progress of each element (tqdm replacement)."""
+    if total is None and hasattr(iterable, "__len__"):
+        total = len(iterable)  # type: ignore
+    with progress_task(stage, total, scenario, year) as task:
+        for item in iterable:
+            yield item
+            task.advance()
+
+
+def _set_live_console(console: Console | None) -> None:
+    """Set console of the shown rich progress display for `console_stream` to print through."""
+    global _live_console  # pylint: disable=global-statement
+    _live_console = console
+
+
+class ConsoleStream:
+    """Text stream writing to stderr, or printing through the console of the rich progress display while it is shown
+    (text above the display is kept and the display is redrawn below it). It is meant to be a loguru sink, which then
+    colorizes messages if stderr is a terminal."""
+
+    def write(self, message: str) -> None:
+        """Write message to stderr or print it above the progress display."""
+        console = _live_console
+        if console is None:
+            sys.stderr.write(message)
+        else:
+            console.print(Text.from_ansi(message.rstrip("\n")), soft_wrap=True)
+
+    def flush(self) -> None:
+        """Flush stderr."""
+        if _live_console is None:
+            sys.stderr.flush()
+
+    def isatty(self) -> bool:
+        """Indicates whether stderr is a terminal."""
+        return sys.stderr.isatty()
+
+
+console_stream = ConsoleStream()
+"""Stream to write log messages of the main process to instead of `sys.stderr`."""
+
+
+class ProgressMonitor:
+    """Main process progress events receiver rendering them in the given mode in a background thread.
+
+    Queue is set as a progress queue of the current process on start, so it should be started before any child
+    process which is going to report its progress.
+    """
+
+    def __init__(self, mode: ProgressMode = ProgressMode.RICH):
+        self.mode = mode
+        self.queue: mp.Queue = mp.Queue()
+        self._thread = threading.Thread(target=self._run, name="progress-monitor", daemon=True)
+        self._progress: Progress | None = None
+        self._tasks: dict[tuple[Any, ...], Any] = {}
+
+    def start(self) -> "ProgressMonitor":
+        """Set the queue as the current process progress channel and start rendering events."""
+        if self.mode == ProgressMode.NONE:
+            return self
+        if self.mode == ProgressMode.RICH:
+            self._progress = Progress(
+                TextColumn("{task.description}"),
+                BarColumn(),
+                MofNCompleteColumn(),
+                TimeElapsedColumn(),
+                TextColumn("ETA"),
+                TimeRemainingColumn(),
+                console=Console(stderr=True),
+                transient=True,
+            )
+            self._progress.start()
+            _set_live_console(self._progress.console)
+        set_progress_queue(self.queue)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Render the remaining events and stop."""
+        if self.mode == ProgressMode.NONE:
+            return
+        set_progress_queue(None)
+        self.queue.put(None)
+        self._thread.join()
+        if self._progress is not None:
+            _set_live_console(None)
+            self._progress.stop()
+
+    def __enter__(self) -> "ProgressMonitor":
+        return self.start()
+
+    def __exit__(self, *_exc_info) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                event = self.queue.get(timeout=1)
+            except queue_module.Empty:
+                continue
+            if event is None:
+                break
+            if self.mode == ProgressMode.JSON:
+                sys.stdout.write(json.dumps(asdict(event) | {"finished": event.finished}) + "\n")
+                sys.stdout.flush()
+            else:
+                self._render(event)
+
+    def _render(self, event: ProgressEvent) -> None:
+        """Update or add rich progress task, finished tasks are removed from the display."""
+        task_id = self._tasks.get(event.key)
+        if task_id is None:
+            if event.finished:
+                return
+            task_id = self._tasks[event.key] = self._progress.add_task(event.description, total=event.total)
+        self._progress.update(task_id, completed=event.done, total=event.total)
+        if event.finished:
+            self._progress.remove_task(self._tasks.pop(event.key))
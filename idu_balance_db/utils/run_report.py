@@ -0,0 +1,137 @@
+"""Structured run report of a balance-db launch (JSON and Prometheus textfile formats) is defined here."""
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from idu_balance_db.utils.measurement import StageMeasurement
+
+
+PROMETHEUS_METRICS: list[tuple[str, str, str]] = [
+    ("wall_time", "idu_balance_db_stage_wall_seconds", "Stage wall time in seconds"),
+    ("cpu_time", "idu_balance_db_stage_cpu_seconds", "Stage CPU time of the process in seconds"),
+    (
+        "children_cpu_time",
+        "idu_balance_db_stage_children_cpu_seconds",
+        "Stage CPU time of the finished child processes (forecasting workers) in seconds",
+    ),
+    ("peak_rss", "idu_balance_db_stage_peak_rss_bytes", "Stage peak resident set size of the process in bytes"),
+    ("rows", "idu_balance_db_stage_rows", "Number of entities processed by the stage"),
+    ("rows_read", "idu_balance_db_stage_rows_read", "Number of rows read from the databases as reported by driver"),
+    ("rows_written", "idu_balance_db_stage_rows_written", "Number of rows inserted, updated or deleted"),
+    ("db_round_trips", "idu_balance_db_stage_db_round_trips", "Number of statements sent to the databases"),
+]
+"""Stage measurement attribute, Prometheus metric name and its help text."""
+
+
+@dataclass
+class RunReport:
+    """Report of a single run: its parameters, measurements of all stages of main and saver processes and results of
+    the consistency audit (`AuditReport.to_dict()`) if it was performed."""
+
+    parameters: dict[str, Any]
+    started_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    stages: list[StageMeasurement] = field(default_factory=list)
+    audit: dict[str, Any] | None = None
+
+    def add_stages(self, stages: list[StageMeasurement]) -> None:
+        """Add stages measurements keeping them sorted by start time."""
+        self.stages.extend(stages)
+        self.stages.sort(key=lambda stage: stage.started_at)
+
+    def get_totals(self) -> dict[str, dict[str, float]]:
+        """Return measurements summed by (process, stage) (peak RSS is the maximum)."""
+        totals: dict[str, dict[str, float]] = {}
+        for stage in self.stages:
+            total = totals.setdefault(f"{stage.process}:{stage.stage}", {"count": 0})
+            total["count"] += 1
+            for attribute, *_ in PROMETHEUS_METRICS:
+                if attribute == "peak_rss":
+                    total[attribute] = max(total.get(attribute, 0), stage.peak_rss)
+                else:
+                    total[attribute] = total.get(attribute, 0) + getattr(stage, attribute)
+        return totals
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return report as a JSON-serializable dictionary."""
+        finished_at = self.finished_at or time.time()
+        return {
+            "parameters": self.parameters,
+            "started_at": self.started_at,
+            "finished_at": finished_at,
+            "wall_time": finished_at - self.started_at,
+            "totals": self.get_totals(),
+            "stages": [stage.to_dict() for stage in self.stages],
+            **({"audit": self.audit} if self.audit is not None else {}),
+        }
+
+    def save_json(self, path: Path) -> None:
+        """Write report to the JSON file."""
+        with path.open("w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=2, default=str)
+
+    @classmethod
+    def load_json(cls, path: Path) -> "RunReport":
+        """Read report from the JSON file written by `save_json` (benchmark results files are also accepted)."""
+        with path.open("r", encoding="utf-8") as file:
+            data = json.load(file)
+        return cls(
+            data["parameters"],
+            data.get("started_at", 0.0),
+            data.get("finished_at"),
+            [StageMeasurement.from_dict(stage) for stage in data["stages"]],
+            data.get("audit"),
+        )
+
+    def save_prometheus_textfile(self, path: Path, constant_labels: dict[str, str] | None = None) -> None:
+        """Write report metrics in Prometheus text exposition format (i.e. for node_exporter textfile collector).
+
+        File is written to a temporary file first and then renamed, so the collector never reads a partial file.
+        """
+        constant_labels = constant_labels or {}
+        lines = [
+            "# HELP idu_balance_db_run_wall_seconds Whole run wall time in seconds",
+            "# TYPE idu_balance_db_run_wall_seconds gauge",
+            f"idu_balance_db_run_wall_seconds{_format_labels(constant_labels)}"
+            f" {(self.finished_at or time.time()) - self.started_at}",
+        ]
+        for attribute, metric_name, help_text in PROMETHEUS_METRICS:
+            lines.append(f"# HELP {metric_name} {help_text}")
+            lines.append(f"# TYPE {metric_name} gauge")
+            for stage in self.stages:
+                labels = constant_labels | {"stage": stage.stage, "process": stage.process} | stage.labels
+                lines.append(f"{metric_name}{_format_labels(labels)} {getattr(stage, attribute)}")
+        if self.audit is not None:
+            lines.extend(
+                [
+                    "# HELP idu_balance_db_audit_passed Whether all of the consistency audit checks have passed",
+                    "# TYPE idu_balance_db_audit_passed gauge",
+                    f"idu_balance_db_audit_passed{_format_labels(constant_labels)} {int(self.audit['passed'])}",
+                    "# HELP idu_balance_db_audit_mismatches Number of entities violating a consistency audit check",
+                    "# TYPE idu_balance_db_audit_mismatches gauge",
+                ]
+            )
+            for check in self.audit["checks"]:
+                labels = constant_labels | {"check": check["name"], "scenario": check["scenario"]}
+                lines.append(f"idu_balance_db_audit_mismatches{_format_labels(labels)} {check['mismatches']}")
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+def _escape_label_value(value: Any) -> str:
+    """Escape label value according to Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict[str, Any]) -> str:
+    """Format labels in Prometheus text format."""
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()) + "}"
@@ -0,0 +1,84 @@
+"""Numpy arrays placed in shared memory for worker processes are defined here.
+
+The owner process copies an array to a `multiprocessing.shared_memory` block once and sends only its small picklable
+handle to workers, which attach the block and use it as a numpy array without copying or reading anything from the
+database. A block can also be handed over to another process with `share_array`, the receiver frees it after use.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Iterator
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class SharedArrayHandle:
+    """Picklable description of a numpy array in a shared memory block."""
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the array in bytes."""
+        return int(np.prod(self.shape, dtype=np.int64)) * np.dtype(self.dtype).itemsize
+
+
+class SharedArray:
+    """Copy of the numpy array in a new shared memory block, which is freed on `close` (or context manager exit)."""
+
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.handle = SharedArrayHandle(self._shm.name, array.shape, array.dtype.str)
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self._shm.buf)
+        self.array[...] = array
+
+    def close(self) -> None:
+        """Free the shared memory block. Arrays attached by the workers should not be used after that."""
+        if self._shm is None:
+            return
+        del self.array
+        try:
+            self._shm.close()
+        except BufferError:  # views of the array are still alive, the block is unmapped when they are gone
+            pass
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self) -> SharedArray:
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
+
+
+def share_array(array: np.ndarray) -> SharedArrayHandle:
+    """Copy the array to a new shared memory block and return its handle without freeing the block, so it can be
+    handed over to another process, which should attach it with `unlink=True`."""
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    shm.close()
+    return SharedArrayHandle(shm.name, array.shape, array.dtype.str)
+
+
+@contextmanager
+def attach_shared_array(handle: SharedArrayHandle, unlink: bool = False) -> Iterator[np.ndarray]:
+    """Attach the shared memory block by its handle and return numpy array over it without copying. The array is
+    valid only inside the context, the block is freed on exit if `unlink` is set.
+    """
+    shm = shared_memory.SharedMemory(name=handle.name)
+    try:
+        yield np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=shm.buf)
+    finally:
+        try:
+            shm.close()
+        except BufferError:  # views of the array are still alive, the block is unmapped on the process exit
+            pass
+        if unlink:
+            shm.unlink()
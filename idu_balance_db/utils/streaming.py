@@ -0,0 +1,85 @@
+"""Streaming (server-side cursor) reading helpers are defined here."""
+from __future__ import annotations
+
+import itertools
+from typing import Any, Iterable, Iterator, TypeVar
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Connection, Executable, Row
+
+
+T = TypeVar("T")
+
+DEFAULT_BATCH_SIZE = 10_000
+DEFAULT_INSERT_BATCH_SIZE = 1_000
+
+
+def batched(iterable: Iterable[T], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[list[T]]:
+    """Split the given iterable to lists of `batch_size` length (the last one can be shorter) without
+    materializing it fully.
+    """
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def insert_batched(
+    conn: Connection,
+    statement: Executable,
+    values: Iterable[dict[str, Any]],
+    batch_size: int = DEFAULT_INSERT_BATCH_SIZE,
+) -> int:
+    """Execute the given insert statement for batches of `batch_size` rows of `values` (executemany), so only one
+    batch of insertion parameters is kept in memory at a time. Returns number of rows inserted.
+    """
+    rows_inserted = 0
+    for values_batch in batched(values, batch_size):
+        conn.execute(statement, values_batch)
+        rows_inserted += len(values_batch)
+    return rows_inserted
+
+
+def stream_rows(
+    conn: Connection, statement: Executable, params: dict[str, Any] | None = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[Row]:
+    """Execute the given statement using server-side cursor and yield the result rows fetching them in batches
+    of `batch_size` rows, so only one batch is kept in memory at a time.
+    """
+    result = conn.execute(statement, params, execution_options={"stream_results": True, "yield_per": batch_size})
+    for partition in result.partitions():
+        yield from partition
+
+
+def stream_scalars(
+    conn: Connection, statement: Executable, params: dict[str, Any] | None = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[Any]:
+    """Execute the given statement using server-side cursor and yield the first column of each row fetching them
+    in batches of `batch_size` rows.
+    """
+    for row in stream_rows(conn, statement, params, batch_size):
+        yield row[0]
+
+
+def stream_series(  # pylint: disable=too-many-arguments
+    conn: Connection,
+    statement: Executable,
+    params: dict[str, Any] | None = None,
+    name: str | None = None,
+    dtype: Any = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> pd.Series:
+    """Read two-column (index, value) statement result to pandas Series. Rows are fetched by `batch_size` from
+    server-side cursor and each batch is converted to numpy arrays right away, so no full list of result rows
+    is ever kept in memory.
+    """
+    indexes: list[np.ndarray] = []
+    values: list[np.ndarray] = []
+    result = conn.execute(statement, params, execution_options={"stream_results": True, "yield_per": batch_size})
+    for partition in result.partitions():
+        idxs, vals = zip(*partition)
+        indexes.append(np.fromiter(idxs, dtype=np.int64, count=len(idxs)))
+        values.append(np.array(vals, dtype=dtype))
+    if len(indexes) == 0:
+        return pd.Series([], index=pd.Index([], dtype=np.int64), name=name, dtype=dtype or object)
+    return pd.Series(np.concatenate(values), index=np.concatenate(indexes), name=name)
@@ -0,0 +1,11 @@
+"""Additional script to create indexes the pipeline relies on and check query plans of its hot statements.
+
+Kept for compatibility, use `balance-db prepare-db` instead.
+"""
+from idu_balance_db.cli.prepare_db import prepare_db
+from idu_balance_db.utils.dotenv import try_read_envfile
+
+
+if __name__ == "__main__":
+    try_read_envfile()
+    prepare_db()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1 @@
+"""Tests of the idu_balance_db package."""
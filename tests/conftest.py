@@ -0,0 +1,38 @@
+"""Common fixtures of the tests are defined here."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from population_restorator.models import SocialGroupsDistribution, SocialGroupWithProbability
+
+from idu_balance_db.benchmarks.synthetic import generate_distribution
+
+
+MAX_AGE = 40
+
+
+def make_social_groups(distribution: pd.DataFrame, additional: list[str]) -> SocialGroupsDistribution:
+    """Form a social groups distribution from the synthetic `distribution` DataFrame, probability of a social group is
+    its share of the primary social groups people as in `get_social_groups_distribution_from_db_and_dataframe`."""
+    primary_total = distribution[~distribution["social_group"].isin(additional)][["men", "women"]].sum().sum()
+    primary, additionals = [], []
+    for name, sg_df in distribution.groupby("social_group", sort=False):
+        (additionals if name in additional else primary).append(
+            SocialGroupWithProbability.from_values(
+                name,
+                (sg_df["men"] + sg_df["women"]).sum() / primary_total,
+                sg_df["men"].tolist(),
+                sg_df["women"].tolist(),
+            )
+        )
+    return SocialGroupsDistribution(primary, additionals)
+
+
+@pytest.fixture(name="social_groups")
+def fixture_social_groups() -> SocialGroupsDistribution:
+    """Three primary and two additional synthetic social groups named by numbers (as in temporary databases)."""
+    distribution = generate_distribution(
+        [("1", True), ("2", True), ("3", True), ("4", False), ("5", False)], MAX_AGE, np.random.default_rng(0)
+    )
+    return make_social_groups(distribution, ["4", "5"])
@@ -0,0 +1,128 @@
+"""Equivalence of the numpy forecast model with population_restorator forecast is checked here."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from population_restorator.divider.export import save_houses_distribution_to_db
+from population_restorator.forecaster import forecast_ages, forecast_people
+from population_restorator.models import SocialGroupsDistribution, SocialGroupWithProbability
+from sqlalchemy import Engine, create_engine
+
+from idu_balance_db.benchmarks.synthetic import generate_distribution, generate_survivability_coefficients
+from idu_balance_db.logic.array_forecast import (
+    BOYS_TO_GIRLS,
+    FERTILITY_BEGIN,
+    FERTILITY_END,
+    forecast_ages_totals,
+    forecast_people_arrays,
+)
+from idu_balance_db.logic.deltas import read_year_people_array
+from idu_balance_db.logic.division import divide_houses
+
+from .conftest import MAX_AGE
+
+
+YEAR_BEGIN = 2020
+YEARS = 3
+FERTILITY = 0.07
+HOUSES = 40
+
+
+def _make_start_year(
+    social_groups: SocialGroupsDistribution, tmp_path: Path, seed: int
+) -> tuple[np.ndarray, np.ndarray, Engine]:
+    """Divide people of a small synthetic city and save them to the start year SQLite database, returning people array,
+    houses capacities and the database engine."""
+    rng = np.random.default_rng(seed)
+    capacity = rng.uniform(500, 3000, HOUSES).round(1)
+    start = np.stack(divide_houses((capacity * 0.05).astype(int).tolist(), social_groups, rng))
+    engine = create_engine(f"sqlite:///{tmp_path / 'start.sqlite'}")
+    houses_ids = list(range(1, HOUSES + 1))
+    with engine.connect() as conn:
+        save_houses_distribution_to_db(
+            conn,
+            pd.Series(list(start), index=houses_ids),
+            pd.Series(capacity, index=houses_ids),
+            social_groups,
+            YEAR_BEGIN,
+        )
+    return start, capacity, engine
+
+
+def test_forecast_ages_totals(social_groups: SocialGroupsDistribution, tmp_path: Path):
+    """Forecasted ages totals are the same as population_restorator ones."""
+    start, _, engine = _make_start_year(social_groups, tmp_path, 1)
+    coefficients = generate_survivability_coefficients(MAX_AGE)
+    expected = forecast_ages(
+        engine, YEAR_BEGIN, YEAR_BEGIN + YEARS, BOYS_TO_GIRLS, coefficients, FERTILITY, FERTILITY_BEGIN, FERTILITY_END
+    )
+    totals = forecast_ages_totals(start, len(social_groups.primary), YEARS, coefficients, FERTILITY)
+    np.testing.assert_array_equal(totals[:, 0], expected.men.to_numpy())
+    np.testing.assert_array_equal(totals[:, 1], expected.women.to_numpy())
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_forecast_people_equivalence(tmp_path: Path, seed: int):
+    """Seeded forecast matches population_restorator forecast on a city where its social groups correction steps are
+    no-op (two primary social groups with the same distribution and no additional ones, see module docstring): ages
+    totals are equal, houses and social groups people are close."""
+    distribution = generate_distribution([("1", True)], MAX_AGE, np.random.default_rng(0))
+    social_groups = SocialGroupsDistribution(
+        [
+            SocialGroupWithProbability.from_values(
+                name, 0.5, distribution["men"].tolist(), distribution["women"].tolist()
+            )
+            for name in ("1", "2")
+        ],
+        [],
+    )
+    start, capacity, engine = _make_start_year(social_groups, tmp_path, seed)
+    coefficients = generate_survivability_coefficients(MAX_AGE)
+    houses_ids = list(range(1, HOUSES + 1))
+
+    expected: dict[int, np.ndarray] = {}
+
+    def read_year(year_dsn: str, year: int) -> None:
+        year_engine = create_engine(year_dsn)
+        with year_engine.connect() as year_conn:
+            expected[year] = read_year_people_array(year_conn, year, houses_ids, [1, 2], MAX_AGE)
+        year_engine.dispose()
+
+    forecasted_ages = forecast_ages(
+        engine, YEAR_BEGIN, YEAR_BEGIN + YEARS, BOYS_TO_GIRLS, coefficients, FERTILITY, FERTILITY_BEGIN, FERTILITY_END
+    )
+    forecast_people(
+        engine,
+        forecasted_ages,
+        [f"sqlite:///{tmp_path / f'{YEAR_BEGIN + year}.sqlite'}" for year in range(1, YEARS + 1)],
+        YEAR_BEGIN,
+        rng=np.random.default_rng(seed),
+        callback=read_year,
+    )
+    forecasted = forecast_people_arrays(
+        start, capacity, social_groups, coefficients, YEARS, FERTILITY, np.random.default_rng(seed)
+    )
+
+    for year, people in enumerate(forecasted, 1):
+        original = expected[YEAR_BEGIN + year]
+        np.testing.assert_array_equal(people.sum(axis=(0, 1)), original.sum(axis=(0, 1)))
+        total = original.sum()
+        assert np.abs(people.sum(axis=(1, 2, 3)) - original.sum(axis=(1, 2, 3))).sum() < 0.1 * total
+        assert np.abs(people.sum(axis=(0, 2, 3)) - original.sum(axis=(0, 2, 3))).sum() < 0.05 * total
+
+
+def test_forecast_people_keeps_ages_totals(social_groups: SocialGroupsDistribution, tmp_path: Path):
+    """With social groups corrections primary social groups people still sum up to the forecasted ages totals."""
+    start, capacity, _ = _make_start_year(social_groups, tmp_path, 1)
+    coefficients = generate_survivability_coefficients(MAX_AGE)
+    primary_number = len(social_groups.primary)
+    totals = forecast_ages_totals(start, primary_number, YEARS, coefficients, FERTILITY)
+    forecasted = forecast_people_arrays(
+        start, capacity, social_groups, coefficients, YEARS, FERTILITY, np.random.default_rng(1)
+    )
+    for year, people in enumerate(forecasted, 1):
+        assert (people >= 0).all()
+        np.testing.assert_array_equal(people[:, :primary_number].sum(axis=(0, 1)), totals[year])
@@ -0,0 +1,120 @@
+"""Year-over-year delta encoding of the people distribution is checked here."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from population_restorator.divider.export import save_houses_distribution_to_db
+from population_restorator.models import SocialGroupsDistribution
+from sqlalchemy import create_engine
+
+from idu_balance_db.logic.deltas import (
+    age_people,
+    decode_people_delta,
+    decode_year_delta,
+    encode_people_delta,
+    encode_year_delta,
+    is_keyframe_year,
+    read_year_people_array,
+)
+from idu_balance_db.logic.division import divide_houses
+
+from .conftest import MAX_AGE
+
+
+YEARS = 6
+
+
+def _make_years(rng: np.random.Generator) -> list[np.ndarray]:
+    """Return people arrays of the consecutive years, each is the previous one aged by a year with random changes.
+    The oldest age is populated every year, so its people leave each next year."""
+    people = rng.integers(0, 5, (10, 3, 2, MAX_AGE + 1))
+    years = [people]
+    for _ in range(YEARS):
+        people = np.maximum(
+            age_people(people) + rng.integers(-2, 3, people.shape) * (rng.random(people.shape) < 0.1), 0
+        )
+        people[..., -1] += rng.integers(1, 3, people.shape[:-1])
+        years.append(people)
+    return years
+
+
+def _reconstruct_cohorts(deltas: list[np.ndarray], year: int, keyframe: int = 0) -> np.ndarray:
+    """Reconstruct a year by summing differences of the birth year cohorts since the `keyframe` year as
+    `sex_age_social_houses_deltas_year` database function does: people of an age are the sum of differences of age
+    minus number of years between."""
+    people = np.zeros_like(deltas[0])
+    for delta_year, delta in enumerate(deltas[keyframe : year + 1], keyframe):
+        shift = year - delta_year
+        people[..., shift:] += delta[..., : delta.shape[-1] - shift]
+    return people
+
+
+def test_age_people_drops_oldest_age():
+    """Aged people move to the next age and the oldest age people leave."""
+    people = np.arange(1, 2 * (MAX_AGE + 1) + 1).reshape(2, MAX_AGE + 1)
+    aged = age_people(people)
+    np.testing.assert_array_equal(aged[:, 0], [0, 0])
+    np.testing.assert_array_equal(aged[:, 1:], people[:, :-1])
+    assert aged.sum() == people.sum() - people[:, -1].sum()
+    assert not encode_people_delta(aged, people).any()
+
+
+def test_round_trip():
+    """Years decoded one after another and reconstructed by cohorts are the same as the encoded ones."""
+    years = _make_years(np.random.default_rng(0))
+    deltas = [encode_people_delta(years[0])] + [
+        encode_people_delta(people, previous) for previous, people in zip(years, years[1:])
+    ]
+    assert sum(int(np.count_nonzero(delta)) for delta in deltas[1:]) < sum(int(np.count_nonzero(p)) for p in years[1:])
+
+    previous = None
+    for year, (people, delta) in enumerate(zip(years, deltas)):
+        previous = decode_people_delta(delta, previous)
+        np.testing.assert_array_equal(previous, people)
+        np.testing.assert_array_equal(_reconstruct_cohorts(deltas, year), people)
+
+
+def test_keyframes_round_trip():
+    """Keyframe years are stored in full, and years are reconstructed by cohorts since the latest keyframe."""
+    years = _make_years(np.random.default_rng(3))
+    year_begin = 2023
+    deltas = []
+    previous = None
+    for offset, people in enumerate(years):
+        deltas.append(encode_year_delta(people, previous, year_begin + offset))
+        previous = people
+    keyframes = [offset for offset in range(len(years)) if is_keyframe_year(year_begin + offset)]
+    assert len(keyframes) > 0
+    for offset in keyframes:
+        np.testing.assert_array_equal(deltas[offset], years[offset])
+
+    previous = None
+    for offset, (people, delta) in enumerate(zip(years, deltas)):
+        previous = decode_year_delta(delta, previous, year_begin + offset)
+        np.testing.assert_array_equal(previous, people)
+        keyframe = max([0] + [keyframe for keyframe in keyframes if keyframe <= offset])
+        np.testing.assert_array_equal(_reconstruct_cohorts(deltas, offset, keyframe), people)
+
+
+def test_read_year_people_array(social_groups: SocialGroupsDistribution, tmp_path: Path):
+    """Year people read from the temporary database are placed by the given houses and social groups order."""
+    houses_population = np.random.default_rng(1).integers(0, 100, 20).tolist()
+    people = np.stack(divide_houses(houses_population, social_groups, np.random.default_rng(1)))
+    houses_ids = list(range(101, 121))
+    engine = create_engine(f"sqlite:///{tmp_path / 'year.sqlite'}")
+    with engine.connect() as conn:
+        save_houses_distribution_to_db(
+            conn,
+            pd.Series(list(people), index=houses_ids),
+            pd.Series(1000.0, index=houses_ids),
+            social_groups,
+            2020,
+        )
+    social_groups_ids = [int(name) for name in social_groups.get_combined_names()]
+    with engine.connect() as conn:
+        read = read_year_people_array(conn, 2020, houses_ids[::-1], social_groups_ids[::-1], MAX_AGE, batch_size=7)
+        missing_year = read_year_people_array(conn, 2021, houses_ids, social_groups_ids, MAX_AGE)
+    np.testing.assert_array_equal(read, people[::-1, ::-1])
+    assert not missing_year.any()
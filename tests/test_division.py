@@ -0,0 +1,34 @@
+"""Vectorized division is checked against population_restorator `divide_houses` here."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from population_restorator.divider import divide_houses as original_divide_houses
+from population_restorator.models import SocialGroupsDistribution
+
+from idu_balance_db.logic.division import divide_houses
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_divide_houses_totals(social_groups: SocialGroupsDistribution, seed: int):
+    """People and additional social groups members of each house are the same as population_restorator ones, and
+    social groups, sex and age marginals are close."""
+    houses_population = np.random.default_rng(seed).integers(0, 300, 200).tolist()
+    primary_number = len(social_groups.primary)
+    divided = np.stack(divide_houses(houses_population, social_groups, np.random.default_rng(seed), chunk_size=64))
+    original = np.stack(original_divide_houses(houses_population, social_groups, np.random.default_rng(seed)))
+
+    assert divided.shape == original.shape
+    np.testing.assert_array_equal(divided[:, :primary_number].sum(axis=(1, 2, 3)), houses_population)
+    np.testing.assert_array_equal(original[:, :primary_number].sum(axis=(1, 2, 3)), houses_population)
+    np.testing.assert_array_equal(
+        divided[:, primary_number:].sum(axis=(1, 2, 3)), original[:, primary_number:].sum(axis=(1, 2, 3))
+    )
+
+    total = sum(houses_population)
+    for axis in ((0, 2, 3), (0, 1, 3), (0, 1, 2)):
+        difference = divided[:, :primary_number].sum(axis=axis) - original[:, :primary_number].sum(axis=axis)
+        assert np.abs(difference).sum() < 0.05 * total
+    additional = original[:, primary_number:].sum()
+    difference = divided[:, primary_number:].sum(axis=(0, 2, 3)) - original[:, primary_number:].sum(axis=(0, 2, 3))
+    assert np.abs(difference).sum() < 0.1 * additional
@@ -0,0 +1,59 @@
+"""Ensemble replicas forecast and statistics names are checked here."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from population_restorator.models import SocialGroupsDistribution
+
+from idu_balance_db.benchmarks.synthetic import generate_survivability_coefficients
+from idu_balance_db.logic.ensemble import forecast_replicas, get_quantile_name, get_quantiles_names
+
+from .conftest import MAX_AGE
+
+
+YEARS = 3
+HOUSES = 30
+
+
+def test_quantiles_names():
+    """Different quantile levels get different names, and levels sharing a name are rejected."""
+    names = get_quantiles_names([0.0, 0.05, 0.5, 0.995, 0.99999, 1.0])
+    assert names[1:4] == ["q5", "q50", "q99.5"]
+    assert len(set(names)) == len(names)
+    with pytest.raises(ValueError):
+        get_quantiles_names([0.5, 0.05, 0.5])
+    assert get_quantile_name(0.25) == "q25"
+
+
+@pytest.mark.parametrize("batch_size", [1, 12])
+def test_forecast_replicas(social_groups: SocialGroupsDistribution, batch_size: int):
+    """Replicas keep their start year population, and the first replica full years match its sums."""
+    rng = np.random.default_rng(2)
+    houses = pd.DataFrame({"population": rng.integers(10, 200, HOUSES), "living_area": rng.uniform(500, 3000, HOUSES)})
+    first_replica: dict[tuple[int, str | None], np.ndarray] = {}
+
+    def keep_first_replica(year: int, scenario: str | None, people: np.ndarray) -> None:
+        first_replica[(year, scenario)] = people.copy()
+
+    sums = forecast_replicas(
+        houses,
+        social_groups,
+        generate_survivability_coefficients(MAX_AGE),
+        YEARS,
+        {"neg": 0.9, "mod": 1.0},
+        5,
+        7,
+        batch_size=batch_size,
+        callback=keep_first_replica,
+    )
+    sgs = len(social_groups.get_combined_names())
+    for scenario_sums in sums.values():
+        assert scenario_sums.shape == (5, YEARS + 1, HOUSES, sgs)
+        primary = scenario_sums[:, 0, :, : len(social_groups.primary)].sum(axis=2)
+        assert (primary == houses["population"].to_numpy()).all()
+    assert len(first_replica) == 1 + YEARS * 2
+    assert (first_replica[(0, None)].sum(axis=(2, 3)) == sums["neg"][0, 0]).all()
+    for scenario in ("neg", "mod"):
+        for year in range(1, YEARS + 1):
+            assert (first_replica[(year, scenario)].sum(axis=(2, 3)) == sums[scenario][0, year]).all()
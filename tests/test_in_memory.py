@@ -0,0 +1,21 @@
+"""In-memory model services demands are checked here."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from idu_balance_db.logic.in_memory import calculate_demands
+
+
+def test_calculate_demands_populations():
+    """Houses population counts primary social groups people only, social groups population counts all of them."""
+    rng = np.random.default_rng(3)
+    people = rng.integers(0, 5, (4, 3, 2, 10))
+    demands = calculate_demands(
+        people, ["1", "2", "3"], pd.Index([10, 11, 12, 13]), {"school": ["2", "3"]}, {"school": 100.0}, primary_number=1
+    )
+    sgs_people = people.sum(axis=(2, 3))
+    assert (demands["year_population"] == sgs_people[:, 0]).all()
+    assert (demands["year_population_sgs"] == sgs_people.sum(axis=1)).all()
+    assert (demands["school_service_demand_value_model"] == sgs_people[:, 1:].sum(axis=1)).all()
+    assert (demands["school_service_demand_value_normative"] == np.round(sgs_people[:, 0] * 0.1)).all()